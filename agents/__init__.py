@@ -0,0 +1,18 @@
+"""
+The SOSEC agents.
+
+The modules import each other by their flat names (`from llm_client import ...`). This
+is the one place that makes the module directories importable, so run entry points as
+modules from the repository root, e.g.
+`python -m agents.sosec_categories_agents.sosec_classification_step`.
+"""
+import os
+import sys
+
+AGENTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIRS = ["", "sosec_categories_agents", "event_related_agents", "keyword_related_agents", "benchmarks"]
+
+for _name in MODULE_DIRS:
+    _path = os.path.join(AGENTS_DIR, _name) if _name else AGENTS_DIR
+    if _path not in sys.path:
+        sys.path.append(_path)
@@ -0,0 +1,92 @@
+import json
+from classification_output import VALID_LABELS
+
+# German Telegram text averages a little under four characters per token for Llama
+# tokenizers; three keeps the estimate on the safe side
+CHARS_PER_TOKEN = 3.0
+TOKENS_PER_LABEL = 6
+BATCH_INSTRUCTIONS = (
+    "You will receive several numbered Telegram posts, each starting with a line '### Post <n>'. "
+    "Classify every post independently and respond ONLY with a JSON object of the form "
+    '{"labels": ["<label of post 1>", "<label of post 2>", ...]} '
+    "containing exactly one label per post, in the same order. Each label must be '0', '1' or 'Uncertain'."
+)
+
+
+def estimate_tokens(text):
+    """
+    Returns a conservative token count estimate for `text`.
+    """
+    return int(len(str(text)) / CHARS_PER_TOKEN) + 1
+
+
+def batch_output_schema():
+    """
+    The JSON schema passed to Ollama's `format=` for batch responses.
+    """
+    return {
+        "type": "object",
+        "properties": {"labels": {"type": "array", "items": {"type": "string", "enum": list(VALID_LABELS)}}},
+        "required": ["labels"],
+    }
+
+
+def batch_num_predict(batch_size):
+    """
+    Generation budget for a batch of `batch_size` labels.
+    """
+    return 16 + TOKENS_PER_LABEL * batch_size
+
+
+def plan_batches(posts, token_budget, max_batch_size=16):
+    """
+    Greedily packs consecutive posts into batches that fit the model context.
+
+    Args:
+        posts (list): The posts to pack.
+        token_budget (int): Tokens available for posts and labels, i.e. the context window
+            minus the static prompt prefix.
+        max_batch_size (int, optional): Upper bound on posts per batch.
+
+    Returns:
+        list: Lists of indices into `posts`. A post that does not fit with others forms
+        a batch of its own.
+    """
+    batches, current, used = [], [], 0
+    for i, post in enumerate(posts):
+        cost = estimate_tokens(post) + 8 + TOKENS_PER_LABEL
+        if current and (used + cost + 16 > token_budget or len(current) >= max_batch_size):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def format_batch(posts):
+    """
+    Numbers and delimits the posts of one batch.
+    """
+    return "\n\n".join(f"### Post {n}\n{post}" for n, post in enumerate(posts, start=1))
+
+
+def parse_batch_labels(response, expected):
+    """
+    Extracts the label list from a batch response.
+
+    Returns:
+        list or None: `expected` labels, or None if the response is not valid JSON, has
+        the wrong number of labels or contains a label outside the valid set.
+    """
+    try:
+        labels = json.loads(response.strip()).get("labels")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+    if not isinstance(labels, list) or len(labels) != expected:
+        return None
+    labels = [str(label).strip() for label in labels]
+    if any(label not in VALID_LABELS for label in labels):
+        return None
+    return labels
@@ -0,0 +1,282 @@
+"""
+A deterministic stand-in for the Ollama HTTP API, for benchmarks and offline runs.
+
+Serves `/api/chat`, `/api/embed`, `/api/tags` and `/api/version` with configurable
+latency, jitter and a concurrency limit (requests beyond it queue, as on a real server
+with OLLAMA_NUM_PARALLEL). Labels are derived from a hash of the post, so repeated runs
+see identical answers. Responses honour structured-output requests: a `format` schema
+with a `label` property gets `{"label": ...}`, one with `labels` gets one label per
+'### Post <n>' block.
+
+Server hiccups can be simulated: `error_rate` answers that share of chat requests with
+HTTP 503, `fail_request` picks the requests to answer with 503, and `outage(seconds)` answers every request with 503 for a while, as Ollama does
+while it is unavailable or (re)loading a model.
+
+Usage:
+    python -m agents.benchmarks.fake_ollama_server --port 11500 --latency-ms 50 --jitter-ms 10 --concurrency 4 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LABELS = ("0", "1", "Uncertain")
+
+
+def hashed_label(text, weights=(0.6, 0.35, 0.05)):
+    """
+    Picks a label deterministically from the text, with the given (0, 1, Uncertain) weights.
+    """
+    position = (zlib.crc32(text.encode("utf-8")) % 10000) / 10000
+    cumulative = 0.0
+    for label, weight in zip(LABELS, weights):
+        cumulative += weight
+        if position < cumulative:
+            return label
+    return LABELS[-1]
+
+
+def default_responder(request):
+    """
+    Builds the answer for a chat request from its last message and requested format.
+    """
+    prompt = request["messages"][-1]["content"] if request.get("messages") else ""
+    schema = request.get("format")
+    properties = schema.get("properties", {}) if isinstance(schema, dict) else {}
+    if "labels" in properties:
+        posts = re.split(r"^### Post \d+\n", prompt, flags=re.MULTILINE)[1:]
+        return json.dumps({"labels": [hashed_label(post) for post in posts]})
+    label = hashed_label(prompt)
+    if "label" in properties or schema == "json":
+        return json.dumps({"label": label})
+    if "comma-separated list of keywords" in prompt:
+        words = sorted(set(re.findall(r"\w{6,}", prompt)))[:10]
+        return ", ".join(words)
+    return label
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connection bursts from concurrent clients
+    request_queue_size = 256
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # A client that timed out and hung up is expected, not a server error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class ServerStats:
+    """
+    Thread-safe call counters and per-call latencies (including time spent queueing).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = {}
+            self.latencies = []
+            self.in_flight = 0
+            self.peak_in_flight = 0
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "calls": dict(self.calls),
+                "latencies": list(self.latencies),
+                "peak_in_flight": self.peak_in_flight,
+            }
+
+
+class FakeOllamaServer:
+    """
+    Runs the fake API in a background thread.
+
+    Attributes:
+        latency (float): Base service time per request, in seconds.
+        jitter (float): Maximum uniform jitter added to the latency, in seconds.
+        concurrency (int): Requests processed at the same time; others wait.
+        responder (callable): Maps the decoded chat request to the response content.
+        seed (int): Seed for the jitter and error sequences.
+        error_rate (float): Share of chat requests answered with HTTP 503.
+        fail_request (callable): Optional predicate on the decoded request; matching
+            requests are answered with HTTP 503.
+        stats (ServerStats): Call counts and latencies.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, jitter=0.0, concurrency=4, responder=None, seed=0, tokens_per_second=200.0, error_rate=0.0, fail_request=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.responder = responder or default_responder
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.fail_request = fail_request
+        self._outage_until = 0.0
+        self.stats = ServerStats()
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._server = _HTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _delay(self):
+        with self._random_lock:
+            return self.latency + self._random.uniform(0.0, self.jitter)
+
+    def outage(self, seconds):
+        """
+        Answers every request with HTTP 503 for the next `seconds`.
+        """
+        self._outage_until = time.monotonic() + seconds
+
+    def _unavailable(self, request):
+        if time.monotonic() < self._outage_until:
+            return True
+        if self.fail_request is not None and self.fail_request(request):
+            return True
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, Nagle's algorithm
+            # and delayed ACKs add ~40 ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, payload, status=200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/version":
+                    self._send({"version": "0.0.0-fake"})
+                elif self.path == "/api/tags":
+                    self._send({"models": []})
+                else:
+                    self._send({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if server._unavailable(request):
+                    with server.stats.lock:
+                        server.stats.calls["503"] = server.stats.calls.get("503", 0) + 1
+                    self._send({"error": "server busy, please try again"}, 503)
+                    return
+                started = time.perf_counter()
+                with server.stats.lock:
+                    server.stats.calls[self.path] = server.stats.calls.get(self.path, 0) + 1
+                    server.stats.in_flight += 1
+                    server.stats.peak_in_flight = max(server.stats.peak_in_flight, server.stats.in_flight)
+                try:
+                    with server._slots:
+                        time.sleep(server._delay())
+                        if self.path == "/api/chat":
+                            payload = server._chat_payload(request, started)
+                        elif self.path == "/api/embed":
+                            payload = server._embed_payload(request)
+                        else:
+                            payload = None
+                finally:
+                    with server.stats.lock:
+                        server.stats.in_flight -= 1
+                        server.stats.latencies.append(time.perf_counter() - started)
+                if payload is None:
+                    self._send({"error": "not found"}, 404)
+                else:
+                    self._send(payload)
+
+        return Handler
+
+    def _chat_payload(self, request, started):
+        content = self.responder(request)
+        prompt_tokens = sum(len(message.get("content", "")) for message in request.get("messages", [])) // 4
+        eval_count = max(1, len(content) // 4)
+        duration = int((time.perf_counter() - started) * 1e9)
+        return {
+            "model": request.get("model", ""),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": duration,
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": duration // 2,
+            "eval_count": eval_count,
+            "eval_duration": int(eval_count / self.tokens_per_second * 1e9),
+        }
+
+    @staticmethod
+    def _embed_payload(request):
+        texts = request.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        embeddings = []
+        for text in texts:
+            generator = random.Random(zlib.crc32(text.encode("utf-8")))
+            embeddings.append([generator.uniform(-1.0, 1.0) for _ in range(32)])
+        return {"model": request.get("model", ""), "embeddings": embeddings}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of chat requests answered with HTTP 503")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000, args.concurrency, seed=args.seed, error_rate=args.error_rate)
+    print(f"Fake Ollama server listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
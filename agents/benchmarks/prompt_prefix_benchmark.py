@@ -0,0 +1,141 @@
+"""
+Measures per-post prompt evaluation time for the precomputed, KV-cache-friendly prompt
+layout against the previous layout, where the TopicCheckerAgent instructions and
+keywords were interleaved in the user turn and no keep_alive/num_ctx was sent.
+
+Both layouts run `--repetitions` times. The order of the layouts is shuffled per
+repetition, with each layout going first equally often, so neither profits from running
+second on a warmer server. Each block starts with an unmeasured request of its own
+layout, so both start from their own cached prefix rather than the other layout's.
+
+Usage (from the repository root, with an Ollama server running):
+    python -m agents.benchmarks.prompt_prefix_benchmark --input data/start_data_isr.csv --posts 50 --repetitions 4
+"""
+import argparse
+import json
+import random
+import statistics
+import pandas as pd
+import ollama
+
+from topic_checker_agent import TopicCheckerAgent
+
+ISRAEL_KEYWORDS = [
+    "israel", "gaza", "hamas", "palestine", "lebanon", "hisbollah", "hezbollah", "iran", "netanyahu", "rafah",
+    "hostage", "october 7", "ceasefire", "genocide", "united nations",
+]
+
+
+def legacy_messages(agent, post):
+    """
+    The prompt layout used before the static prefix was precomputed.
+    """
+    return [
+        {"role": "system", "content": (
+            f"You are a highly accurate text classifier specializing in detecting references to {agent.topic} "
+            "in German-language social media posts, particularly on Telegram. "
+            "Base your classification strictly on the content of the post, avoiding assumptions beyond what is explicitly stated."
+        )},
+        {"role": "user", "content": (
+            "Classify the following Telegram post strictly based on its content:\n\n"
+            f"Label it with '1' if the post references {agent.topic} or any of its more specific aspects.\n"
+            "Label it with '0' if it is about a different topic.\n"
+            "If the classification is unclear, respond ONLY with 'Uncertain'.\n\n"
+            f"Consider the following keywords as strong indicators that the post is about {agent.topic}:\n"
+            f"{', '.join(agent.keywords)}\n\n"
+            "However, do not rely solely on keywords—evaluate the full context of the message.\n\n"
+            f"Post:\n{post}"
+        )}
+    ]
+
+
+def run_layout(client, model, posts, build_messages, chat_kwargs):
+    """
+    Returns:
+        tuple: Prompt evaluation times (ms) and token counts, one per post.
+    """
+    # Unmeasured request, so the block starts from this layout's cached prefix
+    client.chat(model=model, messages=build_messages(posts[-1]), **chat_kwargs)
+    prompt_eval_ms, prompt_tokens = [], []
+    for post in posts:
+        response = client.chat(model=model, messages=build_messages(post), **chat_kwargs)
+        prompt_eval_ms.append(response.get("prompt_eval_duration", 0) / 1e6)
+        prompt_tokens.append(response.get("prompt_eval_count", 0))
+    return prompt_eval_ms, prompt_tokens
+
+
+def layout_orders(layouts, repetitions, seed=0):
+    """
+    Returns one order of `layouts` per repetition, each layout leading equally often
+    (up to rounding) and the sequence of orders shuffled.
+    """
+    rng = random.Random(seed)
+    orders = []
+    for repetition in range(repetitions):
+        first = layouts[repetition % len(layouts)]
+        rest = [layout for layout in layouts if layout != first]
+        rng.shuffle(rest)
+        orders.append([first] + rest)
+    rng.shuffle(orders)
+    return orders
+
+
+def summarize(prompt_eval_ms, prompt_tokens):
+    return {
+        "mean_prompt_eval_ms": statistics.mean(prompt_eval_ms),
+        "median_prompt_eval_ms": statistics.median(prompt_eval_ms),
+        "mean_prompt_eval_tokens": statistics.mean(prompt_tokens),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default="data/start_data_isr.csv")
+    parser.add_argument("--posts", type=int, default=50)
+    parser.add_argument("--model", default="llama3.2:latest")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--num-ctx", type=int, default=4096)
+    parser.add_argument("--repetitions", type=int, default=4, help="Runs of each layout, in shuffled order.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    posts = pd.read_csv(args.input, nrows=args.posts)["Post Text"].tolist()
+    agent = TopicCheckerAgent(
+        model=args.model, keywords=ISRAEL_KEYWORDS, topic="Israel", host=args.host, options={"num_ctx": args.num_ctx}
+    )
+    client = ollama.Client(host=args.host)
+
+    # Warm up so model loading is not attributed to either layout
+    client.chat(model=args.model, messages=agent.construct_message(posts[0]), **agent.chat_kwargs())
+
+    layouts = {
+        "legacy": (lambda post: legacy_messages(agent, post), {}),
+        "static_prefix": (agent.construct_message, agent.chat_kwargs()),
+    }
+    measured = {name: ([], []) for name in layouts}
+    repetitions = []
+    for order in layout_orders(list(layouts), args.repetitions, args.seed):
+        means = {}
+        for name in order:
+            prompt_eval_ms, prompt_tokens = run_layout(client, args.model, posts, *layouts[name])
+            measured[name][0].extend(prompt_eval_ms)
+            measured[name][1].extend(prompt_tokens)
+            means[name] = statistics.mean(prompt_eval_ms)
+        repetition = {"order": order, **{f"{name}_mean_prompt_eval_ms": ms for name, ms in means.items()}}
+        if means["legacy"]:
+            repetition["prompt_eval_reduction"] = 1 - means["static_prefix"] / means["legacy"]
+        repetitions.append(repetition)
+
+    results = {name: summarize(*values) for name, values in measured.items()}
+    legacy_ms = results["legacy"]["mean_prompt_eval_ms"]
+    if legacy_ms:
+        results["prompt_eval_reduction"] = 1 - results["static_prefix"]["mean_prompt_eval_ms"] / legacy_ms
+    reductions = [repetition["prompt_eval_reduction"] for repetition in repetitions if "prompt_eval_reduction" in repetition]
+    if len(reductions) > 1:
+        results["prompt_eval_reduction_stdev"] = statistics.stdev(reductions)
+    results["repetitions"] = repetitions
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
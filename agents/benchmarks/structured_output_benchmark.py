@@ -0,0 +1,51 @@
+"""
+Compares free-text and structured-output (JSON schema constrained) classification for a
+BaseClassificationAgent: generated tokens per post, invalid-label rate and retries.
+
+Usage (from the repository root, with an Ollama server running):
+    python -m agents.benchmarks.structured_output_benchmark --input data/start_data_isr.csv --posts 100
+"""
+import argparse
+import json
+import statistics
+import pandas as pd
+
+from general_concerns_agent import GeneralConcernsAgent
+
+
+def run_mode(agent, posts):
+    generated_tokens, invalid, retried = [], 0, 0
+    for post in posts:
+        response = agent.transport.client.chat(model=agent.model, messages=agent.construct_messages(post), **agent.chat_kwargs())
+        generated_tokens.append(response.get("eval_count", 0))
+        label = agent.parse_response(response["message"]["content"])
+        if label == "invalid" and agent.structured_output:
+            retried += 1
+            label = agent.retry_invalid_label(post, label)
+        invalid += label == "invalid"
+    return {
+        "mean_generated_tokens": statistics.mean(generated_tokens),
+        "max_generated_tokens": max(generated_tokens),
+        "invalid_rate": invalid / len(posts),
+        "retries": retried,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default="data/start_data_isr.csv")
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--model", default="llama3.2:latest")
+    parser.add_argument("--host", default=None)
+    args = parser.parse_args()
+
+    posts = pd.read_csv(args.input, nrows=args.posts)["Post Text"].tolist()
+    results = {
+        "free_text": run_mode(GeneralConcernsAgent(args.model, host=args.host), posts),
+        "structured": run_mode(GeneralConcernsAgent(args.model, host=args.host, structured_output=True), posts),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Throughput and latency benchmark for the classification pipeline, run against the
+deterministic fake Ollama server (see fake_ollama_server.py), so no model is needed.
+
+Each scenario runs in its own process over a synthetic dataset and drives the real entry
+points: `TopicCheckerAgent.process_dataset`, `BaseClassificationAgent.process_dataset`
+(via GeneralConcernsAgent) and `SOSECOrchestratorAgent.run`. Reported per scenario:
+posts/sec, p50/p95/p99 per-call latency as seen by the server (including queueing),
+peak RSS of the worker process and model-call counts. Results are written as JSON; with
+`--baseline` the run is compared to an earlier result file and the exit code is 1 if
+throughput dropped by more than `--tolerance`.
+
+Usage (from the repository root):
+    python -m agents.benchmarks.throughput_benchmark --posts 1000 10000 --latency-ms 20 --server-concurrency 8 \
+        --concurrency 8 --output benchmark_results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import numpy as np
+import pandas as pd
+
+from fake_ollama_server import FakeOllamaServer
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("topic", "category", "orchestrator")
+VOCABULARY = (
+    "Regierung Bundestag Israel Gaza Hamas Ukraine Russland Inflation Preise Energie Heizung Strom Miete Rente "
+    "Flüchtlinge Grenze Asyl Impfung Gesundheit Krankenhaus Klima Umwelt Medien Wahrheit Lüge Wahl Partei AfD "
+    "Grüne SPD CDU Demonstration Freiheit Frieden Krieg Amerika Deutschland Polizei Gericht Justiz Eliten WHO"
+).split()
+FILLER = "heute morgen endlich wieder wirklich leider schon immer alle keiner viele niemand".split()
+
+
+def generate_dataset(path, n_posts, seed=0, duplicate_rate=0.1, words_per_post=30):
+    """
+    Writes a synthetic dataset with 'Post Text' and 'date' columns. A share of the posts
+    are exact duplicates of earlier ones, as forwarded posts are on Telegram.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(VOCABULARY + FILLER)
+    n_unique = max(1, int(n_posts * (1 - duplicate_rate)))
+    tokens = rng.choice(words, size=(n_unique, words_per_post))
+    unique_posts = [" ".join(row) for row in tokens]
+    picks = np.concatenate([np.arange(n_unique), rng.integers(0, n_unique, n_posts - n_unique)])
+    dates = pd.Timestamp("2023-10-01") + pd.to_timedelta(rng.integers(0, 31 * 24 * 3600, n_posts), unit="s")
+    pd.DataFrame({
+        "Post Text": [unique_posts[i] for i in picks],
+        "date": dates.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+    }).to_csv(path, index=False)
+
+
+def _run_scenario(scenario, inpath, outpath, host, args, results):
+    # Runs in a child process so peak RSS is measured per scenario; the parent always gets
+    # either the measurements or the traceback
+    try:
+        results.put(_measure_scenario(scenario, inpath, outpath, host, args))
+    except BaseException:
+        results.put({"error": traceback.format_exc()})
+        raise
+
+
+def _measure_scenario(scenario, inpath, outpath, host, args):
+    from topic_checker_agent import TopicCheckerAgent
+    from general_concerns_agent import GeneralConcernsAgent
+    from political_parties_agent import PoliticalPartiesAgent
+    from trust_institutions_agent import TrustInstitutionsAgent
+    from views_germany_usa_agent import ViewGermanyUsaAgent
+    from conspiracy_theories_agent import ConspiracyTheoriesAgent
+    from sosec_orchestrator_agent import SOSECOrchestratorAgent
+    from work_scheduler import WorkScheduler
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+        if scenario == "topic":
+            agent = TopicCheckerAgent(args.model, keywords=["Israel", "Gaza", "Hamas"], topic="Israel", host=host)
+            agent.process_dataset(inpath, outpath, concurrency=args.concurrency, chunksize=args.chunksize, batch_size=args.batch_size)
+        elif scenario == "category":
+            agent = GeneralConcernsAgent(args.model, host=host)
+            agent.process_dataset(inpath, outpath, concurrency=args.concurrency, chunksize=args.chunksize, batch_size=args.batch_size)
+        else:
+            agents = [
+                agent_class(args.model, host=host)
+                for agent_class in (GeneralConcernsAgent, PoliticalPartiesAgent, TrustInstitutionsAgent, ViewGermanyUsaAgent, ConspiracyTheoriesAgent)
+            ]
+            scheduler = WorkScheduler(hosts=[host], per_host_concurrency=args.concurrency)
+            SOSECOrchestratorAgent(agents, inpath, outpath, scheduler=scheduler, chunksize=args.chunksize).run()
+    return {
+        "seconds": time.perf_counter() - started,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_benchmark(scenario, n_posts, server, workdir, args):
+    inpath = os.path.join(workdir, f"posts_{n_posts}.csv")
+    if not os.path.exists(inpath):
+        generate_dataset(inpath, n_posts, seed=args.seed, duplicate_rate=args.duplicate_rate)
+    outpath = os.path.join(workdir, f"{scenario}_{n_posts}_out.csv")
+
+    server.stats.reset()
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_scenario, args=(scenario, inpath, outpath, server.url, args, results))
+    process.start()
+    measured = None
+    while measured is None:
+        try:
+            measured = results.get(timeout=1.0)
+        except queue.Empty:
+            if not process.is_alive():
+                # The child may have put its result just before exiting
+                try:
+                    measured = results.get(timeout=1.0)
+                except queue.Empty:
+                    measured = {"error": "the worker process exited without reporting a result"}
+    process.join()
+    if "error" in measured or process.exitcode != 0:
+        raise RuntimeError(
+            f"Scenario '{scenario}' with {n_posts} posts failed (exit code {process.exitcode}):\n"
+            f"{measured.get('error', '')}"
+        )
+
+    stats = server.stats.snapshot()
+    latencies = np.array(stats["latencies"]) * 1000
+    model_calls = stats["calls"].get("/api/chat", 0)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (float("nan"),) * 3
+    return {
+        "scenario": scenario,
+        "posts": n_posts,
+        "seconds": round(measured["seconds"], 3),
+        "posts_per_sec": round(n_posts / measured["seconds"], 2),
+        "latency_ms": {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2)},
+        "model_calls": model_calls,
+        "calls_per_post": round(model_calls / n_posts, 3),
+        "peak_in_flight": stats["peak_in_flight"],
+        "peak_rss_mb": round(measured["peak_rss_mb"], 1),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Returns the (scenario, posts) pairs whose throughput fell by more than `tolerance`
+    relative to the baseline result file.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["posts"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["scenario"], result["posts"]))
+        if previous and result["posts_per_sec"] < previous["posts_per_sec"] * (1 - tolerance):
+            regressions.append({
+                "scenario": result["scenario"], "posts": result["posts"],
+                "posts_per_sec": result["posts_per_sec"], "baseline_posts_per_sec": previous["posts_per_sec"],
+            })
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=AGENTS_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--posts", nargs="+", type=int, default=[1000])
+    parser.add_argument("--model", default="llama3.2:latest")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--server-concurrency", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=8, help="Client-side requests in flight.")
+    parser.add_argument("--chunksize", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=None, help="Posts per request for the single-category scenarios.")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="Where synthetic datasets are kept. Defaults to a temporary directory.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier result file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, concurrency=args.server_concurrency, seed=args.seed
+    ).start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            workdir = args.workdir or tmpdir
+            os.makedirs(workdir, exist_ok=True)
+            for n_posts in args.posts:
+                for scenario in args.scenarios:
+                    result = run_benchmark(scenario, n_posts, server, workdir, args)
+                    print(json.dumps(result))
+                    results.append(result)
+    finally:
+        server.stop()
+
+    report = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "verbose", "workdir")},
+        "results": results,
+    }
+    if args.baseline:
+        report["regressions"] = compare(results, args.baseline, args.tolerance)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if report.get("regressions"):
+        print(f"Throughput regressions: {json.dumps(report['regressions'], indent=2)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
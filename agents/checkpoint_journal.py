@@ -0,0 +1,87 @@
+import json
+import logging
+import os
+from metrics import METRICS
+
+
+class CheckpointJournal:
+    """
+    An append-only JSONL journal of per-row results used to resume interrupted runs.
+
+    Each line records one completed row id and its result, so a flush only writes the
+    rows finished since the previous flush. On start-up the journal is replayed into a
+    dictionary, which makes "was this row already done?" an O(1) lookup. A truncated
+    last line left by a crash is ignored.
+
+    Attributes:
+        path (str): Path of the journal file.
+        fsync_every (int): Number of records after which the file is flushed and fsynced.
+        completed (dict): Mapping of row id to recorded result.
+    """
+
+    def __init__(self, path, fsync_every=50):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.completed = {}
+        self._pending = 0
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line_number, line in enumerate(f, start=1):
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logging.warning(f"Skipping corrupt line {line_number} in checkpoint '{path}'")
+                        continue
+                    self.completed[entry["row_id"]] = entry["result"]
+            logging.info(f"Resuming from checkpoint '{path}' with {len(self.completed)} completed rows")
+
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a partial line so the next record starts cleanly
+                    self._file.write("\n")
+
+    def __contains__(self, row_id):
+        return row_id in self.completed
+
+    def __len__(self):
+        return len(self.completed)
+
+    def record(self, row_id, result):
+        """
+        Appends the result for a row. Rows already in the journal are not written again.
+
+        Args:
+            row_id (int): The row id of the processed post.
+            result: A JSON-serializable result (e.g. a label or a dict of labels).
+        """
+        if row_id in self.completed:
+            return
+        with METRICS.timer("checkpoint_write"):
+            self._file.write(json.dumps({"row_id": row_id, "result": result}, ensure_ascii=False) + "\n")
+            self.completed[row_id] = result
+            self._pending += 1
+            if self._pending >= self.fsync_every:
+                self.flush()
+
+    def flush(self):
+        """
+        Forces all written records to disk.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,109 @@
+import json
+import logging
+
+VALID_LABELS = ("0", "1", "Uncertain")
+
+# Enough for '{"label": "Uncertain"}' plus whitespace; retries double it
+STRUCTURED_NUM_PREDICT = 16
+
+_output_model = None
+
+
+def _get_output_model():
+    """
+    Defines the Pydantic output model on first use, so that importing this module (and
+    with it the agents) does not pay for importing pydantic.
+    """
+    global _output_model
+    if _output_model is None:
+        from pydantic import BaseModel, field_validator
+
+        class ClassificationOutput(BaseModel):
+            """
+            A Pydantic model for validating classification outputs.
+
+            Attributes:
+                label (str): The classification label, which should be "0", "1", or "Uncertain".
+            """
+            label: str
+
+            @field_validator("label", mode="before")
+            @classmethod
+            def validate_label(cls, v):
+                """
+                Ensures that the label is one of the expected values.
+
+                Args:
+                    v (str): The label output from the model.
+
+                Returns:
+                    str: The validated label. If invalid, returns "invalid" and logs a warning.
+                """
+                if v not in VALID_LABELS:
+                    logging.warning(f"Unexpected model output '{v}'. Marking as 'invalid' for manual review.")
+                    return "invalid"
+                return v
+
+            @classmethod
+            def structured_output_schema(cls):
+                """
+                Returns the JSON schema passed to Ollama's `format=` for constrained decoding,
+                with the label restricted to the valid values.
+                """
+                schema = cls.model_json_schema()
+                schema["properties"]["label"]["enum"] = list(VALID_LABELS)
+                return schema
+
+        _output_model = ClassificationOutput
+    return _output_model
+
+
+def validate_label(label):
+    """
+    Validates a label with the output model.
+
+    Returns:
+        str: `label` if it is "0", "1" or "Uncertain", else "invalid" (with a warning).
+    """
+    return _get_output_model()(label=label).label
+
+
+def structured_output_schema():
+    """
+    Returns the JSON schema of the label output for Ollama's `format=` argument.
+    """
+    return _get_output_model().structured_output_schema()
+
+
+def normalize_label(text):
+    """
+    Maps a raw label string onto the canonical spelling, e.g. "UNCERTAIN" or "'1'." to
+    "Uncertain" and "1". Unknown values are returned stripped but otherwise unchanged.
+    """
+    cleaned = text.strip().strip("'\"`.").strip()
+    if cleaned.casefold() == "uncertain":
+        return "Uncertain"
+    return cleaned
+
+
+def parse_label(response):
+    """
+    Extracts and validates the label from a model response.
+
+    JSON responses from structured-output mode take a fast path (`{"label": ...}`);
+    anything else is treated as a bare label.
+
+    Returns:
+        str: "0", "1", "Uncertain", or "invalid".
+    """
+    text = response.strip()
+    if text.startswith("{"):
+        try:
+            value = json.loads(text).get("label")
+        except (json.JSONDecodeError, AttributeError):
+            value = None
+        text = value if isinstance(value, str) else text
+    label = normalize_label(text)
+    if label in VALID_LABELS:
+        return label
+    return validate_label(label)
@@ -0,0 +1,188 @@
+import logging
+from collections import defaultdict
+from metrics import METRICS, log_post_sample
+from checkpoint_journal import CheckpointJournal
+from dead_letter_queue import DeadLetterQueue
+
+
+class ClassificationPipelineMixin:
+    """
+    The dataset pipeline shared by the single-category agents (TopicCheckerAgent and
+    BaseClassificationAgent): chunked reading and writing, the checkpoint journal,
+    duplicate clustering, the prefilter cascade, model routing, batched prompts and the
+    end-of-run retry of failed rows.
+
+    Agents provide the prompting and validation through `classify_posts(posts, concurrency)`
+    and `classify_posts_batched(posts, max_batch_size, concurrency)`, which return one
+    label per post (None if the model could not be reached), and name their output with:
+        output_column (str): The label column written by `process_dataset`.
+        metrics_category (str): The category label of metrics and dead letters.
+    """
+
+    def _classify_step(self, concurrency, batch_size):
+        """
+        Returns:
+            int: Posts handed to `classify_posts` at a time; enough to keep every request slot busy.
+        """
+        return max(10, concurrency) * (batch_size or 1)
+
+    def _classify_chunk(self, raw_messages, row_ids, journal=None, concurrency=1, deduplicator=None, prefilter=None, batch_size=None, router=None):
+        """
+        Classifies one chunk of posts, skipping row ids already recorded in the journal.
+
+        A label is journaled for every member of its duplicate cluster, not just the
+        representative, so a resumed run skips exactly the finished rows whatever its
+        deduplication settings.
+
+        Returns:
+            tuple: The labels for `raw_messages` (None where the model could not be reached)
+            and the tier that produced each label ("prefilter", a router tier, or None
+            without a router), in order.
+        """
+        representatives = list(range(len(raw_messages)))
+        if deduplicator is not None:
+            representatives = deduplicator.cluster(raw_messages)
+        members = defaultdict(list)
+        for i, representative in enumerate(representatives):
+            members[representative].append(i)
+
+        labels = {}
+        tiers = {}
+        if journal is not None:
+            for i, row_id in enumerate(row_ids):
+                if row_id in journal:
+                    result = journal.completed[row_id]
+                    # With a router, the journal records the tier alongside the label
+                    labels[i], tiers[i] = (result["label"], result["tier"]) if isinstance(result, dict) else (result, None)
+        # Members without a journal entry take the label of their representative
+        pending = [i for i in sorted(members) if i not in labels]
+
+        def record(i):
+            if journal is None or labels[i] is None:
+                return
+            result = {"label": labels[i], "tier": tiers[i]} if router is not None else labels[i]
+            for member in members[i]:
+                journal.record(row_ids[member], result)
+
+        for i in members:
+            if i in labels:
+                record(i)
+
+        if prefilter is not None and pending:
+            routed = prefilter.route([raw_messages[i] for i in pending])
+            still_pending = []
+            for i, label in zip(pending, routed):
+                if label is None:
+                    still_pending.append(i)
+                    continue
+                labels[i] = label
+                tiers[i] = "prefilter" if router is not None else None
+                record(i)
+            pending = still_pending
+
+        def classify(agent, posts):
+            if batch_size:
+                return agent.classify_posts_batched(posts, batch_size, concurrency)
+            return agent.classify_posts(posts, concurrency)
+
+        step = self._classify_step(concurrency, batch_size)
+        for start in range(0, len(pending), step):
+            batch_ids = pending[start:start + step]
+            batch = [raw_messages[i] for i in batch_ids]
+            if router is not None:
+                batch_labels, batch_tiers = router.route(self, batch, classify)
+            else:
+                batch_labels, batch_tiers = classify(self, batch), [None] * len(batch)
+            METRICS.increment("posts_classified", len(batch), category=self.metrics_category)
+            for i, post, label, tier in zip(batch_ids, batch, batch_labels, batch_tiers):
+                log_post_sample("Processing post: %s → %s", post, label)
+                labels[i] = label
+                tiers[i] = tier
+                record(i)
+
+        rows = [i if i in labels else representative for i, representative in enumerate(representatives)]
+        return [labels[i] for i in rows], [tiers[i] for i in rows]
+
+    def _requeue_failed(self, dead_letters, outpath, journal=None, concurrency=1, batch_size=None, router=None, chunksize=None):
+        """
+        Retries the rows whose model call failed and fills their labels into the output.
+        """
+        from dataset_io import update_rows
+
+        def retry(entries):
+            labels, tiers = self._classify_chunk(
+                [entry["post"] for entry in entries], [entry["row_id"] for entry in entries], journal, concurrency,
+                batch_size=batch_size, router=router,
+            )
+            return [None if label is None else (label, tier) for label, tier in zip(labels, tiers)]
+
+        recovered = dead_letters.requeue(retry)
+        if recovered:
+            updates = {}
+            for entry, (label, tier) in recovered:
+                updates[entry["row_id"]] = {self.output_column: label}
+                if router is not None:
+                    updates[entry["row_id"]][f"{self.output_column} Tier"] = tier
+            update_rows(outpath, updates, chunksize)
+        dead_letters.save()
+
+    def process_dataset(self, inpath, outpath, checkpoint_path=None, concurrency=1, deduplicator=None, chunksize=None, prefilter=None, batch_size=None, metrics_path=None, router=None, dead_letter_path=None):
+        """
+        Processes a dataset of posts, classifying each one and saving the results.
+
+        Args:
+            inpath (str): Path to the input CSV or Parquet file containing the posts.
+            outpath (str): Path to save the output CSV or Parquet file with the labels in `output_column`.
+            checkpoint_path (str, optional): Path to a JSONL checkpoint journal. Rows already
+                recorded in it are skipped, so an interrupted run can be resumed.
+            concurrency (int, optional): Maximum number of parallel LLM requests. Defaults to 1.
+            deduplicator (PostDeduplicator, optional): If given, only one representative per
+                duplicate cluster is classified and its label is copied to the other members.
+                In streaming mode duplicates are detected within each chunk.
+            chunksize (int, optional): If given, the input is streamed in chunks of this many
+                rows and each classified chunk is appended to the output, keeping memory bounded.
+            prefilter (PrefilterCascade, optional): If given, posts the cascade labels with
+                confidence are not sent to the LLM.
+            batch_size (int, optional): If given, up to this many posts are packed into one
+                request (see `classify_posts_batched`).
+            metrics_path (str, optional): If given, stage timings, counters and Ollama token
+                counts are exported there at the end (`.jsonl` for JSON, else Prometheus text).
+            router (ModelRouter, optional): If given, posts are classified with its small
+                model and doubtful ones are escalated to its large model. The tier that
+                produced each label is written to an '<output_column> Tier' column.
+            dead_letter_path (str, optional): Where rows that still cannot be classified after
+                the end-of-run retries are listed (JSONL). Failed rows are retried either way;
+                their labels stay empty in the output and they are not checkpointed.
+
+        Returns:
+            None: Saves the classified dataset to `outpath`.
+        """
+        # pandas is only needed here, not by workers that just classify posts
+        from dataset_io import ROW_ID_COLUMN, ChunkWriter, iter_chunks
+
+        journal = CheckpointJournal(checkpoint_path) if checkpoint_path else None
+        dead_letters = DeadLetterQueue(dead_letter_path)
+        writer = ChunkWriter(outpath)
+        try:
+            for chunk in iter_chunks(inpath, chunksize):
+                raw_messages = chunk["Post Text"].tolist()
+                row_ids = chunk[ROW_ID_COLUMN].tolist()
+                labels, tiers = self._classify_chunk(raw_messages, row_ids, journal, concurrency, deduplicator, prefilter, batch_size, router)
+                chunk[self.output_column] = labels
+                if router is not None:
+                    chunk[f"{self.output_column} Tier"] = tiers
+                dead_letters.add_failed(row_ids, raw_messages, labels, self.metrics_category)
+                writer.write(chunk)
+            writer.close()
+            self._requeue_failed(dead_letters, outpath, journal, concurrency, batch_size, router, chunksize)
+        finally:
+            writer.close()
+            if journal is not None:
+                journal.close()
+        if prefilter is not None:
+            logging.info(f"Prefilter stage counts: {prefilter.stats}")
+        if router is not None:
+            router.log_report()
+        if metrics_path:
+            METRICS.export(metrics_path)
+        logging.info("Data saved successfully")
@@ -0,0 +1,173 @@
+import os
+import hashlib
+import pandas as pd
+from metrics import METRICS
+
+ROW_ID_COLUMN = "row_id"
+CONTENT_HASH_COLUMN = "content_hash"
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Reading or writing Parquet files requires the 'pyarrow' package.") from e
+    return pyarrow
+
+
+def _read_chunks(path, chunksize, columns, dtype=None):
+    if _is_parquet(path):
+        if chunksize is None:
+            yield pd.read_parquet(path, columns=columns)
+            return
+        pa = _require_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    if chunksize is None:
+        yield pd.read_csv(path, usecols=columns, dtype=dtype)
+        return
+    with pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunksize) as reader:
+        yield from reader
+
+
+def content_hashes(texts):
+    """
+    Fingerprints post texts, so a post whose text changed under the same row id can be
+    told apart from an unchanged one.
+
+    Returns:
+        list: A 16-character hex digest per text.
+    """
+    return [hashlib.blake2b(str(text).encode("utf-8"), digest_size=8).hexdigest() for text in texts]
+
+
+def iter_chunks(path, chunksize=None, columns=None, dtype=None):
+    """
+    Reads a CSV or Parquet dataset as a sequence of DataFrames.
+
+    Every chunk carries an integer `row_id` column identifying the post across agents,
+    checkpoints and outputs. If the input already has a `row_id` column it is kept,
+    otherwise the row's position in the file is used.
+
+    Args:
+        path (str): Path to a `.csv` or `.parquet` file.
+        chunksize (int, optional): Number of rows per chunk. If None, the whole file is
+            yielded as a single DataFrame.
+        columns (list, optional): Subset of columns to read.
+        dtype (type or dict, optional): Column types for CSV input, e.g. `str` to keep
+            labels and hashes from being parsed as numbers. Parquet files keep their schema.
+
+    Yields:
+        pd.DataFrame: Consecutive chunks of the dataset.
+    """
+    offset = 0
+    chunks = _read_chunks(path, chunksize, columns, dtype)
+    while True:
+        with METRICS.timer("read_chunk"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        if ROW_ID_COLUMN not in chunk.columns:
+            chunk.insert(0, ROW_ID_COLUMN, range(offset, offset + len(chunk)))
+        offset += len(chunk)
+        yield chunk
+
+
+def update_rows(path, updates, chunksize=None):
+    """
+    Rewrites a dataset with some of its cells replaced, matched by row id.
+
+    The file is streamed chunk by chunk into a temporary file, which then replaces it, so
+    an interruption leaves the original intact. CSV cells are read and written as text, so
+    the values that are not updated keep their exact representation.
+
+    Args:
+        path (str): Path to a `.csv` or `.parquet` file written by `ChunkWriter`.
+        updates (dict): Mapping of row id to a dict of column to new value. The columns
+            must already exist in the file.
+        chunksize (int, optional): Number of rows per chunk.
+
+    Returns:
+        pd.DataFrame: The updated rows, with all their columns.
+    """
+    updates = pd.DataFrame.from_dict(updates, orient="index")
+    tmp_path = os.path.join(os.path.dirname(path) or ".", "tmp-" + os.path.basename(path))
+    updated = []
+    writer = ChunkWriter(tmp_path)
+    try:
+        for chunk in iter_chunks(path, chunksize, dtype=None if _is_parquet(path) else str):
+            chunk = chunk.astype({ROW_ID_COLUMN: "int64"})
+            matched = chunk[ROW_ID_COLUMN].isin(updates.index).to_numpy()
+            if matched.any():
+                rows = updates.loc[chunk.loc[matched, ROW_ID_COLUMN]]
+                for column in updates.columns:
+                    values = rows[column].to_numpy()
+                    present = ~pd.isna(values)
+                    chunk.loc[chunk.index[matched][present], column] = values[present]
+                updated.append(chunk[matched])
+            writer.write(chunk)
+    finally:
+        writer.close()
+    os.replace(tmp_path, path)
+    return pd.concat(updated, ignore_index=True) if updated else pd.DataFrame()
+
+
+class ChunkWriter:
+    """
+    Incrementally writes DataFrame chunks to a CSV or Parquet file.
+
+    The output is truncated on the first write. CSV chunks are appended with a single
+    header; Parquet chunks are written as one row group each, using the schema of the
+    first chunk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows_written = 0
+        self._started = False
+        self._parquet_writer = None
+        self._schema = None
+
+    def write(self, chunk):
+        with METRICS.timer("write_chunk"):
+            self._write(chunk)
+        self._started = True
+        self.rows_written += len(chunk)
+
+    def _write(self, chunk):
+        if _is_parquet(self.path):
+            pa = _require_pyarrow()
+            if self._parquet_writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                # A column with no values yet (e.g. the labels of failed rows) is typed as
+                # text rather than null, so later chunks with values still fit the schema
+                self._schema = pa.schema(
+                    [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema],
+                    metadata=table.schema.metadata,
+                )
+                table = table.cast(self._schema)
+                self._parquet_writer = pa.parquet.ParquetWriter(self.path, self._schema)
+            else:
+                table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+            self._parquet_writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
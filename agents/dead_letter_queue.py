@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import time
+from metrics import METRICS
+
+
+class DeadLetterQueue:
+    """
+    Rows whose model call failed for good, set aside so the rest of the run can go on.
+
+    A failed row gets no label: it is neither written to the checkpoint journal nor given
+    an error string as its label, so it cannot be mistaken for a result. At the end of the
+    run `requeue` retries the queued rows, by which time a server hiccup has usually passed.
+    Rows that still fail are written to `path` (one JSON line per row) for inspection; they
+    stay unlabelled in the output and a resumed run picks them up again.
+
+    Attributes:
+        path (str): Optional JSONL file the rows still failing after `requeue` are written to.
+        rounds (int): Retry rounds run by `requeue`.
+        round_delay (float): Seconds to wait before every retry round after the first.
+        entries (list): The queued rows as dicts with `row_id`, `post` and `category`.
+    """
+
+    def __init__(self, path=None, rounds=2, round_delay=30.0):
+        self.path = path
+        self.rounds = rounds
+        self.round_delay = round_delay
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, row_id, post, category=None):
+        self.entries.append({"row_id": row_id, "post": post, "category": category})
+        METRICS.increment("dead_letters", category=category or "default")
+
+    def add_failed(self, row_ids, posts, labels, category=None):
+        """
+        Queues every row whose label is None.
+        """
+        for row_id, post, label in zip(row_ids, posts, labels):
+            if label is None:
+                self.add(row_id, post, category)
+
+    def requeue(self, retry):
+        """
+        Retries the queued rows.
+
+        Args:
+            retry (callable): `retry(entries)` returning one result per entry, None for the
+                rows that failed again.
+
+        Returns:
+            list: (entry, result) pairs of the rows that succeeded.
+        """
+        recovered = []
+        for round_number in range(1, self.rounds + 1):
+            if not self.entries:
+                break
+            if round_number > 1:
+                time.sleep(self.round_delay)
+            entries, self.entries = self.entries, []
+            logging.info(f"Retrying {len(entries)} failed requests (round {round_number} of {self.rounds})")
+            for entry, result in zip(entries, retry(entries)):
+                if result is None:
+                    self.entries.append(entry)
+                else:
+                    recovered.append((entry, result))
+        METRICS.increment("dead_letters_recovered", len(recovered))
+        if self.entries:
+            logging.error(f"{len(self.entries)} labels could not be obtained and are left empty")
+        return recovered
+
+    def save(self):
+        """
+        Writes the rows still queued to `path`, or removes a stale file if there are none.
+        """
+        if not self.path:
+            return
+        if not self.entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        logging.info(f"Unclassified rows written to '{self.path}'")
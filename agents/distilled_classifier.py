@@ -0,0 +1,267 @@
+import json
+import logging
+import numpy as np
+from metrics import METRICS
+from classification_pipeline import ClassificationPipelineMixin
+from text_features import HashingTfidfVectorizer, SparseLogisticRegression
+
+
+def _agreement_report(llm_labels, predicted):
+    """
+    Compares predicted "0"/"1" labels with the LLM's on the same posts.
+    """
+    llm = np.asarray(llm_labels) == "1"
+    model = np.asarray(predicted) == "1"
+    decided = np.asarray(predicted) != "Uncertain"
+    llm, model = llm[decided], model[decided]
+    n = len(llm)
+    true_positives = int((llm & model).sum())
+    agreement = float((llm == model).mean()) if n else float("nan")
+    # Cohen's kappa: agreement corrected for what the label rates alone would give
+    expected = float(llm.mean() * model.mean() + (1 - llm.mean()) * (1 - model.mean())) if n else float("nan")
+    return {
+        "sample_size": len(predicted),
+        "coverage": n / len(predicted) if len(predicted) else 0.0,
+        "agreement": agreement,
+        "kappa": (agreement - expected) / (1 - expected) if n and expected < 1 else float("nan"),
+        "precision": true_positives / int(model.sum()) if model.sum() else float("nan"),
+        "recall": true_positives / int(llm.sum()) if llm.sum() else float("nan"),
+        "llm_positive_rate": float(llm.mean()) if n else float("nan"),
+        "model_positive_rate": float(model.mean()) if n else float("nan"),
+    }
+
+
+class DistilledClassifier:
+    """
+    A compact multi-label classifier trained on LLM labels, for bulk inference on CPU.
+
+    Posts are turned into hashed TF-IDF n-gram vectors once; every category then has its own
+    logistic regression over the same features, so all categories of a post are scored
+    with a single sparse-dense product. Only "0"/"1" labels are learned from; "Uncertain"
+    and "invalid" LLM labels are ignored for that category. Predictions whose probability
+    lies within `uncertain_margin` of the threshold are labelled "Uncertain", so they can be
+    sent to the LLM instead.
+
+    Attributes:
+        categories (list): The label columns the classifier predicts.
+        threshold (float): Minimum probability for a "1".
+        uncertain_margin (float): Half-width of the band around `threshold` labelled "Uncertain".
+        report (dict): Per-category agreement with the LLM on the held-out split, set by `fit`.
+    """
+
+    def __init__(self, categories, n_features=2 ** 20, ngram_range=(1, 2), threshold=0.5, uncertain_margin=0.0, l2=1e-4, epochs=300):
+        self.categories = list(categories)
+        self.threshold = threshold
+        self.uncertain_margin = uncertain_margin
+        self.l2 = l2
+        self.epochs = epochs
+        self.vectorizer = HashingTfidfVectorizer(n_features=n_features, ngram_range=ngram_range)
+        self.coef_ = None
+        self.intercept_ = None
+        self.report = {}
+
+    def fit(self, texts, labels, holdout=0.2, seed=0):
+        """
+        Trains one model per category and measures agreement with the LLM on a held-out split.
+
+        Args:
+            texts (list): The posts labelled by the LLM.
+            labels (dict or pd.DataFrame): For every category, the LLM labels of `texts`.
+            holdout (float, optional): Fraction of the posts kept for evaluation.
+            seed (int, optional): Seed for the train/held-out split.
+
+        Returns:
+            DistilledClassifier: self
+        """
+        texts = [str(text) for text in texts]
+        order = np.random.default_rng(seed).permutation(len(texts))
+        n_holdout = int(len(texts) * holdout)
+        held_out, train = order[:n_holdout], order[n_holdout:]
+
+        self.vectorizer.fit([texts[i] for i in train])
+        X = self.vectorizer.transform(texts)
+        self.coef_ = np.zeros((X.n_cols, len(self.categories)))
+        self.intercept_ = np.zeros(len(self.categories))
+        for k, category in enumerate(self.categories):
+            column = np.asarray([str(label) for label in labels[category]], dtype=object)
+            usable = np.isin(column, ("0", "1"))
+            rows = train[usable[train]]
+            y = (column[rows] == "1").astype(float)
+            if len(rows) == 0 or y.min() == y.max():
+                raise ValueError(f"Category '{category}' needs both '0' and '1' labels to train on.")
+            model = SparseLogisticRegression(l2=self.l2, epochs=self.epochs, class_weight="balanced").fit(X.take(rows), y)
+            self.coef_[:, k] = model.coef_
+            self.intercept_[k] = model.intercept_
+
+            evaluation = held_out[usable[held_out]]
+            if len(evaluation):
+                predicted = self._labels(self._sigmoid(X.take(evaluation).dot(model.coef_) + model.intercept_))
+                self.report[category] = {"train_size": len(rows), **_agreement_report(column[evaluation], predicted)}
+        logging.info(f"Distilled classifier held-out report: {json.dumps(self.report, indent=2)}")
+        return self
+
+    @staticmethod
+    def _sigmoid(z):
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -35, 35)))
+
+    def _labels(self, probabilities):
+        labels = np.where(probabilities >= self.threshold, "1", "0").astype(object)
+        labels[np.abs(probabilities - self.threshold) < self.uncertain_margin] = "Uncertain"
+        return labels
+
+    def predict_proba(self, texts):
+        """
+        Returns:
+            np.ndarray: (n_posts, n_categories) probabilities of a "1".
+        """
+        if self.coef_ is None:
+            raise RuntimeError("The classifier has not been fitted or loaded.")
+        with METRICS.timer("distilled_predict"):
+            X = self.vectorizer.transform([str(text) for text in texts])
+            return self._sigmoid(X.dot(self.coef_) + self.intercept_)
+
+    def predict(self, texts):
+        """
+        Returns:
+            dict: Category name to the list of labels ("0", "1" or "Uncertain") for `texts`.
+        """
+        labels = self._labels(self.predict_proba(texts))
+        return {category: labels[:, k].tolist() for k, category in enumerate(self.categories)}
+
+    def save(self, path):
+        """
+        Writes the model to a compressed `.npz` file.
+        """
+        config = {
+            "categories": self.categories, "n_features": self.vectorizer.n_features,
+            "ngram_range": list(self.vectorizer.ngram_range), "threshold": self.threshold,
+            "uncertain_margin": self.uncertain_margin, "report": self.report,
+        }
+        np.savez_compressed(
+            path, coef=self.coef_.astype(np.float32), intercept=self.intercept_,
+            idf=self.vectorizer.idf.astype(np.float32), config=np.array(json.dumps(config)),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as archive:
+            config = json.loads(str(archive["config"]))
+            classifier = cls(
+                config["categories"], n_features=config["n_features"], ngram_range=tuple(config["ngram_range"]),
+                threshold=config["threshold"], uncertain_margin=config["uncertain_margin"],
+            )
+            classifier.coef_ = archive["coef"].astype(np.float64)
+            classifier.intercept_ = archive["intercept"]
+            classifier.vectorizer.idf = archive["idf"].astype(np.float64)
+        classifier.report = config["report"]
+        return classifier
+
+    @classmethod
+    def fit_from_results(cls, sources, text_col="Post Text", holdout=0.2, seed=0, **kwargs):
+        """
+        Trains on the outputs of the LLM agents, joined on `row_id`.
+
+        Args:
+            sources (dict): Path of an output file (orchestrator, TopicCheckerAgent or
+                BaseClassificationAgent) to the label columns to learn from it, e.g.
+                `{"data/post_isr_result.csv": ["About Israel"], "data/combined_results.csv":
+                ["General Concerns", ...]}`. The post texts are taken from the first file.
+            **kwargs: Further DistilledClassifier arguments.
+        """
+        import pandas as pd
+        from dataset_io import ROW_ID_COLUMN, iter_chunks
+
+        frame = None
+        for path, columns in sources.items():
+            read = [text_col] + list(columns) if frame is None else list(columns)
+            data = pd.concat(
+                [chunk[[ROW_ID_COLUMN] + read] for chunk in iter_chunks(path, 100000, dtype=str)], ignore_index=True
+            ).astype({ROW_ID_COLUMN: "int64"})
+            frame = data if frame is None else frame.merge(data, on=ROW_ID_COLUMN, how="left")
+        categories = [column for columns in sources.values() for column in columns]
+        frame = frame.dropna(subset=[text_col])
+        return cls(categories, **kwargs).fit(frame[text_col].tolist(), frame, holdout=holdout, seed=seed)
+
+    def process_dataset(self, inpath, outpath, chunksize=None, metrics_path=None):
+        """
+        Labels every post of a dataset for all categories, like the orchestrator's output.
+        """
+        from dataset_io import ChunkWriter, iter_chunks
+
+        writer = ChunkWriter(outpath)
+        try:
+            for chunk in iter_chunks(inpath, chunksize):
+                for category, labels in self.predict(chunk["Post Text"].fillna("").tolist()).items():
+                    chunk[category] = labels
+                METRICS.increment("posts_classified", len(chunk), category="distilled")
+                writer.write(chunk)
+        finally:
+            writer.close()
+        if metrics_path:
+            METRICS.export(metrics_path)
+        logging.info("Data saved successfully")
+
+
+class DistilledAgent(ClassificationPipelineMixin):
+    """
+    A drop-in replacement for a TopicCheckerAgent or BaseClassificationAgent that labels
+    one category with a DistilledClassifier instead of the LLM. It shares their dataset
+    pipeline, so checkpoints, duplicate clustering and the prefilter work the same way.
+
+    Attributes:
+        classifier (DistilledClassifier): The trained classifier.
+        category_name (str): The category this agent labels.
+        output_column (str): The column written by `process_dataset`; defaults to the
+            category name ("Classification" matches TopicCheckerAgent's output).
+    """
+
+    # Posts scored per classifier call in `process_dataset`
+    PREDICT_STEP = 10000
+
+    def __init__(self, classifier, category_name, output_column=None):
+        if category_name not in classifier.categories:
+            raise ValueError(f"The classifier was not trained for '{category_name}'.")
+        self.classifier = classifier
+        self.category_name = category_name
+        self.output_column = output_column or category_name
+        self._index = classifier.categories.index(category_name)
+
+    def classify_posts(self, posts, concurrency=1):
+        """
+        Returns:
+            list: The labels for `posts`. `concurrency` is accepted for compatibility only.
+        """
+        if not posts:
+            return []
+        # Missing posts (NaN) are scored as empty text
+        posts = [post if isinstance(post, str) else "" for post in posts]
+        return self.classifier._labels(self.classifier.predict_proba(posts)[:, self._index]).tolist()
+
+    def classify_posts_batched(self, posts, max_batch_size, concurrency=1):
+        return self.classify_posts(posts)
+
+    def classify_post(self, post_text):
+        return self.classify_posts([post_text])[0]
+
+    @property
+    def metrics_category(self):
+        return self.category_name
+
+    def _classify_step(self, concurrency, batch_size):
+        # The classifier scores a whole slice of the chunk in one call
+        return self.PREDICT_STEP
+
+    def process_dataset(self, inpath, outpath, checkpoint_path=None, concurrency=1, deduplicator=None, chunksize=None, prefilter=None, batch_size=None, metrics_path=None, router=None, dead_letter_path=None):
+        """
+        Labels every post of a dataset and writes it with the label column added.
+
+        Takes the same arguments as the LLM agents' `process_dataset`. `concurrency`,
+        `batch_size` and `router` are accepted but ignored, as there are no model calls to
+        parallelise, pack or route.
+        """
+        if router is not None:
+            logging.warning(f"The router is ignored; '{self.category_name}' is labelled by the distilled classifier")
+        super().process_dataset(
+            inpath, outpath, checkpoint_path, deduplicator=deduplicator, chunksize=chunksize, prefilter=prefilter,
+            metrics_path=metrics_path, dead_letter_path=dead_letter_path,
+        )
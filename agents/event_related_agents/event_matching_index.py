@@ -0,0 +1,279 @@
+import os
+import glob
+import logging
+import numpy as np
+import pandas as pd
+
+from dataset_io import ROW_ID_COLUMN, ChunkWriter, iter_chunks
+from llm_client import shared_transport
+from text_features import HashingTfidfVectorizer
+from event_store import read_event_file
+
+
+def load_events(events_dir):
+    """
+    Loads all EventRegistry parquet dumps in `events_dir` and deduplicates events across them.
+
+    The same event appears in several per-concept files (e.g. Israel and Hamas); it is kept
+    once, with the names of all source files it was found in. For repeated use prefer an
+    `EventStore`, which does this once and incrementally.
+
+    Args:
+        events_dir (str): Directory containing `*.parquet` event dumps, e.g. `data/isr_events`.
+
+    Returns:
+        pd.DataFrame: One row per event URI with columns `uri`, `eventDate` (datetime64),
+        `title`, `summary`, `concepts` (list of concept labels), `totalArticleCount` and
+        `source_concepts`, sorted by event date.
+    """
+    paths = sorted(glob.glob(os.path.join(events_dir, "*.parquet")))
+    if not paths:
+        raise FileNotFoundError(f"No event parquet files found in '{events_dir}'.")
+
+    events = pd.concat([read_event_file(path) for path in paths], ignore_index=True)
+    source_concepts = events.groupby("uri", sort=False)["source_concept"].agg(lambda names: sorted(set(names)))
+    events = events.drop_duplicates("uri").drop(columns=["source_concept", "snapshot"]).set_index("uri")
+    events["source_concepts"] = source_concepts
+    events = events.reset_index()
+    logging.info(f"Loaded {len(events)} unique events from {len(paths)} files")
+    return events.sort_values("eventDate", kind="stable").reset_index(drop=True)
+
+
+def event_text(event):
+    """
+    The text indexed for an event: title, concept labels and summary.
+    """
+    return f"{event['title']}\n{', '.join(event['concepts'])}\n{event['summary']}"
+
+
+class TfidfEncoder:
+    """
+    Sparse hashed TF-IDF encoder, fitted on the event texts. Needs no model server; works
+    best on the named entities (people, places, organisations) that posts and events share.
+    """
+
+    def __init__(self, n_features=2 ** 20, ngram_range=(1, 2)):
+        self.vectorizer = HashingTfidfVectorizer(n_features=n_features, ngram_range=ngram_range)
+
+    def fit(self, texts):
+        self.vectorizer.fit(texts)
+        return self
+
+    def encode(self, texts):
+        return self.vectorizer.transform(texts)
+
+    @staticmethod
+    def similarity(posts, events):
+        return posts.dot_t(events)
+
+    @staticmethod
+    def similarity_blocks(posts, events):
+        """
+        Yields (first post, dense similarity block) pairs of bounded size.
+        """
+        return posts.iter_dot_t(events)
+
+    @staticmethod
+    def take(vectors, rows):
+        return vectors.take(rows)
+
+
+class OllamaEmbeddingEncoder:
+    """
+    Dense encoder backed by a local Ollama embedding model. A multilingual model such as
+    `bge-m3` lets German posts match English event descriptions.
+
+    Requests go through the host's shared `ResilientTransport`, so they are retried and
+    paused by its circuit breaker like the chat requests of the agents.
+    """
+
+    def __init__(self, model="bge-m3", host=None, timeout=None, batch_size=64, max_chars=2000, transport=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+        self.transport = transport or shared_transport(host, timeout)
+
+    def fit(self, texts):
+        return self
+
+    def encode(self, texts):
+        """
+        Returns:
+            np.ndarray: One L2-normalized embedding row per text.
+        """
+        texts = [str(text)[:self.max_chars] for text in texts]
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            embeddings = self.transport.embed(self.model, texts[start:start + self.batch_size])
+            vectors.append(np.asarray(embeddings, dtype=np.float32))
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = np.vstack(vectors)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @staticmethod
+    def similarity(posts, events):
+        return posts @ events.T
+
+    @staticmethod
+    def similarity_blocks(posts, events, max_block_size=2 ** 22):
+        """
+        Yields (first post, dense similarity block) pairs of at most `max_block_size` cells.
+        """
+        step = max(1, max_block_size // max(len(events), 1))
+        for start in range(0, len(posts), step):
+            yield start, posts[start:start + step] @ events.T
+
+    @staticmethod
+    def take(vectors, rows):
+        return vectors[rows]
+
+
+class EventMatchingIndex:
+    """
+    Matches posts to EventRegistry events by text similarity within a time window.
+
+    Events are encoded once and kept sorted by date, so the events within ±`window_days`
+    of a day form one contiguous slice. Posts are grouped by day and every group is scored
+    against its slice in blocks of bounded size; each block is reduced to the top-k events
+    per post with `argpartition` before the next is formed, so the full similarity matrix
+    is never held. There are no per-(post, event) Python loops.
+
+    Attributes:
+        events (pd.DataFrame): The deduplicated events, sorted by date.
+        encoder: `TfidfEncoder` (default) or `OllamaEmbeddingEncoder`.
+        window_days (int): Maximum distance in days between post and event.
+        top_k (int): Number of events returned per post.
+        min_score (float): Matches scoring below this similarity are dropped. Matches
+            without any similarity are always dropped.
+        batch_size (int): Maximum posts encoded at a time.
+    """
+
+    def __init__(self, events, encoder=None, window_days=3, top_k=5, min_score=0.0, batch_size=1024):
+        self.events = events.sort_values("eventDate", kind="stable").reset_index(drop=True)
+        self.encoder = encoder or TfidfEncoder()
+        self.window_days = window_days
+        self.top_k = top_k
+        self.min_score = min_score
+        self.batch_size = batch_size
+        self.event_days = self.events["eventDate"].values.astype("datetime64[D]").astype(np.int64)
+
+        texts = [event_text(event) for _, event in self.events.iterrows()]
+        self.encoder.fit(texts)
+        self.event_vectors = self.encoder.encode(texts)
+
+    @classmethod
+    def from_directory(cls, events_dir, **kwargs):
+        """
+        Builds the index from a directory of EventRegistry parquet dumps (see `load_events`).
+        """
+        return cls(load_events(events_dir), **kwargs)
+
+    @classmethod
+    def from_store(cls, store, start=None, end=None, concepts=None, **kwargs):
+        """
+        Builds the index from the events of an `EventStore` in a date range and/or concepts.
+        """
+        return cls(store.query(start, end, concepts), **kwargs)
+
+    def match(self, texts, dates, row_ids=None):
+        """
+        Finds the top-k events for each post within the time window.
+
+        Args:
+            texts (list): The post texts.
+            dates (list): The post dates (anything `pd.to_datetime` accepts). Posts without a
+                valid date are not matched.
+            row_ids (list, optional): Identifiers carried into the result. Defaults to positions.
+
+        Returns:
+            pd.DataFrame: One row per match with columns `row_id`, `rank`, `event_uri`,
+            `event_date`, `event_title` and `score`, ordered by row id and rank.
+        """
+        row_ids = list(range(len(texts))) if row_ids is None else list(row_ids)
+        post_days = pd.to_datetime(pd.Series(list(dates)), errors="coerce", utc=True).dt.tz_localize(None)
+        post_days = post_days.values.astype("datetime64[D]")
+
+        matched_rows, matched_events, matched_scores, matched_ranks = [], [], [], []
+        valid = ~np.isnat(post_days)
+        positions = np.flatnonzero(valid)
+        days = post_days[valid].astype(np.int64)
+        order = np.argsort(days, kind="stable")
+        positions, days = positions[order], days[order]
+        unique_days, day_starts = np.unique(days, return_index=True)
+        for day, day_positions in zip(unique_days, np.split(positions, day_starts[1:])):
+            low = np.searchsorted(self.event_days, day - self.window_days, side="left")
+            high = np.searchsorted(self.event_days, day + self.window_days, side="right")
+            if low == high:
+                continue
+            window = self.encoder.take(self.event_vectors, np.arange(low, high))
+            for start in range(0, len(day_positions), self.batch_size):
+                batch = day_positions[start:start + self.batch_size]
+                vectors = self.encoder.encode([texts[i] for i in batch])
+                for offset, scores in self.encoder.similarity_blocks(vectors, window):
+                    post_index, top, top_scores, rank = self._top_k(scores)
+                    matched_rows.append(batch[offset + post_index])
+                    matched_events.append(top + low)
+                    matched_scores.append(top_scores)
+                    matched_ranks.append(rank)
+
+        if not matched_rows:
+            return pd.DataFrame(columns=[ROW_ID_COLUMN, "rank", "event_uri", "event_date", "event_title", "score"])
+        rows = np.concatenate(matched_rows)
+        events = self.events.iloc[np.concatenate(matched_events)]
+        result = pd.DataFrame({
+            ROW_ID_COLUMN: np.asarray(row_ids, dtype=object)[rows],
+            "rank": np.concatenate(matched_ranks),
+            "event_uri": events["uri"].values,
+            "event_date": events["eventDate"].dt.date.values,
+            "event_title": events["title"].values,
+            "score": np.concatenate(matched_scores),
+        })
+        return result.sort_values([ROW_ID_COLUMN, "rank"], kind="stable").reset_index(drop=True)
+
+    def _top_k(self, scores):
+        """
+        Reduces a block of similarities to the best `top_k` events per post.
+
+        Returns:
+            tuple: Post index within the block, event index within the window, score and
+            rank (1 = best) of every kept match.
+        """
+        k = min(self.top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+        keep = (top_scores > 0) & (top_scores >= self.min_score)
+        post_index, rank = np.nonzero(keep)
+        return post_index, top[keep], top_scores[keep], rank + 1
+
+    def process_dataset(self, inpath, outpath, text_col="Post Text", date_col="date", chunksize=None, filter_col=None):
+        """
+        Matches the posts of a classified dataset to events and saves the matches.
+
+        Args:
+            inpath (str): Path to the input CSV or Parquet file with the posts.
+            outpath (str): Path to save the matches (one row per post and event).
+            text_col (str, optional): Column with the post text.
+            date_col (str, optional): Column with the post date.
+            chunksize (int, optional): If given, the input is streamed in chunks of this many rows.
+            filter_col (str, optional): If given, only posts whose value in this column is 1
+                (e.g. a classification column such as "About Israel") are matched.
+
+        Returns:
+            None: Saves the matches to `outpath`.
+        """
+        writer = ChunkWriter(outpath)
+        try:
+            for chunk in iter_chunks(inpath, chunksize):
+                if filter_col is not None:
+                    chunk = chunk[chunk[filter_col].astype(str) == "1"]
+                matches = self.match(chunk[text_col].fillna("").astype(str).tolist(), chunk[date_col].tolist(), chunk[ROW_ID_COLUMN].tolist())
+                writer.write(matches)
+                print(f"Matched {matches[ROW_ID_COLUMN].nunique()} of {len(chunk)} posts to events")
+        finally:
+            writer.close()
+        print("Data saved successfully")
@@ -0,0 +1,298 @@
+import os
+import glob
+import json
+import hashlib
+import logging
+import time
+import pandas as pd
+
+from dataset_io import _require_pyarrow
+
+EVENT_COLUMNS = ["uri", "eventDate", "title.eng", "summary.eng", "concepts", "totalArticleCount"]
+MANIFEST_NAME = "manifest.json"
+CONCEPT_INDEX_NAME = "concept_index.parquet"
+
+
+def snapshot_info(path):
+    """
+    Parses a snapshot file name of the form '<unix timestamp>_<Concept>.parquet'.
+
+    Returns:
+        tuple: (timestamp, concept). Files without a timestamp prefix get their
+        modification time and the whole stem as concept.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    prefix, _, concept = stem.partition("_")
+    try:
+        return float(prefix), concept or stem
+    except ValueError:
+        return os.path.getmtime(path), stem
+
+
+def concept_key(concept):
+    """
+    Normalizes a concept name so that file concepts ('Gaza_Strip') and EventRegistry
+    concept labels ('Gaza Strip') compare equal.
+    """
+    return str(concept).replace("_", " ").strip().casefold()
+
+
+def _concept_labels(concepts):
+    if concepts is None:
+        return []
+    labels = []
+    for concept in concepts:
+        label = (concept.get("label") or {}).get("eng") if isinstance(concept, dict) else None
+        if label:
+            labels.append(label)
+    return labels
+
+
+def read_event_file(path):
+    """
+    Reads one EventRegistry parquet dump into the normalized event schema.
+
+    Returns:
+        pd.DataFrame: Columns `uri`, `eventDate` (datetime64), `title`, `summary`,
+        `concepts` (list of concept labels), `totalArticleCount`, `source_concept`
+        (from the file name) and `snapshot` (the file's timestamp).
+    """
+    timestamp, concept = snapshot_info(path)
+    events = pd.read_parquet(path, columns=EVENT_COLUMNS)
+    events = events.rename(columns={"title.eng": "title", "summary.eng": "summary"})
+    events["concepts"] = events["concepts"].map(_concept_labels)
+    events["eventDate"] = pd.to_datetime(events["eventDate"])
+    events["title"] = events["title"].fillna("")
+    events["summary"] = events["summary"].fillna("")
+    events["source_concept"] = concept
+    events["snapshot"] = timestamp
+    return events
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EventStore:
+    """
+    A columnar store of EventRegistry events built incrementally from snapshot files.
+
+    Layout under `root`:
+        month=YYYY-MM/events.parquet  one partition per event month, sorted by date and URI
+        concept_index.parquet         (concept, uri, month) for every file concept and concept label
+        manifest.json                 ingested files (by content hash) and partition row counts
+
+    Every event URI is stored once. When a URI shows up again in a newer snapshot, the
+    newer row wins and the source concepts of both are merged. Ingestion only rewrites the
+    month partitions it touches, and files whose content was already ingested (e.g. the
+    copies under `isr_oct_analysis/data/isr_events`) are skipped. Queries read only the
+    partitions in the requested date range and push the date and URI predicates down to
+    the parquet reader, so row groups outside the range are not decoded.
+
+    Attributes:
+        root (str): Directory of the store.
+        row_group_size (int): Rows per parquet row group; smaller groups prune more finely.
+        manifest (dict): The loaded manifest.
+    """
+
+    def __init__(self, root, row_group_size=10000):
+        self.root = root
+        self.row_group_size = row_group_size
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        path = os.path.join(self.root, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return {"files": {}, "partitions": {}}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        path = os.path.join(self.root, MANIFEST_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    def _partition_path(self, month):
+        return os.path.join(self.root, f"month={month}", "events.parquet")
+
+    def _write_parquet(self, frame, path):
+        pa = _require_pyarrow()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        pa.parquet.write_table(table, path + ".tmp", row_group_size=self.row_group_size)
+        os.replace(path + ".tmp", path)
+
+    def _read_concept_index(self, filters=None):
+        path = os.path.join(self.root, CONCEPT_INDEX_NAME)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=["concept", "uri", "month"])
+        pa = _require_pyarrow()
+        return pa.parquet.read_table(path, filters=filters).to_pandas()
+
+    @property
+    def months(self):
+        return sorted(self.manifest["partitions"])
+
+    def ingest(self, paths):
+        """
+        Ingests snapshot files that have not been ingested yet.
+
+        Args:
+            paths (str or list): A directory of `*.parquet` snapshots, or a list of files/directories.
+
+        Returns:
+            dict: Counts of `files_ingested`, `files_skipped` and `events_written`.
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+        files = []
+        for path in paths:
+            files.extend(sorted(glob.glob(os.path.join(path, "*.parquet"))) if os.path.isdir(path) else [path])
+
+        new_files, skipped = {}, 0
+        for path in files:
+            digest = _file_digest(path)
+            if digest in self.manifest["files"] or digest in new_files:
+                skipped += 1
+                continue
+            new_files[digest] = path
+        if not new_files:
+            return {"files_ingested": 0, "files_skipped": skipped, "events_written": 0}
+
+        incoming = pd.concat([read_event_file(path) for path in new_files.values()], ignore_index=True)
+        incoming = self._merge_versions(incoming)
+        incoming["month"] = incoming["eventDate"].dt.strftime("%Y-%m")
+
+        # URIs already stored in other months have to be removed from their old partition
+        index = self._read_concept_index()
+        stored_months = index.drop_duplicates("uri").set_index("uri")["month"]
+        previous_months = stored_months.reindex(incoming["uri"]).dropna()
+        moved = previous_months[previous_months != incoming.set_index("uri")["month"].reindex(previous_months.index)]
+        if not moved.empty:
+            # Merge the stored versions in first, so the moved events keep their source concepts
+            stored = [
+                pd.read_parquet(self._partition_path(month), filters=[("uri", "in", list(uris.index))])
+                for month, uris in moved.groupby(moved)
+            ]
+            incoming = self._merge_versions(pd.concat([incoming.drop(columns="month"), *stored], ignore_index=True))
+            incoming["month"] = incoming["eventDate"].dt.strftime("%Y-%m")
+        affected = sorted(set(incoming["month"]) | set(previous_months))
+
+        written, partitions = 0, []
+        for month in affected:
+            path = self._partition_path(month)
+            existing = pd.read_parquet(path) if os.path.exists(path) else incoming.iloc[:0].drop(columns="month")
+            new_rows = incoming[incoming["month"] == month].drop(columns="month")
+            partition = self._merge_versions(pd.concat([existing, new_rows], ignore_index=True), incoming["uri"], new_rows["uri"])
+            partition = partition.sort_values(["eventDate", "uri"], kind="stable").reset_index(drop=True)
+            if partition.empty:
+                os.remove(path)
+                self.manifest["partitions"].pop(month, None)
+            else:
+                self._write_parquet(partition, path)
+                self.manifest["partitions"][month] = {"rows": len(partition)}
+                partitions.append(partition.assign(month=month))
+            written += len(new_rows)
+
+        self._write_concept_index(index, affected, partitions)
+        ingested_at = time.time()
+        for digest, path in new_files.items():
+            timestamp, concept = snapshot_info(path)
+            self.manifest["files"][digest] = {
+                "path": path, "concept": concept, "snapshot": timestamp, "ingested_at": ingested_at,
+            }
+        self._save_manifest()
+        logging.info(f"Ingested {len(new_files)} files ({skipped} already ingested), {written} events written")
+        return {"files_ingested": len(new_files), "files_skipped": skipped, "events_written": written}
+
+    @staticmethod
+    def _merge_versions(events, incoming_uris=None, keep_uris=None):
+        """
+        Keeps one row per URI: the one from the newest snapshot, with the source concepts of
+        all rows merged. When rewriting a partition, rows whose URI was re-ingested into a
+        different month (in `incoming_uris` but not in `keep_uris`) are dropped.
+        """
+        if "source_concepts" not in events:
+            events = events.assign(source_concepts=events["source_concept"].map(lambda concept: [concept]))
+        if "source_concept" in events:
+            events = events.drop(columns="source_concept")
+        if incoming_uris is not None:
+            moved = set(incoming_uris) - set(keep_uris)
+            events = events[~events["uri"].isin(moved)]
+        if events.empty:
+            return events
+        concepts = events.groupby("uri", sort=False)["source_concepts"].agg(
+            lambda lists: sorted({concept for concept_list in lists for concept in concept_list})
+        )
+        events = events.sort_values("snapshot", kind="stable").drop_duplicates("uri", keep="last").set_index("uri")
+        events["source_concepts"] = concepts
+        return events.reset_index()
+
+    def _write_concept_index(self, index, affected, partitions):
+        # Index entries of the rewritten months are rebuilt from the partitions just written
+        frames = [index[~index["month"].isin(affected)]]
+        for partition in partitions:
+            rows = partition[["uri", "month"]].copy()
+            rows["concept"] = [
+                sorted({concept_key(concept) for concept in list(sources) + list(labels)})
+                for sources, labels in zip(partition["source_concepts"], partition["concepts"])
+            ]
+            frames.append(rows[["concept", "uri", "month"]].explode("concept").dropna(subset=["concept"]))
+        index = pd.concat(frames, ignore_index=True)
+        self._write_parquet(index.sort_values(["concept", "month", "uri"]).reset_index(drop=True), os.path.join(self.root, CONCEPT_INDEX_NAME))
+
+    def query(self, start=None, end=None, concepts=None, columns=None):
+        """
+        Reads the events in a date range, optionally restricted to concepts.
+
+        Args:
+            start (str or datetime, optional): First event date (inclusive).
+            end (str or datetime, optional): Last event date (inclusive).
+            concepts (list, optional): File concepts or concept labels, e.g. ['Hamas', 'Gaza_Strip'];
+                an event matches if it has any of them.
+            columns (list, optional): Columns to read. Defaults to all.
+
+        Returns:
+            pd.DataFrame: The matching events, sorted by date.
+        """
+        pa = _require_pyarrow()
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        months = [
+            month for month in self.months
+            if (start is None or month >= start.strftime("%Y-%m")) and (end is None or month <= end.strftime("%Y-%m"))
+        ]
+
+        uris = None
+        if concepts:
+            filters = [("concept", "in", sorted({concept_key(concept) for concept in concepts}))]
+            if months:
+                filters.append(("month", "in", months))
+            matches = self._read_concept_index(filters)
+            months = sorted(set(months) & set(matches["month"]))
+            uris = sorted(set(matches["uri"]))
+
+        filters = []
+        if start is not None:
+            filters.append(("eventDate", ">=", start))
+        if end is not None:
+            filters.append(("eventDate", "<=", end))
+        if uris is not None:
+            filters.append(("uri", "in", uris))
+
+        read_columns = None if columns is None else list(dict.fromkeys(["eventDate"] + list(columns)))
+        frames = [
+            pa.parquet.read_table(self._partition_path(month), columns=read_columns, filters=filters or None).to_pandas()
+            for month in months
+        ]
+        if not frames:
+            empty = pd.read_parquet(self._partition_path(self.months[0])).iloc[:0] if self.months else pd.DataFrame()
+            return empty if columns is None else empty.reindex(columns=columns)
+        events = pd.concat(frames, ignore_index=True).sort_values("eventDate", kind="stable").reset_index(drop=True)
+        return events if columns is None else events[columns]
@@ -1,8 +1,16 @@
 import pandas as pd
-import ollama
 import re
+import math
+import random
+import bisect
 from pydantic import BaseModel, field_validator
-from collections import defaultdict
+from collections import Counter
+
+from llm_client import AsyncLLMClient, LLMCallError, shared_transport
+from batch_prompting import CHARS_PER_TOKEN, estimate_tokens
+from prefilter_cascade import KeywordMatcher
+from text_features import tokenize
+from statistical_keywords import StatisticalKeywordScorer
 
 class KeywordExtractionOutput(BaseModel):
     """
@@ -25,29 +33,71 @@ class KeywordExtractorAgent:
     """
     AI Agent that analyzes categorized text data and extracts representative keywords
     using Llama (Ollama).
+
+    Large categories are handled map-reduce style: the posts of a category are split into
+    shards that fit the model context, candidate keywords are extracted per shard
+    (concurrently), and the merged candidates are re-ranked with class-based TF-IDF
+    against the other categories, optionally followed by one LLM consolidation call.
+
+    All model calls go through the host's shared `ResilientTransport` (retries, timeouts,
+    circuit breaker). Shards that still fail are counted in `failed_shards`.
     """
 
-    def __init__(self, model="llama3.2:latest", num_keywords=10):
+    # Contrast posts are cut to this many characters; shards keep this many tokens free
+    # for the instructions and the answer; map prompts ask for this many times more candidates
+    CONTRAST_POST_CHARS = 300
+    PROMPT_OVERHEAD_TOKENS = 512
+    CANDIDATE_FACTOR = 3
+
+    def __init__(self, model="llama3.2:latest", num_keywords=10, host=None, timeout=None, cache=None,
+                 context_tokens=4096, num_contrast_posts=20, max_shards=None, seed=0, max_failed_shards=0):
         """
         Initializes the agent.
 
         :param model: Name of the Llama model to use.
         :param num_keywords: Number of top keywords to extract per category.
+        :param host: Ollama host URL. Defaults to the `OLLAMA_HOST` environment setting.
+        :param timeout: Per-request timeout in seconds.
+        :param cache: Optional ResponseCache consulted before every model call.
+        :param context_tokens: Context window of the model; shards are sized to fit it.
+        :param num_contrast_posts: Number of posts from other categories shown in each prompt.
+        :param max_shards: Optional cap on the number of shards per category. Larger
+            categories are sampled evenly down to this many shards.
+        :param seed: Seed for sampling contrast posts and shards.
+        :param max_failed_shards: Number of shards per run that may fail for good before
+            `extract_keywords_mapreduce` raises. The keywords of the rest are then ranked
+            without them.
         """
         self.model = model
         self.num_keywords = num_keywords
+        self.host = host
+        self.timeout = timeout
+        self.cache = cache
+        self.context_tokens = context_tokens
+        self.num_contrast_posts = num_contrast_posts
+        self.max_shards = max_shards
+        self.seed = seed
+        self.max_failed_shards = max_failed_shards
+        self.transport = shared_transport(host, timeout)
+        self.failed_shards = Counter()
 
-    def construct_prompt(self, category, texts, texts_others):
+    def construct_prompt(self, category, texts, texts_others, num_keywords=None, candidates=None):
         """
         Constructs the prompt for Llama to extract characteristic keywords for a category.
 
         :param category: The category label.
         :param texts: List of texts belonging to this category.
         :param texts_others: List of texts belonging to the categories that are not the provided category label.
+            Only the first `num_contrast_posts` posts are used.
+        :param num_keywords: Number of keywords to ask for. Defaults to `num_keywords`.
+        :param candidates: Optional statistically distinctive terms offered as hints.
         :return: Formatted system + user prompt.
         """
         joined_texts = "\n".join(texts)
-        joined_texts_others = "\n".join(texts_others)
+        joined_texts_others = "\n".join(texts_others[:self.num_contrast_posts])
+        hint = ""
+        if candidates:
+            hint = f"These terms are statistically distinctive for the category and may help: {', '.join(candidates)}\n\n"
 
         return [
             {"role": "system", "content": (
@@ -55,26 +105,64 @@ class KeywordExtractorAgent:
                 f"Your task is to analyze a collection of social media posts (Telegram) and determine the most characteristic keywords that define the topic '{category}'."
             )},
             {"role": "user", "content": (
-                f"Extract exactly {self.num_keywords} keywords or key phrases that best represent the category. Focus on meaningful terms that differentiate this category from others.\n\n"
+                f"Extract exactly {num_keywords or self.num_keywords} keywords or key phrases that best represent the category. Focus on meaningful terms that differentiate this category from others.\n\n"
                 f"Here are some sample posts from the '{category}' category:\n{joined_texts}\n\n"
-                f"Here are some sample posts from the other categories: \n{joined_texts_others[:20]}"
+                f"Here are some sample posts from the other categories: \n{joined_texts_others}\n\n"
+                f"{hint}"
                 "Provide only a comma-separated list of keywords."
             )}
         ]
 
-    def extract_keywords(self, category, texts):
+    def _chat(self, prompt):
+        """
+        Sends one prompt to Llama, consulting the cache first.
+
+        :param prompt: The chat messages.
+        :return: The raw response text.
+        :raises LLMCallError: If the model could not be reached, even after retries.
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.model, prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        raw_output = self.transport.chat(self.model, prompt)
+        if self.cache is not None:
+            self.cache.put(cache_key, raw_output, self.model)
+        return raw_output
+
+    def _chat_many(self, prompts, concurrency=1):
         """
-        Uses Llama to extract the most relevant keywords for a given category.
+        Sends several prompts, keeping up to `concurrency` requests in flight.
+
+        :return: Raw responses in the same order as `prompts`; a request that failed for good
+            yields its `LLMCallError` instead.
+        """
+        if concurrency > 1:
+            client = AsyncLLMClient(self.model, host=self.host, concurrency=concurrency, timeout=self.timeout, cache=self.cache, transport=self.transport)
+            return client.chat_many(prompts)
+        responses = []
+        for prompt in prompts:
+            try:
+                responses.append(self._chat(prompt))
+            except LLMCallError as e:
+                responses.append(e)
+        return responses
+
+    def extract_keywords(self, category, texts, texts_others):
+        """
+        Uses Llama to extract the most relevant keywords for a given category in a single prompt.
+        Use `extract_keywords_mapreduce` for categories that do not fit the model context.
 
         :param category: The category label.
         :param texts: List of texts belonging to this category.
+        :param texts_others: List of texts belonging to the other categories.
         :return: List of extracted keywords.
         """
         prompt = self.construct_prompt(category, texts, texts_others)
         try:
-            response = ollama.chat(model=self.model, messages=prompt)
-            raw_output = response.get("message", {}).get("content", "")
-            extracted_keywords = self.parse_output(raw_output)
+            extracted_keywords = self.parse_output(self._chat(prompt))
         except Exception as e:
             print(f"Error extracting keywords for category '{category}': {e}")
             return []
@@ -93,35 +181,268 @@ class KeywordExtractorAgent:
 
         return [kw.strip() for kw in keywords if kw]
 
-    def process_dataset(self, filepath, category_col="Category", text_col="Post Text"):
+    def extract_keywords_many(self, requests, concurrency=4):
+        """
+        Extracts keywords for several categories with up to `concurrency` requests in flight.
+
+        :param requests: List of (category, texts, texts_others) tuples.
+        :param concurrency: Maximum number of parallel LLM requests.
+        :return: List of keyword lists, in the same order as `requests`.
+        """
+        client = AsyncLLMClient(self.model, host=self.host, concurrency=concurrency, timeout=self.timeout, cache=self.cache, transport=self.transport)
+        responses = client.chat_many([self.construct_prompt(*request) for request in requests])
+
+        results = []
+        for (category, _, _), response in zip(requests, responses):
+            if isinstance(response, BaseException):
+                print(f"Error extracting keywords for category '{category}': {response}")
+                results.append([])
+                continue
+            results.append(KeywordExtractionOutput(keywords=self.parse_output(response)).keywords)
+        return results
+
+    def shard_texts(self, texts):
+        """
+        Packs posts into shards that fit the context window next to the instructions and
+        the contrast posts. Posts longer than a whole shard are truncated.
+
+        :param texts: List of texts belonging to one category.
+        :return: List of shards (lists of texts). At most `max_shards` shards, sampled evenly.
+        """
+        contrast_tokens = self.num_contrast_posts * self.CONTRAST_POST_CHARS / CHARS_PER_TOKEN
+        budget = max(self.PROMPT_OVERHEAD_TOKENS, int(self.context_tokens - contrast_tokens - self.PROMPT_OVERHEAD_TOKENS))
+        max_chars = int(budget * CHARS_PER_TOKEN)
+
+        shards, current, used = [], [], 0
+        for text in texts:
+            text = str(text)[:max_chars]
+            cost = estimate_tokens(text)
+            if current and used + cost > budget:
+                shards.append(current)
+                current, used = [], 0
+            current.append(text)
+            used += cost
+        if current:
+            shards.append(current)
+
+        if self.max_shards and len(shards) > self.max_shards:
+            step = len(shards) / self.max_shards
+            shards = [shards[int(i * step)] for i in range(self.max_shards)]
+        return shards
+
+    def _contrast_sample(self, pools, offsets, skip, rng):
+        """
+        Samples contrast posts from all pools but one without building their union.
+
+        :param pools: List of text lists, one per category.
+        :param offsets: Start of every pool in the concatenation of all pools, followed by the total.
+        :param skip: Index of the pool to leave out.
+        :param rng: The random generator.
+        :return: List of truncated contrast posts.
+        """
+        size = len(pools[skip])
+        num_others = offsets[-1] - size
+        sample = []
+        for i in rng.sample(range(num_others), min(self.num_contrast_posts, num_others)):
+            # Indices from the skipped pool on belong to the pools after it
+            if i >= offsets[skip]:
+                i += size
+            pool = bisect.bisect_right(offsets, i) - 1
+            sample.append(pools[pool][i - offsets[pool]])
+        return [str(text)[:self.CONTRAST_POST_CHARS] for text in sample]
+
+    def rank_candidates(self, candidates_by_category, texts_by_category):
+        """
+        Re-ranks merged candidate keywords with class-based TF-IDF (c-TF-IDF).
+
+        Each category's posts are treated as one document. A candidate scores
+        `tf(keyword, category) * log(1 + A / f(keyword))`, where `A` is the average number of
+        tokens per category and `f` the keyword's frequency over all categories, and the score
+        is boosted by the number of shards that proposed it. All candidates are counted in a
+        single pass over the corpus with one compiled matcher. Candidates that never occur
+        verbatim are kept behind the scored ones, ordered by shard support.
+
+        :param candidates_by_category: Dictionary mapping categories to Counters of candidate
+            keyword -> number of shards that proposed it.
+        :param texts_by_category: Dictionary mapping categories to their texts.
+        :return: Dictionary mapping categories to candidate keywords, best first.
+        """
+        matcher = KeywordMatcher([kw for candidates in candidates_by_category.values() for kw in candidates])
+        counts = {category: Counter() for category in texts_by_category}
+        token_totals = {}
+        for category, texts in texts_by_category.items():
+            total = 0
+            for text in texts:
+                total += len(tokenize(text))
+                if matcher.pattern is not None:
+                    counts[category].update(m.group().lower() for m in matcher.pattern.finditer(str(text)))
+            token_totals[category] = max(total, 1)
+        average_tokens = sum(token_totals.values()) / max(len(token_totals), 1)
+
+        ranked = {}
+        for category, candidates in candidates_by_category.items():
+            scores = {}
+            for keyword, support in candidates.items():
+                key = keyword.lower()
+                frequency = counts.get(category, Counter())[key]
+                if not frequency:
+                    continue
+                total = sum(category_counts[key] for category_counts in counts.values())
+                ctfidf = frequency / token_totals[category] * math.log(1 + average_tokens / total)
+                scores[keyword] = ctfidf * (1 + math.log(support))
+            unscored = sorted((kw for kw in candidates if kw not in scores), key=lambda kw: -candidates[kw])
+            ranked[category] = sorted(scores, key=scores.get, reverse=True) + unscored
+        return ranked
+
+    def construct_consolidation_prompt(self, category, candidates):
+        """
+        Constructs the prompt asking Llama to pick the final keywords from the ranked candidates.
+
+        :param category: The category label.
+        :param candidates: Candidate keywords, best first.
+        :return: Formatted system + user prompt.
+        """
+        return [
+            {"role": "system", "content": (
+                "You are an expert in keyword extraction in German-language social media. "
+                f"You consolidate candidate keywords for the topic '{category}' of Telegram posts."
+            )},
+            {"role": "user", "content": (
+                f"The following candidate keywords for the category '{category}' are ranked by how distinctive they are:\n"
+                f"{', '.join(candidates)}\n\n"
+                f"Select exactly {self.num_keywords} keywords from this list that best represent the category. "
+                "Prefer distinctive terms and skip near-duplicates of keywords already selected.\n"
+                "Provide only a comma-separated list of keywords."
+            )}
+        ]
+
+    def extract_keywords_mapreduce(self, texts_by_category, concurrency=4, consolidate=False, seed_candidates=None):
+        """
+        Extracts keywords for every category with a map-reduce pipeline.
+
+        Map: each category is split into context-sized shards (`shard_texts`) and Llama
+        proposes candidate keywords per shard, contrasted with a sample of posts from the
+        other categories. All shards of all categories are sent with up to `concurrency`
+        requests in flight. Reduce: candidates are merged per category and re-ranked with
+        `rank_candidates`. If `consolidate` is set, one more Llama call per category picks
+        the final keywords from the top-ranked candidates.
+
+        Shards that still fail after the transport's retries are counted per category in
+        `failed_shards`. If more than `max_failed_shards` fail, or every shard of a category
+        fails, the run raises instead of returning keywords ranked from partial candidates.
+
+        :param texts_by_category: Dictionary mapping categories to their texts.
+        :param concurrency: Maximum number of parallel LLM requests.
+        :param consolidate: Whether to run the final LLM consolidation step.
+        :param seed_candidates: Optional dictionary mapping categories to statistically
+            distinctive terms (see `StatisticalKeywordScorer`) that are offered in every map prompt.
+        :return: Dictionary mapping each category to its keywords.
+        :raises LLMCallError: If too many shards failed for good.
+        """
+        seed_candidates = seed_candidates or {}
+        rng = random.Random(self.seed)
+        num_candidates = self.num_keywords * self.CANDIDATE_FACTOR
+        pools = [list(texts) for texts in texts_by_category.values()]
+        offsets = [0]
+        for pool in pools:
+            offsets.append(offsets[-1] + len(pool))
+        requests, prompts = [], []
+        for index, (category, texts) in enumerate(texts_by_category.items()):
+            for shard in self.shard_texts(texts):
+                requests.append(category)
+                prompts.append(self.construct_prompt(
+                    category, shard, self._contrast_sample(pools, offsets, index, rng), num_candidates, seed_candidates.get(category)
+                ))
+        print(f"Extracting candidate keywords from {len(prompts)} shards")
+
+        candidates_by_category = {category: Counter() for category in texts_by_category}
+        spellings = {}
+        self.failed_shards = Counter()
+        for category, response in zip(requests, self._chat_many(prompts, concurrency)):
+            if isinstance(response, BaseException):
+                print(f"Error extracting keywords for a shard of category '{category}': {response}")
+                self.failed_shards[category] += 1
+                continue
+            shard_keywords = {}
+            for keyword in self.parse_output(response):
+                shard_keywords.setdefault(keyword.lower(), keyword)
+            for key, keyword in shard_keywords.items():
+                keyword = spellings.setdefault((category, key), keyword)
+                candidates_by_category[category][keyword] += 1
+        self._check_failed_shards(Counter(requests))
+
+        ranked = self.rank_candidates(candidates_by_category, texts_by_category)
+        category_keywords = {category: keywords[:self.num_keywords] for category, keywords in ranked.items()}
+        if not consolidate:
+            return category_keywords
+
+        categories = [category for category in ranked if ranked[category]]
+        prompts = [self.construct_consolidation_prompt(category, ranked[category][:num_candidates]) for category in categories]
+        for category, response in zip(categories, self._chat_many(prompts, concurrency)):
+            if isinstance(response, BaseException):
+                print(f"Error consolidating keywords for category '{category}': {response}")
+                continue
+            # Only candidates are accepted; the ranking fills up whatever the model left out
+            allowed = {keyword.lower(): keyword for keyword in ranked[category]}
+            selected = []
+            for keyword in self.parse_output(response) + ranked[category]:
+                keyword = allowed.get(keyword.lower())
+                if keyword and keyword not in selected:
+                    selected.append(keyword)
+            category_keywords[category] = selected[:self.num_keywords]
+        return category_keywords
+
+    def _check_failed_shards(self, shards_per_category):
+        """
+        Reports the shards that failed for good and raises if too many did.
+
+        :param shards_per_category: Counter of category -> number of shards sent.
+        :raises LLMCallError: If more than `max_failed_shards` shards failed, or all shards of a category.
+        """
+        if not self.failed_shards:
+            return
+        report = ", ".join(f"'{category}': {failed}/{shards_per_category[category]}" for category, failed in self.failed_shards.items())
+        print(f"Shards without candidate keywords after retries: {report}")
+        lost = [category for category, failed in self.failed_shards.items() if failed == shards_per_category[category]]
+        if lost:
+            raise LLMCallError(f"Every shard failed for categories {lost}")
+        if sum(self.failed_shards.values()) > self.max_failed_shards:
+            raise LLMCallError(f"{sum(self.failed_shards.values())} shards failed, more than the {self.max_failed_shards} allowed")
+
+    def process_dataset(self, filepath, category_col="Category", text_col="Post Text", concurrency=1, consolidate=False, method="llm"):
         """
         Processes a dataset and extracts keywords for each category.
+
+        With `method="llm"` the map-reduce pipeline is used (see `extract_keywords_mapreduce`).
+        `method="statistical"` skips the LLM entirely and scores n-grams with
+        `StatisticalKeywordScorer`, which takes seconds even on millions of posts.
+        `method="hybrid"` runs the statistical scorer first and offers its terms to the LLM
+        as candidates in every map prompt.
     
         :param filepath: Path to the dataset (CSV format).
         :param category_col: Column name for categories.
         :param text_col: Column name for the text content.
+        :param concurrency: Maximum number of parallel LLM requests.
+        :param consolidate: Whether to run a final LLM consolidation step per category.
+        :param method: "llm", "statistical" or "hybrid".
         :return: Dictionary mapping each category to its extracted keywords.
         """
-        data = pd.read_csv(filepath)
-        categories = data[category_col].unique()
-        category_keywords = {}
-    
-        for category in categories:
-            category_texts = data[data[category_col] == category][text_col].tolist()
-            texts_others = data[data[category_col] != category][text_col].tolist()
-    
-            if not category_texts:
-                category_keywords[category] = []
-                continue
-    
-            try:
-                keywords = self.extract_keywords(category, category_texts, texts_others)
-                category_keywords[category] = keywords
-            except Exception as e:
-                print(f"Error extracting keywords for category '{category}': {e}")
-                category_keywords[category] = []
-    
-        return category_keywords
+        if method not in ("llm", "statistical", "hybrid"):
+            raise ValueError(f"Unknown method '{method}'. Expected 'llm', 'statistical' or 'hybrid'.")
+        data = pd.read_csv(filepath, usecols=[category_col, text_col])
+        if method == "statistical":
+            return StatisticalKeywordScorer(num_keywords=self.num_keywords).score(data[text_col].tolist(), data[category_col].tolist())
+
+        seed_candidates = None
+        if method == "hybrid":
+            scorer = StatisticalKeywordScorer(num_keywords=self.num_keywords * self.CANDIDATE_FACTOR)
+            seed_candidates = scorer.score(data[text_col].tolist(), data[category_col].tolist())
+        texts_by_category = {
+            category: group[text_col].dropna().astype(str).tolist()
+            for category, group in data.groupby(category_col, sort=False)
+        }
+        return self.extract_keywords_mapreduce(texts_by_category, concurrency, consolidate, seed_candidates)
+
     def save_keywords_to_csv(self, category_keywords, filepath="keywords_by_category.csv"):
         """
         Saves the extracted keywords to a CSV file using Pandas.
@@ -0,0 +1,193 @@
+import bisect
+from array import array
+import numpy as np
+import pandas as pd
+
+from text_features import GERMAN_STOPWORDS, tokenize
+
+
+class _Vocabulary(dict):
+    # Assigns consecutive ids to unseen terms on lookup
+    def __missing__(self, term):
+        self[term] = len(self)
+        return self[term]
+
+
+class _NgramVocabulary:
+    """
+    Maps term ids to n-gram strings. N-grams are stored as blocks of unigram id rows and
+    only joined into strings when looked up.
+    """
+
+    def __init__(self, unigram_names):
+        self.unigram_names = unigram_names
+        self.offsets = []
+        self.blocks = []
+        self.size = 0
+
+    def add(self, grams):
+        self.offsets.append(self.size)
+        self.blocks.append(grams)
+        self.size += len(grams)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, term_id):
+        block = bisect.bisect_right(self.offsets, term_id) - 1
+        return " ".join(self.unigram_names[i] for i in self.blocks[block][term_id - self.offsets[block]])
+
+
+class StatisticalKeywordScorer:
+    """
+    Extracts distinctive keywords for every category without calling an LLM.
+
+    Posts are tokenized with the German tokenizer from `text_features`, expanded to n-grams
+    and counted once into a sparse (category x term) count matrix. Every term of every
+    category is then scored against the complement of that category in one vectorized
+    pass, either with class-based TF-IDF or with the log-odds ratio with an informative
+    Dirichlet prior (Monroe et al., 2008), which favours terms that are both frequent and
+    distinctive.
+    """
+
+    METHODS = ("log_odds", "ctfidf")
+
+    def __init__(self, num_keywords=10, ngram_range=(1, 2), method="log_odds", min_count=5, prior_strength=0.1, stopwords=GERMAN_STOPWORDS):
+        """
+        Initializes the scorer.
+
+        :param num_keywords: Number of top keywords to return per category.
+        :param ngram_range: Smallest and largest n-gram length (inclusive).
+        :param method: "log_odds" or "ctfidf".
+        :param min_count: Terms occurring fewer times in the whole corpus are ignored.
+        :param prior_strength: Weight of the corpus-frequency prior in the log-odds score,
+            relative to the corpus size.
+        :param stopwords: Tokens dropped before building n-grams.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method '{method}'. Expected one of {self.METHODS}.")
+        self.num_keywords = num_keywords
+        self.ngram_range = ngram_range
+        self.method = method
+        self.min_count = min_count
+        self.prior_strength = prior_strength
+        self.stopwords = stopwords
+
+    def count(self, texts, categories):
+        """
+        Counts n-grams per category.
+
+        Only unigrams go through a Python dictionary; longer n-grams are formed from the
+        unigram id arrays with NumPy, never crossing post boundaries.
+
+        :param texts: Iterable of post texts.
+        :param categories: Iterable of category labels, aligned with `texts`.
+        :return: Tuple (category_ids, term_ids, counts, category_names, vocabulary), where the
+            first three arrays are the non-zero entries of the (category x term) count matrix.
+        """
+        codes, category_names = pd.factorize(pd.Series(list(categories)), sort=False)
+        unigrams = _Vocabulary()
+        token_ids = array("q")
+        token_codes = array("q")
+        token_posts = array("q")
+        for post, (code, text) in enumerate(zip(codes, texts)):
+            if code < 0 or not isinstance(text, str):
+                continue
+            ids = [unigrams[token] for token in tokenize(text, self.stopwords)]
+            token_ids.extend(ids)
+            token_codes.extend([code] * len(ids))
+            token_posts.extend([post] * len(ids))
+        token_ids = np.frombuffer(token_ids, dtype=np.int64)
+        token_codes = np.frombuffer(token_codes, dtype=np.int64)
+        token_posts = np.frombuffer(token_posts, dtype=np.int64)
+
+        vocabulary, term_ids, term_codes = _NgramVocabulary(list(unigrams)), [], []
+        n_unigrams = max(len(unigrams), 1)
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            starts = np.arange(max(len(token_ids) - n + 1, 0))
+            starts = starts[token_posts[starts] == token_posts[starts + n - 1]]
+            if not len(starts):
+                continue
+            if n_unigrams ** n < 2 ** 63:
+                # Encode each n-gram as one integer in base `n_unigrams`
+                keys = np.zeros(len(starts), dtype=np.int64)
+                for k in range(n):
+                    keys = keys * n_unigrams + token_ids[starts + k]
+                unique_keys, inverse = np.unique(keys, return_inverse=True)
+                unique_grams = np.stack([unique_keys // n_unigrams ** (n - 1 - k) % n_unigrams for k in range(n)], axis=1)
+            else:
+                grams = np.stack([token_ids[starts + k] for k in range(n)], axis=1)
+                unique_grams, inverse = np.unique(grams, axis=0, return_inverse=True)
+            term_ids.append(inverse.reshape(-1) + len(vocabulary))
+            term_codes.append(token_codes[starts])
+            vocabulary.add(unique_grams)
+        if not len(vocabulary):
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([]), list(category_names), vocabulary
+
+        n_terms = len(vocabulary)
+        keys = np.concatenate(term_codes) * n_terms + np.concatenate(term_ids)
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        return unique_keys // n_terms, unique_keys % n_terms, counts.astype(np.float64), list(category_names), vocabulary
+
+    def _scores(self, category_ids, term_ids, counts, n_categories, n_terms):
+        term_totals = np.bincount(term_ids, weights=counts, minlength=n_terms)
+        category_totals = np.bincount(category_ids, weights=counts, minlength=n_categories)
+        total = category_totals.sum()
+
+        if self.method == "ctfidf":
+            average = total / max(n_categories, 1)
+            return counts / category_totals[category_ids] * np.log1p(average / term_totals[term_ids])
+
+        # Log-odds of the term in the category vs. its complement, z-scored by the estimated variance
+        prior = self.prior_strength * term_totals[term_ids]
+        prior_total = self.prior_strength * total
+        in_count, out_count = counts, term_totals[term_ids] - counts
+        in_total = category_totals[category_ids]
+        out_total = total - in_total
+        delta = (
+            np.log(in_count + prior) - np.log(in_total + prior_total - in_count - prior)
+            - np.log(out_count + prior) + np.log(out_total + prior_total - out_count - prior)
+        )
+        variance = 1.0 / (in_count + prior) + 1.0 / (out_count + prior)
+        return delta / np.sqrt(variance)
+
+    def score(self, texts, categories):
+        """
+        Computes the top keywords of every category.
+
+        :param texts: Iterable of post texts.
+        :param categories: Iterable of category labels, aligned with `texts`.
+        :return: Dictionary mapping each category to its keywords, best first.
+        """
+        category_ids, term_ids, counts, category_names, vocabulary = self.count(texts, categories)
+        category_keywords = {category: [] for category in category_names}
+        if not len(counts):
+            return category_keywords
+
+        scores = self._scores(category_ids, term_ids, counts, len(category_names), len(vocabulary))
+        term_totals = np.bincount(term_ids, weights=counts, minlength=len(vocabulary))
+        keep = term_totals[term_ids] >= self.min_count
+        category_ids, term_ids, scores = category_ids[keep], term_ids[keep], scores[keep]
+
+        # Sort by category, then by descending score, and take the head of every category block
+        order = np.lexsort((-scores, category_ids))
+        category_ids, term_ids = category_ids[order], term_ids[order]
+        starts = np.searchsorted(category_ids, np.arange(len(category_names)))
+        ends = np.searchsorted(category_ids, np.arange(len(category_names)), side="right")
+        for index, (start, end) in enumerate(zip(starts, ends)):
+            top = term_ids[start:min(end, start + self.num_keywords)]
+            category_keywords[category_names[index]] = [vocabulary[term] for term in top]
+        return category_keywords
+
+    def process_dataset(self, filepath, category_col="Category", text_col="Post Text"):
+        """
+        Processes a dataset and computes keywords for each category.
+
+        :param filepath: Path to the dataset (CSV format).
+        :param category_col: Column name for categories.
+        :param text_col: Column name for the text content.
+        :return: Dictionary mapping each category to its keywords.
+        """
+        data = pd.read_csv(filepath, usecols=[category_col, text_col])
+        return self.score(data[text_col].tolist(), data[category_col].tolist())
@@ -0,0 +1,508 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from metrics import METRICS
+
+# ollama (and with it httpx and pydantic) is imported on first use, so importing an
+# agent module stays cheap in freshly spawned worker processes
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+_shared_async_clients = weakref.WeakKeyDictionary()
+_shared_breakers = {}
+_shared_transports = {}
+
+# Per-attempt timeout used when none is configured; generous enough for a cold model load
+DEFAULT_TIMEOUT = 300.0
+
+# HTTP statuses worth retrying: the server is overloaded, restarting or (re)loading a model
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def shared_client(host=None, timeout=None):
+    """
+    Returns the process-wide `ollama.Client` for a host, creating it on first use.
+
+    All agents of a process talk to a host through the same client, so its connection
+    pool (and TLS context) is set up once rather than once per agent.
+
+    Args:
+        host (str, optional): The Ollama host URL. Defaults to the `OLLAMA_HOST` environment setting.
+        timeout (float, optional): Per-request timeout in seconds.
+    """
+    # Keyed by process id as well: a client must not be reused across a fork
+    key = (os.getpid(), host, timeout)
+    with _shared_clients_lock:
+        if key not in _shared_clients:
+            import ollama
+            _shared_clients[key] = ollama.Client(host=host, timeout=timeout)
+        return _shared_clients[key]
+
+
+def shared_async_client(host=None):
+    """
+    Returns the `ollama.AsyncClient` for a host on the running event loop.
+
+    An async connection pool is bound to the loop it was created on, so clients are cached
+    per loop. Through `run_async` all calls share one loop, and thus one pool per host.
+    """
+    loop = asyncio.get_running_loop()
+    with _shared_clients_lock:
+        clients = _shared_async_clients.setdefault(loop, {})
+        if host not in clients:
+            import ollama
+            clients[host] = ollama.AsyncClient(host=host)
+        return clients[host]
+
+
+class _BackgroundLoop:
+    """
+    An event loop running forever in a daemon thread, started on first use (per process).
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-client-loop", daemon=True)
+        self.thread.start()
+
+
+_background_loops = {}
+
+
+def run_async(coroutine):
+    """
+    Runs a coroutine on the process-wide client event loop and waits for its result.
+
+    Unlike `asyncio.run`, the loop outlives the call, so the pooled async clients (and
+    their open connections) are reused by every later call instead of being set up again.
+    """
+    with _shared_clients_lock:
+        background = _background_loops.get(os.getpid())
+        if background is None:
+            background = _background_loops[os.getpid()] = _BackgroundLoop()
+    if threading.current_thread() is background.thread:
+        raise RuntimeError("run_async must not be called from a coroutine on the client loop; await it instead.")
+    future = asyncio.run_coroutine_threadsafe(coroutine, background.loop)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+
+
+class LLMCallError(Exception):
+    """
+    Raised when a chat request could not be completed, after retries if the failure was transient.
+    """
+
+
+class CircuitOpenError(LLMCallError):
+    """
+    Raised when a host's circuit breaker stayed open for longer than a caller may wait.
+    """
+
+
+def transport_errors():
+    """
+    Returns:
+        tuple: The exception types of a request that failed on the way to or from the
+        server: HTTP error answers, timeouts and connection errors. Anything else is a bug
+        in the caller and is not retried.
+    """
+    import httpx
+    import ollama
+    return (ollama.ResponseError, httpx.HTTPError, TimeoutError, ConnectionError)
+
+
+def is_retryable(error):
+    """
+    Tells transient failures (timeouts, connection errors, 5xx/429 answers) from requests
+    that would fail again, such as an unknown model.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    import httpx
+    import ollama
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    Attempt `n` is followed by a delay drawn uniformly from `[0, min(max_delay,
+    base_delay * 2 ** (n - 1))]`, so clients that failed together do not retry in lockstep.
+
+    Attributes:
+        max_attempts (int): Attempts per request, including the first one.
+        base_delay (float): Upper bound of the first delay, in seconds.
+        max_delay (float): Cap on the upper bound of any delay, in seconds.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=30.0, seed=None):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1.")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    def delay(self, attempt):
+        return self._random.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Pauses dispatch to a host while it is down or reloading a model.
+
+    After `failure_threshold` consecutive transient failures the circuit opens: callers
+    wait instead of sending requests that would fail. After `reset_timeout` seconds a single
+    probe request is let through (half-open); if it succeeds the circuit closes and every
+    waiting caller resumes, otherwise it opens again. Once the outage has lasted `max_wait`
+    seconds, callers get a `CircuitOpenError` at once instead of waiting, while probes still
+    go out every `reset_timeout`: a host that never comes back fails the affected rows
+    quickly instead of stalling the run, and is used again as soon as it recovers.
+
+    All methods are thread-safe; `acquire` blocks the thread and `aacquire` the coroutine.
+
+    Attributes:
+        name (str): Label of the host in logs and metrics.
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_timeout (float): Seconds the circuit stays open before a probe.
+        max_wait (float): Outage length, in seconds, after which callers stop waiting.
+        state (str): "closed", "open" or "half_open".
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name="default", failure_threshold=5, reset_timeout=5.0, max_wait=300.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_wait = max_wait
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._outage_started = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        """
+        Returns:
+            float: 0 if a request may be sent now, else the seconds to wait before asking again.
+
+        Raises:
+            CircuitOpenError: If the host has been down for longer than `max_wait`.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            now = time.monotonic()
+            if self.state == self.OPEN and now >= self._opened_at + self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return 0.0
+            if self.state == self.HALF_OPEN:
+                # Another caller's probe is in flight; its verdict is worth waiting for
+                return min(self.reset_timeout, 0.5)
+            outage_left = self._outage_started + self.max_wait - now
+            if outage_left <= 0:
+                raise CircuitOpenError(f"Host {self.name} has been unavailable for {now - self._outage_started:.0f}s")
+            return min(self._opened_at + self.reset_timeout - now, outage_left)
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent to the host.
+        """
+        waited = 0.0
+        while wait := self._admit():
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            METRICS.observe("circuit_wait", waited)
+
+    async def aacquire(self):
+        """
+        Waits without blocking the event loop until a request may be sent to the host.
+        """
+        waited = 0.0
+        while wait := self._admit():
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited:
+            METRICS.observe("circuit_wait", waited)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Host {self.name} is answering again; resuming dispatch")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                if self.state == self.CLOSED:
+                    self._outage_started = time.monotonic()
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                logging.warning(
+                    f"Host {self.name} failed {self.failures} times in a row; pausing dispatch for {self.reset_timeout:g}s"
+                )
+                METRICS.increment("circuit_opened", host=self.name)
+
+    def release(self):
+        """
+        Gives up a probe slot without a verdict, e.g. when the probing request was cancelled.
+        """
+        with self._lock:
+            self._probing = False
+
+
+def shared_breaker(host=None):
+    """
+    Returns the process-wide circuit breaker of a host, so every agent, client and
+    scheduler worker talking to the host pauses together.
+    """
+    key = (os.getpid(), host)
+    with _shared_clients_lock:
+        if key not in _shared_breakers:
+            _shared_breakers[key] = CircuitBreaker(name=host or "default")
+        return _shared_breakers[key]
+
+
+class ResilientTransport:
+    """
+    Sends chat and embedding requests to one Ollama host over pooled clients, with a
+    per-attempt timeout, retries with exponential backoff and jitter, and the host's
+    circuit breaker.
+
+    Transient failures (see `is_retryable`) are retried and count towards opening the
+    circuit; other errors fail at once. A request that still fails raises `LLMCallError`,
+    so callers can set the row aside instead of storing an error as its label.
+
+    Attributes:
+        host (str): The Ollama host URL. Defaults to the `OLLAMA_HOST` environment setting.
+        timeout (float): Per-attempt timeout in seconds. None uses `DEFAULT_TIMEOUT`.
+        retry (RetryPolicy): Attempts and backoff.
+        breaker (CircuitBreaker): Defaults to the breaker shared by all users of the host.
+    """
+
+    def __init__(self, host=None, timeout=None, retry=None, breaker=None):
+        self.host = host
+        self.timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or shared_breaker(host)
+
+    @property
+    def client(self):
+        return shared_client(self.host, self.timeout)
+
+    def _failed(self, error, attempt):
+        """
+        Records a failed attempt.
+
+        Returns:
+            float: Seconds to wait before the next attempt.
+
+        Raises:
+            LLMCallError: If the request should not be retried.
+        """
+        retryable = is_retryable(error)
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            # The host answered; only this request is at fault
+            self.breaker.record_success()
+        host = self.host or "default"
+        METRICS.increment("llm_errors", host=host)
+        if not retryable or attempt >= self.retry.max_attempts:
+            logging.error(f"LLM call to host {host} failed after {attempt} attempt(s): {error!r}")
+            raise LLMCallError(f"LLM call to host {host} failed after {attempt} attempt(s): {error!r}") from error
+        delay = self.retry.delay(attempt)
+        logging.info(f"LLM call to host {host} failed ({error!r}); retrying in {delay:.1f}s")
+        METRICS.increment("llm_retries", host=host)
+        return delay
+
+    def _send(self, operation, timer, **kwargs):
+        """
+        Calls `operation` of the pooled client, blocking until it succeeds or fails for good.
+
+        Returns:
+            The raw response.
+
+        Raises:
+            LLMCallError: If the request failed permanently or after all attempts.
+        """
+        errors = transport_errors()
+        for attempt in range(1, self.retry.max_attempts + 1):
+            self.breaker.acquire()
+            try:
+                with METRICS.timer(timer):
+                    response = getattr(self.client, operation)(**kwargs)
+            except errors as e:
+                time.sleep(self._failed(e, attempt))
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return response
+
+    def chat(self, model, messages, **kwargs):
+        """
+        Sends one chat request, blocking until it succeeds or fails for good.
+
+        Args:
+            model (str): The model to run.
+            messages (list): The chat messages.
+            **kwargs: Extra arguments for `Client.chat`, e.g. `options`/`format`/`keep_alive`.
+
+        Returns:
+            str: The response content.
+
+        Raises:
+            LLMCallError: If the request failed permanently or after all attempts.
+        """
+        response = self._send("chat", "generate_response", model=model, messages=messages, **kwargs)
+        METRICS.record_response(response, model)
+        return response["message"]["content"]
+
+    def embed(self, model, texts, **kwargs):
+        """
+        Embeds a batch of texts, with the same retries and circuit breaking as `chat`.
+
+        Args:
+            model (str): The embedding model to run.
+            texts (list): The texts to embed.
+            **kwargs: Extra arguments for `Client.embed`, e.g. `truncate`/`keep_alive`.
+
+        Returns:
+            list: One embedding per text.
+
+        Raises:
+            LLMCallError: If the request failed permanently or after all attempts.
+        """
+        return self._send("embed", "embed", model=model, input=texts, **kwargs)["embeddings"]
+
+    async def achat(self, model, messages, **kwargs):
+        """
+        Async variant of `chat`, over the pooled `AsyncClient` of the running loop.
+        """
+        client = shared_async_client(self.host)
+        errors = transport_errors()
+        for attempt in range(1, self.retry.max_attempts + 1):
+            await self.breaker.aacquire()
+            try:
+                with METRICS.timer("generate_response"):
+                    response = await asyncio.wait_for(
+                        client.chat(model=model, messages=messages, **kwargs), timeout=self.timeout
+                    )
+            except errors as e:
+                await asyncio.sleep(self._failed(e, attempt))
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            METRICS.record_response(response, model)
+            return response["message"]["content"]
+
+
+def shared_transport(host=None, timeout=None):
+    """
+    Returns the process-wide `ResilientTransport` for a host and timeout.
+    """
+    key = (os.getpid(), host, timeout)
+    breaker = shared_breaker(host)
+    with _shared_clients_lock:
+        if key not in _shared_transports:
+            _shared_transports[key] = ResilientTransport(host, timeout, breaker=breaker)
+        return _shared_transports[key]
+
+
+class AsyncLLMClient:
+    """
+    Sends chat requests to an Ollama server concurrently through its `ResilientTransport`.
+
+    At most `concurrency` requests are in flight at any time; results are returned
+    in the same order as the submitted message lists.
+
+    Attributes:
+        model (str): The LLM model to use.
+        host (str): The Ollama host URL. Defaults to the `OLLAMA_HOST` environment setting.
+        concurrency (int): Maximum number of requests in flight.
+        timeout (float): Per-attempt timeout in seconds. None uses `DEFAULT_TIMEOUT`.
+        cache (ResponseCache): Optional response cache consulted before each request.
+        transport (ResilientTransport): Retries, timeouts and circuit breaking.
+    """
+
+    def __init__(self, model, host=None, concurrency=4, timeout=None, cache=None, transport=None):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        self.model = model
+        self.host = host
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.transport = transport or shared_transport(host, timeout)
+
+    async def _chat(self, semaphore, messages, **kwargs):
+        async with semaphore:
+            return await self.transport.achat(self.model, messages, **kwargs)
+
+    async def achat_many(self, messages_list, **kwargs):
+        """
+        Sends all message lists with bounded concurrency.
+
+        Args:
+            messages_list (list): A list of chat message lists, one per request.
+            **kwargs: Extra arguments passed to `AsyncClient.chat` (e.g. `options`).
+
+        Returns:
+            list: The response contents in submission order. A request that failed for
+            good yields its `LLMCallError` in its slot instead of a string.
+        """
+        results = [None] * len(messages_list)
+        keys = [None] * len(messages_list)
+        pending = []
+        for i, messages in enumerate(messages_list):
+            if self.cache is not None:
+                keys[i] = self.cache.make_key(self.model, messages, kwargs.get("options"), kwargs.get("format"))
+                results[i] = self.cache.get(keys[i])
+                if results[i] is not None:
+                    METRICS.increment("cache_hits")
+                    continue
+            pending.append(i)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [self._chat(semaphore, messages_list[i], **kwargs) for i in pending]
+        responses = await asyncio.gather(*tasks, return_exceptions=True)
+        for response in responses:
+            # Only failed requests are reported per slot; anything else is a bug
+            if isinstance(response, BaseException) and not isinstance(response, LLMCallError):
+                raise response
+        for i, response in zip(pending, responses):
+            results[i] = response
+            if not isinstance(response, BaseException) and self.cache is not None:
+                self.cache.put(keys[i], response, self.model)
+        return results
+
+    def chat_many(self, messages_list, **kwargs):
+        """
+        Synchronous wrapper around `achat_many` for use from blocking code.
+        """
+        return run_async(self.achat_many(messages_list, **kwargs))
@@ -0,0 +1,181 @@
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-post messages are logged at DEBUG level for one post in this many
+POST_LOG_EVERY = int(os.environ.get("SOSEC_POST_LOG_EVERY", "100"))
+
+# Ollama response metadata fields recorded per model; durations are in nanoseconds
+OLLAMA_COUNT_FIELDS = ("prompt_eval_count", "eval_count")
+OLLAMA_DURATION_FIELDS = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+
+_post_log_counter = itertools.count()
+
+
+def log_post_sample(message, *args, every=None):
+    """
+    Logs a per-post message at DEBUG level for every `every`-th call (default
+    `POST_LOG_EVERY`, set via the SOSEC_POST_LOG_EVERY environment variable).
+
+    The message is a %-style format string, so the post text is only formatted when the
+    message is actually emitted.
+    """
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+    if next(_post_log_counter) % (every or POST_LOG_EVERY) == 0:
+        logging.debug(message, *args)
+
+
+def _label_value(value):
+    """
+    Escapes a Prometheus label value: backslash, double quote and newline.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    A small in-process registry of stage timers and counters.
+
+    Stages are timed with `timer(stage)`; each stage keeps a call count, the total and the
+    maximum duration. Counters are keyed by name and optional labels. Ollama response
+    metadata (prompt/eval token counts and durations) is accumulated per model with
+    `record_response`. The registry can be exported in Prometheus text format or appended
+    as a JSON line, and `start_trace` additionally writes every observation to a JSONL trace.
+
+    All methods are thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trace = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Times the enclosed block as one call of `stage`.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            count, total, maximum = self.timers.get(stage, (0, 0.0, 0.0))
+            self.timers[stage] = (count + 1, total + seconds, max(maximum, seconds))
+            if self._trace is not None:
+                self._trace.write(json.dumps({"ts": time.time(), "stage": stage, "seconds": seconds}) + "\n")
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def record_response(self, response, model=None):
+        """
+        Accumulates the token counts and durations reported by an Ollama chat response.
+        """
+        model = model or response.get("model") or "unknown"
+        self.increment("ollama_responses", model=model)
+        record = {"ts": time.time(), "event": "ollama_response", "model": model}
+        for field in OLLAMA_COUNT_FIELDS + OLLAMA_DURATION_FIELDS:
+            value = response.get(field)
+            if value is None:
+                continue
+            record[field] = value
+            if field in OLLAMA_COUNT_FIELDS:
+                self.increment(f"ollama_{field}", value, model=model)
+            else:
+                self.increment(f"ollama_{field}_seconds", value / 1e9, model=model)
+        if self._trace is not None:
+            with self._lock:
+                self._trace.write(json.dumps(record) + "\n")
+
+    def start_trace(self, path):
+        """
+        Appends every following observation and model response to the JSONL file `path`.
+        """
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+            self._trace = open(path, "a", encoding="utf-8")
+
+    def stop_trace(self):
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: `stages` (count, total and max seconds per stage) and `counters`.
+        """
+        with self._lock:
+            return {
+                "stages": {
+                    stage: {"count": count, "total_seconds": total, "max_seconds": maximum}
+                    for stage, (count, total, maximum) in sorted(self.timers.items())
+                },
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+            }
+
+    def to_prometheus(self, prefix="sosec"):
+        """
+        Renders the registry in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent per pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, values in snapshot["stages"].items():
+            stage = _label_value(stage)
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {values["total_seconds"]:.6f}')
+        lines.append(f"# TYPE {prefix}_stage_seconds_max gauge")
+        for stage, values in snapshot["stages"].items():
+            stage = _label_value(stage)
+            lines.append(f'{prefix}_stage_seconds_max{{stage="{stage}"}} {values["max_seconds"]:.6f}')
+
+        declared = set()
+        for counter in snapshot["counters"]:
+            name = f"{prefix}_{counter['name']}_total"
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            labels = ",".join(f'{key}="{_label_value(value)}"' for key, value in counter["labels"].items())
+            lines.append(f"{name}{{{labels}}} {counter['value']}" if labels else f"{name} {counter['value']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """
+        Writes the registry to `path`: a `.jsonl` file gets one JSON snapshot line appended,
+        any other file is overwritten with the Prometheus text format.
+        """
+        if path.endswith(".jsonl"):
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"ts": time.time(), **self.snapshot()}) + "\n")
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+        logging.info(f"Metrics written to {path}")
+
+
+# The process-wide registry used by all agents
+METRICS = Metrics()
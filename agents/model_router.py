@@ -0,0 +1,172 @@
+import copy
+import logging
+from llm_client import shared_transport
+from metrics import METRICS
+
+SMALL_TIER = "small"
+LARGE_TIER = "large"
+
+
+class ModelRouter:
+    """
+    Classifies posts with a small model first and escalates only doubtful posts to a larger one.
+
+    A post is escalated when the small model answers with one of `escalate_labels`
+    ("Uncertain" or "invalid" by default) or, with `samples > 1`, when the small model is not
+    self-consistent: the post is re-asked `samples - 1` times at `sample_temperature` with
+    different seeds, and the share of answers agreeing with the greedy label must reach
+    `min_agreement`. The large model's label replaces the small model's one.
+
+    The router works with any agent exposing `model`, `host`, `timeout`, `transport` and
+    `options`: it classifies through per-tier copies of the agent with the model swapped, so
+    prompts, parsing, retries and the response cache behave exactly as for a single model.
+
+    Attributes:
+        small_model (str): The model tried first.
+        large_model (str): The model doubtful posts are escalated to.
+        large_host (str): Ollama host of the large model. Defaults to the agent's host.
+        samples (int): Small-model answers per post used for the self-consistency check.
+        min_agreement (float): Minimum share of samples agreeing with the greedy label.
+        sample_temperature (float): Temperature of the extra self-consistency samples.
+        escalate_labels (tuple): Small-model labels that are always escalated.
+        cost_ratio (float): Cost of one large-model call relative to a small-model call. If
+            None, it is measured from the Ollama durations recorded in METRICS.
+        stats (dict): Posts per tier, escalations by reason and extra sample calls.
+    """
+
+    def __init__(self, small_model, large_model, large_host=None, samples=1, min_agreement=1.0, sample_temperature=0.7, escalate_labels=("Uncertain", "invalid"), cost_ratio=None):
+        if samples < 1:
+            raise ValueError("samples must be at least 1.")
+        self.small_model = small_model
+        self.large_model = large_model
+        self.large_host = large_host
+        self.samples = samples
+        self.min_agreement = min_agreement
+        self.sample_temperature = sample_temperature
+        self.escalate_labels = tuple(escalate_labels)
+        self.cost_ratio = cost_ratio
+        self.stats = {"small": 0, "large": 0, "escalated_label": 0, "escalated_disagreement": 0, "sample_calls": 0}
+        self._tier_agents = {}
+
+    def tier_agent(self, agent, tier, seed=None):
+        """
+        Returns a copy of `agent` that classifies with the model of `tier`. With a `seed`,
+        the copy samples at `sample_temperature` for the self-consistency check.
+        """
+        key = (id(agent), tier, seed)
+        if key not in self._tier_agents:
+            tier_agent = copy.copy(agent)
+            tier_agent.model = self.small_model if tier == SMALL_TIER else self.large_model
+            if tier == LARGE_TIER and self.large_host and self.large_host != agent.host:
+                tier_agent.host = self.large_host
+                tier_agent.transport = shared_transport(self.large_host, agent.timeout)
+            if seed is not None:
+                tier_agent.options = {**(agent.options or {}), "temperature": self.sample_temperature, "seed": seed}
+            self._tier_agents[key] = (agent, tier_agent)
+        return self._tier_agents[key][1]
+
+    def _agreement(self, agent, posts, labels, classify):
+        agreeing = [1] * len(posts)
+        for seed in range(1, self.samples):
+            sampled = classify(self.tier_agent(agent, SMALL_TIER, seed), posts)
+            self.stats["sample_calls"] += len(posts)
+            for i, (label, sample) in enumerate(zip(labels, sampled)):
+                agreeing[i] += label == sample
+        return [count / self.samples for count in agreeing]
+
+    def route(self, agent, posts, classify):
+        """
+        Classifies `posts` through the small model and escalates doubtful ones.
+
+        Args:
+            agent: The agent whose prompts and parsing are used.
+            posts (list): The posts to classify.
+            classify (callable): `classify(tier_agent, posts)` returning validated labels,
+                e.g. a call to the agent's `classify_posts` or batched variant.
+
+        Returns:
+            tuple: (labels, tiers), both in the same order as `posts`. Posts for which the
+            model could not be reached have None for both.
+        """
+        if not posts:
+            return [], []
+        labels = list(classify(self.tier_agent(agent, SMALL_TIER), posts))
+        tiers = [SMALL_TIER] * len(posts)
+
+        escalate = [i for i, label in enumerate(labels) if label in self.escalate_labels]
+        self.stats["escalated_label"] += len(escalate)
+        if self.samples > 1:
+            candidates = [i for i, label in enumerate(labels) if label is not None and label not in self.escalate_labels]
+            agreement = self._agreement(agent, [posts[i] for i in candidates], [labels[i] for i in candidates], classify)
+            disagreeing = [i for i, share in zip(candidates, agreement) if share < self.min_agreement]
+            self.stats["escalated_disagreement"] += len(disagreeing)
+            escalate = sorted(escalate + disagreeing)
+
+        if escalate:
+            large_labels = classify(self.tier_agent(agent, LARGE_TIER), [posts[i] for i in escalate])
+            for i, label in zip(escalate, large_labels):
+                labels[i] = label
+                tiers[i] = LARGE_TIER
+        self.stats["small"] += len(posts) - len(escalate)
+        self.stats["large"] += len(escalate)
+        METRICS.increment("posts_routed", len(posts) - len(escalate), tier=SMALL_TIER)
+        METRICS.increment("posts_routed", len(escalate), tier=LARGE_TIER)
+        return labels, [None if label is None else tier for label, tier in zip(labels, tiers)]
+
+    @staticmethod
+    def _seconds_per_call(model):
+        counters = {
+            (counter["name"], counter["labels"].get("model")): counter["value"]
+            for counter in METRICS.snapshot()["counters"]
+        }
+        calls = counters.get(("ollama_responses", model))
+        seconds = counters.get(("ollama_total_duration_seconds", model))
+        return seconds / calls if calls and seconds else None
+
+    def report(self):
+        """
+        Summarizes the routing decisions and the compute saved compared with sending every
+        post to the large model.
+
+        Compute is counted in small-model calls: every post costs one small call plus
+        `samples - 1` sample calls, and every escalated post additionally costs `cost_ratio`.
+        Without a configured `cost_ratio`, it is the ratio of the average Ollama
+        `total_duration` per call of the two models, if both have been observed.
+
+        Returns:
+            dict: Posts per tier, `escalation_rate`, the `cost_ratio` used and
+            `compute_saved` (share of the large-model-only compute not spent), or None for
+            the latter two if no ratio is known.
+        """
+        posts = self.stats["small"] + self.stats["large"]
+        report = {
+            "small_model": self.small_model,
+            "large_model": self.large_model,
+            "posts": posts,
+            "posts_small": self.stats["small"],
+            "posts_large": self.stats["large"],
+            "escalated_label": self.stats["escalated_label"],
+            "escalated_disagreement": self.stats["escalated_disagreement"],
+            "escalation_rate": self.stats["large"] / posts if posts else 0.0,
+            "cost_ratio": None,
+            "compute_saved": None,
+        }
+        cost_ratio = self.cost_ratio
+        if cost_ratio is None:
+            small_seconds = self._seconds_per_call(self.small_model)
+            large_seconds = self._seconds_per_call(self.large_model)
+            cost_ratio = large_seconds / small_seconds if small_seconds and large_seconds else None
+        if cost_ratio and posts:
+            spent = posts + self.stats["sample_calls"] + self.stats["large"] * cost_ratio
+            report["cost_ratio"] = cost_ratio
+            report["compute_saved"] = 1 - spent / (posts * cost_ratio)
+        return report
+
+    def log_report(self):
+        report = self.report()
+        saved = "unknown" if report["compute_saved"] is None else f"{report['compute_saved']:.1%}"
+        logging.info(
+            f"Model routing: {report['posts_small']} posts on {self.small_model}, {report['posts_large']} escalated to "
+            f"{self.large_model} (escalation rate {report['escalation_rate']:.1%}, compute saved {saved})"
+        )
+        return report
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_text(text):
+    """
+    Normalizes a post for duplicate detection: Unicode NFKC, case-folded and with
+    runs of whitespace collapsed.
+    """
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class PostDeduplicator:
+    """
+    Groups exact and near-duplicate posts so only one representative per cluster
+    has to be sent to the LLM.
+
+    Exact duplicates are found by hashing the normalized text. Near duplicates are
+    found with MinHash signatures over character shingles and locality-sensitive
+    hashing (LSH) banding; candidate pairs are kept if their estimated Jaccard
+    similarity reaches `threshold`.
+
+    Attributes:
+        threshold (float): Minimum estimated Jaccard similarity for two posts to be
+            treated as duplicates. Set to 1.0 to only merge exact duplicates.
+        num_perm (int): Number of MinHash permutations.
+        shingle_size (int): Length of the character shingles.
+        stats (dict): Counts from the last call to `cluster`.
+    """
+
+    def __init__(self, threshold=0.9, num_perm=64, shingle_size=5, seed=1):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1].")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.bands, self.rows = self._optimal_bands(threshold, num_perm)
+        self.stats = {}
+
+    @staticmethod
+    def _optimal_bands(threshold, num_perm):
+        """
+        Picks the (bands, rows) split whose LSH S-curve midpoint is closest to the threshold.
+        """
+        best = (num_perm, 1)
+        best_error = float("inf")
+        for rows in range(1, num_perm + 1):
+            if num_perm % rows:
+                continue
+            bands = num_perm // rows
+            error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+            if error < best_error:
+                best, best_error = (bands, rows), error
+        return best
+
+    def _signature(self, text):
+        k = self.shingle_size
+        shingles = {text[i:i + k] for i in range(max(1, len(text) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # (a * h + b) mod p, computed with wrap-around in uint64 and truncated to 32 bits
+        permuted = (np.outer(hashes, self._a) + self._b) % np.uint64(_MERSENNE_PRIME)
+        return (permuted & np.uint64(_MAX_HASH)).min(axis=0)
+
+    def cluster(self, texts):
+        """
+        Assigns every post to a duplicate cluster.
+
+        Args:
+            texts (list): The posts to deduplicate.
+
+        Returns:
+            list: For each post, the index of its cluster representative (the first
+            occurrence of the cluster in `texts`). Representatives map to themselves.
+        """
+        normalized = [normalize_text(text) for text in texts]
+        first_seen = {}
+        representatives = []
+        for i, text in enumerate(normalized):
+            digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+            representatives.append(first_seen.setdefault(digest, i))
+        exact_unique = sorted(first_seen.values())
+
+        near_merged = 0
+        if self.threshold < 1.0 and len(exact_unique) > 1:
+            signatures = np.vstack([self._signature(normalized[i]) for i in exact_unique])
+            parent = list(range(len(exact_unique)))
+
+            def find(x):
+                while parent[x] != x:
+                    parent[x] = parent[parent[x]]
+                    x = parent[x]
+                return x
+
+            for band in range(self.bands):
+                buckets = defaultdict(list)
+                band_slice = signatures[:, band * self.rows:(band + 1) * self.rows]
+                for row, key in enumerate(map(bytes, band_slice)):
+                    buckets[key].append(row)
+                for members in buckets.values():
+                    for other in members[1:]:
+                        root_a, root_b = find(members[0]), find(other)
+                        if root_a == root_b:
+                            continue
+                        similarity = np.mean(signatures[members[0]] == signatures[other])
+                        if similarity >= self.threshold:
+                            parent[max(root_a, root_b)] = min(root_a, root_b)
+                            near_merged += 1
+
+            exact_to_near = {exact_unique[row]: exact_unique[find(row)] for row in range(len(exact_unique))}
+            representatives = [exact_to_near[rep] for rep in representatives]
+
+        unique = len(set(representatives))
+        self.stats = {
+            "total": len(texts),
+            "unique": unique,
+            "exact_duplicates": len(texts) - len(exact_unique),
+            "near_duplicates": near_merged,
+            "calls_saved": len(texts) - unique,
+        }
+        logging.info(
+            f"Deduplication: {unique}/{len(texts)} unique posts "
+            f"({self.stats['exact_duplicates']} exact, {near_merged} near duplicates)"
+        )
+        return representatives
+
+    def unique_indices(self, representatives):
+        """
+        Returns:
+            list: The sorted indices of the cluster representatives.
+        """
+        return sorted(set(representatives))
@@ -0,0 +1,172 @@
+import logging
+import re
+import numpy as np
+from text_features import HashingTfidfVectorizer, SparseLogisticRegression
+
+
+class KeywordMatcher:
+    """
+    Matches a keyword list against posts with a single compiled regular expression.
+
+    All keywords are combined into one case-insensitive alternation (longest first,
+    anchored on word boundaries), so each post is scanned once regardless of how many
+    keywords there are.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = [kw.strip() for kw in keywords if kw and kw.strip()]
+        if self.keywords:
+            alternation = "|".join(re.escape(kw) for kw in sorted(set(self.keywords), key=len, reverse=True))
+            self.pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)", flags=re.IGNORECASE)
+        else:
+            self.pattern = None
+
+    def count(self, text):
+        """
+        Returns:
+            int: Number of keyword occurrences in `text`.
+        """
+        if self.pattern is None:
+            return 0
+        return sum(1 for _ in self.pattern.finditer(str(text)))
+
+    def matches(self, text):
+        """
+        Returns:
+            list: The distinct keywords found in `text`, lower-cased.
+        """
+        if self.pattern is None:
+            return []
+        return sorted({m.group().lower() for m in self.pattern.finditer(str(text))})
+
+
+class PrefilterCascade:
+    """
+    A cheap cascade in front of the LLM that auto-labels clear negatives and positives.
+
+    Stage 1 runs a compiled keyword matcher. Stage 2 is a hashed TF-IDF logistic
+    regression trained on LLM labels; whether any keyword matched is an extra feature
+    column next to the hashed n-grams, so it cannot collide with the post's vocabulary.
+    Posts scoring at or below `negative_threshold` are labelled "0", posts at or above
+    `positive_threshold` are labelled "1", and only the ambiguous middle goes to the LLM.
+    Until the scorer is fitted every post goes to the LLM, unless
+    `auto_negative_without_fit` is set: then posts without any keyword match are
+    auto-labelled "0" without a confidence estimate.
+
+    Attributes:
+        negative_threshold (float): Maximum positive-class probability for an automatic "0".
+        positive_threshold (float): Minimum positive-class probability for an automatic "1".
+        auto_negative_without_fit (bool): Whether an unfitted cascade labels posts without
+            keyword matches "0". Requires a non-empty keyword list.
+        stats (dict): Per-stage counts accumulated by `route`.
+        report (dict): Held-out agreement with the LLM, set by `fit`.
+    """
+
+    def __init__(self, keywords, negative_threshold=0.05, positive_threshold=0.95, vectorizer=None, auto_negative_without_fit=False):
+        if not 0.0 <= negative_threshold < positive_threshold <= 1.0:
+            raise ValueError("Thresholds must satisfy 0 <= negative_threshold < positive_threshold <= 1.")
+        self.matcher = KeywordMatcher(keywords)
+        if auto_negative_without_fit and self.matcher.pattern is None:
+            # Without keywords every post would count as a keyword negative
+            raise ValueError("auto_negative_without_fit requires at least one non-empty keyword.")
+        self.auto_negative_without_fit = auto_negative_without_fit
+        self.negative_threshold = negative_threshold
+        self.positive_threshold = positive_threshold
+        self.vectorizer = vectorizer or HashingTfidfVectorizer(ngram_range=(1, 2))
+        self.scorer = None
+        self.stats = {"keyword_negative": 0, "lexical_negative": 0, "lexical_positive": 0, "llm": 0}
+        self.report = {}
+
+    def _features(self, texts):
+        # The keyword stage's verdict is its own column rather than a token, so it never
+        # shares a hash bucket with real words
+        X = self.vectorizer.transform([str(text) for text in texts])
+        return X.with_column([1.0 if self.matcher.count(text) else 0.0 for text in texts])
+
+    def fit(self, texts, labels, holdout=0.2, seed=0):
+        """
+        Trains the lexical scorer on LLM labels and measures agreement on a held-out split.
+
+        Only "0"/"1" labels are used; "Uncertain" and "invalid" rows are ignored.
+
+        Args:
+            texts (list): Posts already labelled by the LLM.
+            labels (list): The LLM labels for `texts`.
+            holdout (float, optional): Fraction of the labelled posts kept for evaluation.
+            seed (int, optional): Seed for the train/held-out split.
+
+        Returns:
+            PrefilterCascade: self
+        """
+        pairs = [(text, str(label)) for text, label in zip(texts, labels) if str(label) in ("0", "1")]
+        if not pairs:
+            raise ValueError("No '0'/'1' labels to train the prefilter on.")
+        order = np.random.default_rng(seed).permutation(len(pairs))
+        n_holdout = int(len(pairs) * holdout)
+        held_out = [pairs[i] for i in order[:n_holdout]]
+        train = [pairs[i] for i in order[n_holdout:]]
+
+        train_texts = [text for text, _ in train]
+        self.vectorizer.fit(train_texts)
+        y = np.array([int(label) for _, label in train])
+        self.scorer = SparseLogisticRegression(class_weight="balanced").fit(self._features(train_texts), y)
+
+        if held_out:
+            self.report = self.evaluate([text for text, _ in held_out], [label for _, label in held_out])
+            logging.info(f"Prefilter held-out report: {self.report}")
+        return self
+
+    def route(self, texts):
+        """
+        Auto-labels the posts the cascade is confident about.
+
+        Args:
+            texts (list): The posts to route.
+
+        Returns:
+            list: "0" or "1" for auto-labelled posts, None for posts that need the LLM.
+        """
+        routed = [None] * len(texts)
+        if self.scorer is None and not self.auto_negative_without_fit:
+            self.stats["llm"] += len(texts)
+            return routed
+
+        keyword_hits = [self.matcher.count(text) for text in texts]
+        if self.scorer is None:
+            for i, hits in enumerate(keyword_hits):
+                if hits == 0:
+                    routed[i] = "0"
+                    self.stats["keyword_negative"] += 1
+            self.stats["llm"] += routed.count(None)
+            return routed
+
+        probabilities = self.scorer.predict_proba(self._features(texts))
+        for i, probability in enumerate(probabilities):
+            if probability <= self.negative_threshold:
+                routed[i] = "0"
+                self.stats["keyword_negative" if keyword_hits[i] == 0 else "lexical_negative"] += 1
+            elif probability >= self.positive_threshold:
+                routed[i] = "1"
+                self.stats["lexical_positive"] += 1
+        self.stats["llm"] += routed.count(None)
+        return routed
+
+    def evaluate(self, texts, llm_labels):
+        """
+        Compares the cascade's automatic labels with LLM labels for the same posts.
+        Does not change `stats`.
+
+        Returns:
+            dict: `coverage` (share of posts auto-labelled), `agreement` (share of
+            auto-labelled posts matching the LLM) and the sample size.
+        """
+        saved_stats = dict(self.stats)
+        routed = self.route(texts)
+        self.stats = saved_stats
+        decided = [(auto, str(llm)) for auto, llm in zip(routed, llm_labels) if auto is not None]
+        agreement = sum(auto == llm for auto, llm in decided) / len(decided) if decided else float("nan")
+        return {
+            "sample_size": len(texts),
+            "coverage": len(decided) / len(texts) if texts else 0.0,
+            "agreement": agreement,
+        }
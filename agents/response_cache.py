@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    A persistent, content-addressed cache of LLM responses backed by SQLite.
+
+    Entries are keyed on a hash of the model name, the fully constructed chat messages
+    and the sampling options, so a prompt change to one category only invalidates the
+    entries of that category. The cache is safe to share between threads.
+
+    Hits only note their access time in memory; the times are written in one transaction
+    with the next `put`, every `ACCESS_FLUSH_SIZE` hits and on `close`, so a cache hit
+    does not cost a commit.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+        max_entries (int): Maximum number of stored responses; least recently used
+            entries are evicted beyond it. None means unbounded.
+        read_only (bool): If True, lookups are served but nothing is written, which keeps
+            reruns reproducible against a fixed cache.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups not found in the cache.
+    """
+
+    ACCESS_FLUSH_SIZE = 1000
+
+    def __init__(self, path, max_entries=None, read_only=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._accessed = {}
+
+        if read_only:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Read-only cache '{path}' does not exist.")
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, last_access INTEGER)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+            self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, messages, options=None, format=None):
+        """
+        Builds the cache key for a request.
+
+        Args:
+            model (str): The model name.
+            messages (list): The chat messages sent to the model.
+            options (dict, optional): Sampling options passed to Ollama.
+            format (str or dict, optional): The requested output format.
+
+        Returns:
+            str: A SHA-256 hex digest identifying the request.
+        """
+        payload = json.dumps(
+            {"model": model, "messages": messages, "options": options or {}, "format": format},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a response and refreshes its recency.
+
+        Returns:
+            str or None: The cached response, or None on a miss.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.read_only:
+                self._accessed[key] = time.time_ns()
+                if len(self._accessed) >= self.ACCESS_FLUSH_SIZE:
+                    self._flush_accessed()
+                    self._conn.commit()
+            return row[0]
+
+    def _flush_accessed(self):
+        # Runs under the lock; the caller commits
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def put(self, key, response, model=None):
+        """
+        Stores a response, evicting the least recently used entries if the cache is full.
+        Does nothing in read-only mode.
+        """
+        if self.read_only:
+            return
+        with self._lock:
+            # Pending access times have to be in place before the eviction order is read
+            self._flush_accessed()
+            exists = self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, last_access) VALUES (?, ?, ?, ?)",
+                (key, model, response, time.time_ns()),
+            )
+            if exists is None:
+                self._size += 1
+            if self.max_entries is not None and self._size > self.max_entries:
+                excess = self._size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (excess,),
+                )
+                self._size -= excess
+                logging.debug(f"Evicted {excess} entries from response cache '{self.path}'")
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss counters, hit rate and current number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._size,
+        }
+
+    def close(self):
+        with self._lock:
+            if not self.read_only:
+                self._flush_accessed()
+                self._conn.commit()
+            self._conn.close()
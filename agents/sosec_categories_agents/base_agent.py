@@ -1,52 +1,61 @@
-import os
-import re
-import pandas as pd
+import json
+import hashlib
 import logging
-import ollama
-from pydantic import BaseModel, field_validator
 
-class ClassificationOutput(BaseModel):
-    """
-    A Pydantic model for validating classification outputs.
+from llm_client import AsyncLLMClient, LLMCallError, shared_transport
+from metrics import METRICS
+from classification_pipeline import ClassificationPipelineMixin
+from classification_output import STRUCTURED_NUM_PREDICT, parse_label, structured_output_schema
+from batch_prompting import (
+    BATCH_INSTRUCTIONS, batch_num_predict, batch_output_schema, estimate_tokens, format_batch, parse_batch_labels, plan_batches,
+)
 
-    Attributes:
-        label (str): The classification label, which should be "0", "1", or "Uncertain".
-    """
-    label: str
+class BaseClassificationAgent(ClassificationPipelineMixin):
+    def __init__(self, model: str, category_name: str, category_descriptions: dict, host: str = None, timeout: float = None, cache=None, keep_alive: str = "30m", options: dict = None, structured_output: bool = False, max_retries: int = 1):
+        self.model = model
+        self.category_name = category_name
+        self.category_details = category_descriptions.get(category_name, {})
+        self.host = host
+        self.timeout = timeout
+        self.cache = cache
+        # A stable keep_alive and num_ctx keep the model resident, so Ollama can reuse
+        # the KV cache of the shared prompt prefix between posts
+        self.keep_alive = keep_alive
+        self.options = options
+        # Structured mode constrains decoding to the ClassificationOutput JSON schema
+        self.structured_output = structured_output
+        self.max_retries = max_retries
+        self._transport = None
+        self.system_message, self.user_prefix = self._build_prompt_prefix()
+        self.batch_prefix = self._build_batch_prefix()
 
-    @field_validator("label", mode="before")
-    @classmethod
-    def validate_label(cls, v):
-        """
-        Ensures that the label is one of the expected values.
+    @property
+    def output_column(self):
+        return self.category_name
 
-        Args:
-            v (str): The label output from the model.
+    @property
+    def metrics_category(self):
+        return self.category_name
 
-        Returns:
-            str: The validated label. If invalid, returns "invalid" and logs a warning.
+    @property
+    def transport(self):
         """
-        valid_labels = {"0", "1", "Uncertain"}
-        if v not in valid_labels:
-            logging.warning(f"Unexpected model output '{v}'. Marking as 'invalid' for manual review.")
-            return "invalid"
-        return v
-
-class BaseClassificationAgent:
-    def __init__(self, model: str, category_name: str, category_descriptions: dict):
-        self.model = model
-        self.category_name = category_name
-        self.category_details = category_descriptions.get(category_name, {})
+        The ResilientTransport to the Ollama host, shared by all agents of the process and
+        created on first use. It retries transient failures and pauses while the host is down.
+        """
+        if self._transport is None:
+            self._transport = shared_transport(self.host, self.timeout)
+        return self._transport
 
-    def generate_response(self, messages):
-        try:
-            response = ollama.chat(model=self.model, messages=messages)
-            return response["message"]["content"].strip()
-        except Exception as e:
-            logging.error(f"Error during LLM call: {e}")
-            return "Error occurred during LLM call"
+    @transport.setter
+    def transport(self, transport):
+        self._transport = transport
 
-    def construct_messages(self, post_text: str):
+    def _build_prompt_prefix(self):
+        """
+        Builds the static part of the prompt once, so every request shares a byte-identical
+        prefix and only the post itself is appended at the end.
+        """
         system_message = (
             f"You are an expert text classification assistant. Your task is to determine whether the following Telegram post falls into the category of '{self.category_name}'. "
             "This category includes posts that discuss, for example, the following aspects:\n"
@@ -54,62 +63,221 @@ class BaseClassificationAgent:
         for subcategory, description in self.category_details.items():
             system_message += f"- {subcategory}: {description}\n"
 
-        user_message = (
+        user_prefix = (
             "Classify the following Telegram post strictly based on its content:\n\n"
             f"Label it with '1' if the post references {self.category_name} or any of its more specific aspects.\n"
             "Label it with '0' if it is about a different topic.\n"
             "If the classification is unclear, respond ONLY with 'Uncertain'.\n\n"
-            f"Post:\n'{post_text}'"
+            "Post:\n"
+        )
+        return system_message, user_prefix
+
+    @property
+    def prompt_version(self) -> str:
+        """
+        A fingerprint of everything that determines this agent's labels: the model, the
+        prompt (which includes the `CATEGORY_DESCRIPTIONS` entries) and the output mode.
+        Stored labels are only reused while it is unchanged.
+        """
+        payload = json.dumps([self.model, self.system_message, self.user_prefix, self.structured_output])
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+    def _build_batch_prefix(self):
+        return (
+            "Classify the following Telegram posts strictly based on their content:\n\n"
+            f"Label a post with '1' if it references {self.category_name} or any of its more specific aspects.\n"
+            "Label it with '0' if it is about a different topic.\n"
+            "If the classification is unclear, label it 'Uncertain'.\n\n"
+            f"{BATCH_INSTRUCTIONS}\n\n"
         )
 
+    def chat_kwargs(self, num_predict: int = STRUCTURED_NUM_PREDICT) -> dict:
+        """
+        Args:
+            num_predict (int, optional): Generation budget in structured-output mode.
+
+        Returns:
+            dict: The extra arguments passed with every chat request.
+        """
+        if not self.structured_output:
+            return {"options": self.options, "keep_alive": self.keep_alive}
+        options = {"temperature": 0, **(self.options or {}), "num_predict": num_predict}
+        return {
+            "options": options,
+            "format": structured_output_schema(),
+            "keep_alive": self.keep_alive,
+        }
+
+    def batch_chat_kwargs(self, batch_size: int) -> dict:
+        """
+        Returns:
+            dict: The chat arguments for a batch request of up to `batch_size` posts.
+        """
+        options = {**(self.options or {}), "num_predict": batch_num_predict(batch_size), "temperature": 0}
+        return {"options": options, "format": batch_output_schema(), "keep_alive": self.keep_alive}
+
+    def context_window(self) -> int:
+        return (self.options or {}).get("num_ctx", 2048)
+
+    def generate_response(self, messages, chat_kwargs: dict = None):
+        """
+        Returns:
+            str: The model's answer.
+
+        Raises:
+            LLMCallError: If the model could not be reached, even after retries.
+        """
+        chat_kwargs = chat_kwargs or self.chat_kwargs()
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.model, messages, chat_kwargs.get("options"), chat_kwargs.get("format"))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                METRICS.increment("cache_hits")
+                return cached.strip()
+        content = self.transport.chat(self.model, messages, **chat_kwargs).strip()
+        if self.cache is not None:
+            self.cache.put(cache_key, content, self.model)
+        return content
+
+    def construct_messages(self, post_text: str):
+        with METRICS.timer("construct_messages"):
+            return [
+                {"role": "system", "content": self.system_message},
+                {"role": "user", "content": f"{self.user_prefix}'{post_text}'"},
+            ]
+
+    def construct_batch_messages(self, posts: list):
         return [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_message},
+            {"role": "system", "content": self.system_message},
+            {"role": "user", "content": f"{self.batch_prefix}{format_batch(posts)}"},
         ]
 
+    def parse_response(self, response: str) -> str:
+        with METRICS.timer("validate"):
+            return parse_label(response)
+
+    def should_retry(self, label: str, attempt: int) -> bool:
+        """
+        Whether an invalid label is re-asked: only in structured-output mode and for at most
+        `max_retries` attempts.
+        """
+        return label == "invalid" and self.structured_output and attempt <= self.max_retries
+
+    def retry_chat_kwargs(self, attempt: int) -> dict:
+        """
+        Returns:
+            dict: The chat arguments for retry `attempt`, doubling the generation budget each time.
+        """
+        return self.chat_kwargs(num_predict=STRUCTURED_NUM_PREDICT * 2 ** attempt)
+
+    def retry_invalid_label(self, post_text: str, label: str) -> str:
+        """
+        In structured-output mode, re-asks up to `max_retries` times for an invalid label,
+        doubling the generation budget each time. Other labels are returned unchanged.
+        """
+        attempt = 1
+        while self.should_retry(label, attempt):
+            label = self.parse_response(self.generate_response(self.construct_messages(post_text), self.retry_chat_kwargs(attempt)))
+            attempt += 1
+        return label
+
+    def validate_response(self, post_text: str, response) -> str:
+        """
+        Turns a model answer into a validated label, retrying invalid ones.
+
+        Args:
+            post_text (str): The classified post.
+            response (str or Exception): The answer, or the error of a failed call.
+
+        Returns:
+            str: The label, or None if the model could not be reached.
+        """
+        if isinstance(response, BaseException):
+            return None
+        try:
+            return self.retry_invalid_label(post_text, self.parse_response(response))
+        except LLMCallError:
+            return None
+
     def classify_post(self, post_text: str) -> str:
-        messages = self.construct_messages(post_text)
-        response = self.generate_response(messages)
-        response = response.upper().strip()
-        validated_label = ClassificationOutput(label=response).label
-        return validated_label
+        """
+        Returns:
+            str: The validated label, or None if the model could not be reached.
+        """
+        with METRICS.timer("classify_post"):
+            messages = self.construct_messages(post_text)
+            try:
+                response = self.generate_response(messages)
+            except LLMCallError as e:
+                response = e
+            return self.validate_response(post_text, response)
 
-    def process_dataset(self, inpath: str, outpath: str, checkpoint_path: str = None):
+    def classify_posts(self, posts: list, concurrency: int = 1) -> list:
         """
-        Processes a dataset of posts, classifying each one and saving the results.
+        Classifies several posts, keeping up to `concurrency` requests in flight.
 
         Args:
-            inpath (str): Path to the input CSV file containing the posts.
-            outpath (str): Path to save the output CSV file with classifications.
-            checkpoint_path (str, optional): Path to a checkpoint CSV file to resume interrupted processing.
+            posts (list): The posts to classify.
+            concurrency (int, optional): Maximum number of parallel LLM requests. Defaults to 1.
 
         Returns:
-            None: Saves the classified dataset to a CSV file.
+            list: The validated labels, in the same order as `posts`. Posts for which the
+            model could not be reached get None.
         """
-        parsed_labels = []
-        processed_texts = []
+        if concurrency <= 1:
+            return [self.classify_post(post) for post in posts]
 
-        if checkpoint_path and os.path.exists(checkpoint_path):
-            data = pd.read_csv(checkpoint_path)
-            raw_messages = data["Post Text"].tolist()
+        client = AsyncLLMClient(self.model, host=self.host, concurrency=concurrency, timeout=self.timeout, cache=self.cache, transport=self.transport)
+        responses = client.chat_many([self.construct_messages(post) for post in posts], **self.chat_kwargs())
+        return [self.validate_response(post, response) for post, response in zip(posts, responses)]
+
+    def classify_posts_batched(self, posts: list, max_batch_size: int = 16, concurrency: int = 1) -> list:
+        """
+        Classifies posts by packing several of them into each request.
+
+        Batch sizes adapt to the post lengths so that each request fits the model's context
+        window (`num_ctx` in `options`). A batch whose answer does not validate falls back
+        to single-post calls; the posts of a batch whose request failed get None.
+
+        Args:
+            posts (list): The posts to classify.
+            max_batch_size (int, optional): Upper bound on posts per request. Defaults to 16.
+            concurrency (int, optional): Maximum number of parallel batch requests. Defaults to 1.
+
+        Returns:
+            list: The validated labels, in the same order as `posts`.
+        """
+        if not posts:
+            return []
+        prefix_tokens = estimate_tokens(self.system_message + self.batch_prefix)
+        batches = plan_batches(posts, self.context_window() - prefix_tokens, max_batch_size)
+        messages = [self.construct_batch_messages([posts[i] for i in batch]) for batch in batches]
+        chat_kwargs = self.batch_chat_kwargs(max(len(batch) for batch in batches))
+
+        if concurrency > 1:
+            client = AsyncLLMClient(self.model, host=self.host, concurrency=concurrency, timeout=self.timeout, cache=self.cache, transport=self.transport)
+            responses = client.chat_many(messages, **chat_kwargs)
         else:
-            data_origin = pd.read_csv(inpath)
-            raw_messages = data_origin["Post Text"].tolist()
-
-        for n, post in enumerate(raw_messages):
-            logging.info(f"Processing post: {post}")
-            response = self.classify_post(post)
-            logging.info(f"Model response: {response}")
-            parsed_labels.append(response)
-            processed_texts.append(post)
-
-            if (n + 1) % 10 == 0 and checkpoint_path:
-                checkpoint_df = pd.DataFrame({"Post Text": processed_texts, self.category_name.lower().replace(" ", "_"): parsed_labels})
-                checkpoint_df.to_csv(checkpoint_path, mode="a", index=False, header=not os.path.exists(checkpoint_path))
-
-        data_origin[self.category_name] = parsed_labels
-        data_origin.to_csv(outpath, index=False)
-        logging.info("Data saved successfully")
+            responses = []
+            for batch_messages in messages:
+                try:
+                    responses.append(self.generate_response(batch_messages, chat_kwargs))
+                except LLMCallError as e:
+                    responses.append(e)
+
+        labels = [None] * len(posts)
+        for batch, response in zip(batches, responses):
+            if isinstance(response, BaseException):
+                # The host is failing; single-post calls would only fail as well
+                continue
+            batch_labels = parse_batch_labels(response, len(batch))
+            if batch_labels is None:
+                logging.warning(f"Batch of {len(batch)} posts did not validate; falling back to single-post calls")
+                batch_labels = [self.classify_post(posts[i]) for i in batch]
+            for i, label in zip(batch, batch_labels):
+                labels[i] = label
+        return labels
 
 # Example usage
 # class ViewGermanyUsaAgent(BaseClassificationAgent):
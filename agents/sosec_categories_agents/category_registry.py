@@ -0,0 +1,87 @@
+import os
+import importlib
+
+
+# The categories file can be swapped per deployment without touching the code
+DEFAULT_CATEGORIES_PATH = os.environ.get(
+    "SOSEC_CATEGORIES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "categories.toml")
+)
+
+
+class CategoryRegistry:
+    """
+    The SOSEC categories, declared in a TOML file and turned into agents on demand.
+
+    Importing this module costs next to nothing: the file is parsed on first access, and
+    the agent classes (and with them ollama, pydantic and pandas) are only imported when
+    the first agent is created. All agents of a process share one Ollama client per host.
+
+    Attributes:
+        path (str): Path of the categories file.
+    """
+
+    def __init__(self, path=DEFAULT_CATEGORIES_PATH):
+        self.path = path
+        self._categories = None
+
+    @property
+    def categories(self):
+        """
+        dict: Category name to its entry in the file (`aspects`, and optionally `agent`
+        and `enabled`), in file order.
+        """
+        if self._categories is None:
+            import tomllib
+            with open(self.path, "rb") as f:
+                entries = tomllib.load(f).get("category", [])
+            self._categories = {}
+            for entry in entries:
+                if entry["name"] in self._categories:
+                    raise ValueError(f"Category '{entry['name']}' is declared twice in '{self.path}'.")
+                self._categories[entry["name"]] = entry
+        return self._categories
+
+    def names(self, include_disabled=False):
+        return [name for name, entry in self.categories.items() if include_disabled or entry.get("enabled", True)]
+
+    def category_descriptions(self, name):
+        """
+        Returns:
+            dict: `{name: {aspect: description}}`, the `category_descriptions` format of
+            BaseClassificationAgent.
+        """
+        if name not in self.categories:
+            raise KeyError(f"Unknown category '{name}'. Known categories: {', '.join(self.categories)}")
+        return {name: dict(self.categories[name].get("aspects", {}))}
+
+    def agent_class(self, name):
+        spec = self.categories[name].get("agent")
+        if spec is None:
+            from base_agent import BaseClassificationAgent
+            return BaseClassificationAgent
+        module_name, _, class_name = spec.partition(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def create(self, name, model, **kwargs):
+        """
+        Creates the agent for one category.
+
+        Args:
+            name (str): The category name.
+            model (str): The LLM model to use.
+            **kwargs: Further BaseClassificationAgent arguments (host, cache, options, ...).
+        """
+        agent_class = self.agent_class(name)
+        if self.categories[name].get("agent") is None:
+            return agent_class(model, name, self.category_descriptions(name), **kwargs)
+        return agent_class(model, **kwargs)
+
+    def create_agents(self, model, names=None, **kwargs):
+        """
+        Creates agents for the given categories, or for all enabled ones.
+        """
+        return [self.create(name, model, **kwargs) for name in (names or self.names())]
+
+
+# The registry for the default categories file
+REGISTRY = CategoryRegistry()
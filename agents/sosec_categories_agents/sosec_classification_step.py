@@ -1,28 +1,67 @@
-import multiprocessing
+import os
+import argparse
 from sosec_orchestrator_agent import SOSECOrchestratorAgent
-from general_concerns_agent import GeneralConcernsAgent
-from political_parties_agent import PoliticalPartiesAgent
-from trust_institutions_agent import TrustInstitutionsAgent
-from views_germany_usa_agent import ViewGermanyUsaAgent
-from conspiracy_theories_agent import ConspiracyTheoriesAgent
+from category_registry import REGISTRY
+from work_scheduler import WorkScheduler
+
+
+def parse_hosts(entries, default_concurrency):
+    """
+    Turns `url` or `url=limit` entries into the scheduler's hosts and per-host limits.
+
+    Args:
+        entries (list): Host entries; an empty list uses the `OLLAMA_HOST` default.
+        default_concurrency (int): The limit for entries without their own.
+
+    Returns:
+        tuple: (hosts, per_host_concurrency) for `WorkScheduler`.
+    """
+    hosts, limits = [], {}
+    for entry in entries:
+        host, _, limit = entry.strip().partition("=")
+        if not host:
+            continue
+        hosts.append(host)
+        limits[host] = int(limit) if limit else default_concurrency
+    if not hosts:
+        return [None], default_concurrency
+    return hosts, limits
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Classify the posts into all SOSEC categories.")
+    # Add further Ollama hosts to scale out; each gets its own concurrency limit
+    parser.add_argument(
+        "--host", action="append", dest="hosts",
+        help="Ollama host as 'url' or 'url=limit'; repeat for several hosts. "
+             "Defaults to the comma-separated SOSEC_OLLAMA_HOSTS, else OLLAMA_HOST.",
+    )
+    parser.add_argument(
+        "--per-host-concurrency", type=int, default=int(os.environ.get("SOSEC_PER_HOST_CONCURRENCY", "4")),
+        help="Requests in flight per host without its own limit (SOSEC_PER_HOST_CONCURRENCY).",
+    )
+    parser.add_argument(
+        "--max-pending", type=int, default=int(os.environ.get("SOSEC_MAX_PENDING", "64")),
+        help="Requests queued ahead of the hosts (SOSEC_MAX_PENDING).",
+    )
+    args = parser.parse_args()
+    entries = args.hosts or os.environ.get("SOSEC_OLLAMA_HOSTS", "").split(",")
+    hosts, per_host_concurrency = parse_hosts(entries, args.per_host_concurrency)
+
     model = "llama3.2:latest"
-    agents = [
-        GeneralConcernsAgent(model),
-        PoliticalPartiesAgent(model),
-        TrustInstitutionsAgent(model),
-        ViewGermanyUsaAgent(model),
-        ConspiracyTheoriesAgent(model),
-    ]
+    # One agent per enabled category in categories.toml
+    agents = REGISTRY.create_agents(model)
+    scheduler = WorkScheduler(hosts=hosts, per_host_concurrency=per_host_concurrency, max_pending=args.max_pending)
+    # Paths are relative to the repository root (see the `agents` package for how to run this)
     orchestrator = SOSECOrchestratorAgent(
         agents,
-        r"../../data/start_data_isr.csv",
-        r"../../data/combined_results.csv"
+        r"data/start_data_isr.csv",
+        r"data/combined_results.csv",
+        scheduler=scheduler,
+        # Requests that still fail after the end-of-run retries are listed here
+        dead_letter_path=r"data/combined_results.failed.jsonl",
     )
     orchestrator.run()
 
 if __name__ == "__main__":
-    multiprocessing.freeze_support()  
-    multiprocessing.set_start_method("spawn", force=True)
     main()
@@ -1,48 +1,360 @@
-import multiprocessing
+import os
+import json
+import logging
 import pandas as pd
 
-def process_agent(agent, input_csv_path):
-    """Standalone function for processing an agent."""
-    print(f"Processing with {agent.__class__.__name__}...")
-    temp_output_path = f"temp_{agent.__class__.__name__}.csv"
-    agent.process_dataset(input_csv_path, temp_output_path, None)  # Added None for checkpoint_path
-    result = pd.read_csv(temp_output_path)
-    return result, agent.category_name
+from dataset_io import CONTENT_HASH_COLUMN, ROW_ID_COLUMN, ChunkWriter, content_hashes, iter_chunks, update_rows
+from dead_letter_queue import DeadLetterQueue
+from work_scheduler import WorkItem, WorkScheduler
+from metrics import METRICS
+
 
 class SOSECOrchestratorAgent:
-    def __init__(self, agents, input_csv_path, output_csv_path):
+    """
+    Runs all registered category agents over a dataset in a single pass.
+
+    Each post is read once and every category is evaluated against it. The resulting
+    (post, category) requests go to a shared WorkScheduler, which spreads them fairly
+    across categories and over the configured Ollama hosts.
+
+    The output doubles as the results store for incremental runs: every row carries a
+    `content_hash` of its post, and a `<output>.versions.json` file next to it records the
+    `prompt_version` each category column was produced with.
+
+    A (post, category) request that fails for good leaves its cell empty rather than
+    storing an error as the label. Such cells are retried at the end of the run and filled
+    in place; incremental runs also reclassify rows with empty cells.
+    """
+
+    def __init__(self, agents, input_csv_path, output_csv_path, scheduler=None, deduplicator=None, chunksize=None, metrics_path=None, incremental=False, rollups=None, events=None, dead_letter_path=None):
+        """
+        Args:
+            agents (list): Instances of BaseClassificationAgent subclasses.
+            input_csv_path (str): Path to the input CSV with 'Post Text' and 'date' columns.
+            output_csv_path (str): Path of the combined output CSV.
+            scheduler (WorkScheduler, optional): Dispatches model requests. Defaults to a
+                scheduler for the default Ollama host.
+            deduplicator (PostDeduplicator, optional): If given, duplicate posts are classified
+                once per cluster and the labels are fanned back out to all members.
+            chunksize (int, optional): If given, the input is streamed in chunks of this many
+                rows and results are appended to the output as each chunk completes.
+            metrics_path (str, optional): If given, stage timings, counters and Ollama token
+                counts are exported there after `run` (`.jsonl` for JSON, else Prometheus text).
+            incremental (bool, optional): If True, `run` updates the existing output instead
+                of reclassifying everything: only new posts, posts whose text changed, and
+                categories whose prompt version changed are sent to the model, and the
+                results are upserted by row id. Stored rows missing from the input are kept.
+            rollups (TimeSeriesRollups, optional): If given, every classified row is also
+                applied to these time-series rollups, which are materialized after `run`.
+            events (pd.DataFrame, optional): Events overlaid on the materialized rollups.
+            dead_letter_path (str, optional): Where (post, category) requests that still fail
+                after the end-of-run retries are listed (JSONL).
+        """
         self.agents = agents
         self.input_csv_path = input_csv_path
         self.output_csv_path = output_csv_path
+        self.scheduler = scheduler or WorkScheduler()
+        self.deduplicator = deduplicator
+        self.chunksize = chunksize
+        self.metrics_path = metrics_path
+        self.incremental = incremental
+        self.rollups = rollups
+        self.events = events
+        self.dead_letters = DeadLetterQueue(dead_letter_path)
+        self.calls_saved = 0
+        self.versions_path = os.path.splitext(output_csv_path)[0] + ".versions.json"
 
-    def run(self):
-        data = pd.read_csv(self.input_csv_path, nrows=5)
-        if 'Post Text' not in data.columns or 'date' not in data.columns:
-            raise ValueError("Input CSV must contain 'Post Text' and 'date' columns.")
-
-        results = {}
-        with multiprocessing.Pool() as pool:
-            # Use pool.apply_async to submit tasks
-            future_to_agent = {pool.apply_async(process_agent, (agent, self.input_csv_path)): agent for agent in self.agents}
-            for future in future_to_agent:
-                agent = future_to_agent[future]
-                try:
-                    agent_result, agent_name = future.get()
-                    results[agent_name] = agent_result
-                except Exception as e:
-                    print(f"Error processing {agent.__class__.__name__}: {e}")
-
-        combined_results = data[['Post Text', 'date']].copy()
-        for agent_name, agent_result in results.items():
-            # Use the category_name from the agent as the column name
-            category_col = agent_name  # This is now the category_name from the agent
-            combined_results = pd.merge(
-                combined_results,
-                agent_result[['Post Text', category_col]],
-                on='Post Text',
-                how='left'
+    def classify_post(self, post_text):
+        """
+        Evaluates every registered category against a single post.
+
+        Args:
+            post_text (str): The post to classify.
+
+        Returns:
+            dict: Mapping of category_name to validated label.
+        """
+        return self.classify_posts([post_text])[0]
+
+    def classify_posts(self, posts, categories=None):
+        """
+        Evaluates the registered categories against each post through the scheduler.
+
+        Invalid labels are re-asked in further scheduler rounds (see `should_retry` on the
+        agents), so retries share the scheduler's hosts, limits and category weights.
+
+        Args:
+            posts (list): The posts to classify.
+            categories (collection, optional): Category names to evaluate. Defaults to all.
+
+        Returns:
+            list: One dict per post mapping category_name to validated label, or to None if
+            the model could not be reached.
+        """
+        agents = [agent for agent in self.agents if categories is None or agent.category_name in categories]
+        items = (
+            WorkItem((i, agent.category_name), agent.category_name, agent.model, agent.construct_messages(post), agent.chat_kwargs())
+            for i, post in enumerate(posts)
+            for agent in agents
+        )
+        responses = self.scheduler.run(items)
+        agents_by_category = {agent.category_name: agent for agent in agents}
+        results = {key: self._parse(agents_by_category[key[1]], response) for key, response in responses.items()}
+
+        attempt = 1
+        while retry := [key for key, label in results.items() if agents_by_category[key[1]].should_retry(label, attempt)]:
+            responses = self.scheduler.run(self._retry_items(retry, posts, agents_by_category, attempt))
+            for key in retry:
+                results[key] = self._parse(agents_by_category[key[1]], responses[key])
+            attempt += 1
+
+        labels = [{agent.category_name: results[(i, agent.category_name)] for agent in agents} for i in range(len(posts))]
+        METRICS.increment("posts_classified", len(posts), category="all")
+        return labels
+
+    @staticmethod
+    def _retry_items(keys, posts, agents_by_category, attempt):
+        for i, category in keys:
+            agent = agents_by_category[category]
+            yield WorkItem((i, category), category, agent.model, agent.construct_messages(posts[i]), agent.retry_chat_kwargs(attempt))
+
+    @staticmethod
+    def _parse(agent, response):
+        # A request that failed for good leaves the label empty
+        return None if isinstance(response, BaseException) else agent.parse_response(response)
+
+    def _classify_chunk(self, chunk, categories=None):
+        posts = chunk['Post Text'].tolist()
+        agents = [agent for agent in self.agents if categories is None or agent.category_name in categories]
+        representatives = list(range(len(posts)))
+        if self.deduplicator is not None:
+            representatives = self.deduplicator.cluster(posts)
+            self.calls_saved += self.deduplicator.stats["calls_saved"] * len(agents)
+        unique_indices = sorted(set(representatives))
+
+        logging.info(f"Classifying {len(unique_indices)} posts x {len(agents)} categories")
+        labels_by_post = dict(zip(unique_indices, self.classify_posts([posts[i] for i in unique_indices], categories)))
+
+        # Category columns are aligned on the integer row id, never on the post text
+        with METRICS.timer("merge"):
+            combined_results = chunk[[ROW_ID_COLUMN, 'Post Text', 'date']].set_index(ROW_ID_COLUMN)
+            combined_results[CONTENT_HASH_COLUMN] = content_hashes(posts)
+            for agent in agents:
+                labels = [labels_by_post[rep][agent.category_name] for rep in representatives]
+                combined_results[agent.category_name] = labels
+                self.dead_letters.add_failed(combined_results.index, posts, labels, agent.category_name)
+            return combined_results.reset_index()
+
+    @staticmethod
+    def combine_agent_outputs(data, agent_results):
+        """
+        Joins the outputs of separately run agents onto the input rows by row id.
+
+        Args:
+            data (pd.DataFrame): The input rows, including the `row_id` column.
+            agent_results (dict): Mapping of category_name to the DataFrame written by that
+                agent's `process_dataset`, which carries the same `row_id` column.
+
+        Returns:
+            pd.DataFrame: The input rows with one column per category.
+        """
+        with METRICS.timer("merge"):
+            combined_results = data[[ROW_ID_COLUMN, 'Post Text', 'date']].set_index(ROW_ID_COLUMN)
+            category_columns = [
+                agent_result.set_index(ROW_ID_COLUMN)[[category]] for category, agent_result in agent_results.items()
+            ]
+            return combined_results.join(category_columns, how='left').reset_index()
+
+    def _load_versions(self):
+        if not os.path.exists(self.versions_path):
+            return {}
+        with open(self.versions_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_versions(self, versions):
+        with open(self.versions_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(versions, f, indent=2, sort_keys=True)
+        os.replace(self.versions_path + ".tmp", self.versions_path)
+
+    def _load_previous(self):
+        """
+        Streams the previous output, keeping only the content hash of every row. Rows with
+        an empty label (a call that failed for good) get no hash, so they count as changed
+        and are classified again.
+
+        Returns:
+            tuple: (hashes, columns): the stored content hashes as a Series indexed by row
+            id and the output's columns, or (None, []) if there is no previous output.
+        """
+        if not os.path.exists(self.output_csv_path):
+            return None, []
+        hashes, columns = [], None
+        for chunk in self._iter_stored():
+            if columns is None:
+                columns = list(chunk.columns)
+            stored = chunk[CONTENT_HASH_COLUMN] if CONTENT_HASH_COLUMN in chunk else pd.Series(None, index=chunk.index, dtype=object)
+            labelled = [agent.category_name for agent in self.agents if agent.category_name in chunk.columns]
+            stored = stored.mask(chunk[labelled].isna().any(axis=1))
+            hashes.append(stored.set_axis(chunk[ROW_ID_COLUMN]))
+        return pd.concat(hashes), columns or []
+
+    def _iter_stored(self):
+        # Labels and hashes are read as text; only the row id is numeric
+        for chunk in iter_chunks(self.output_csv_path, self.chunksize, dtype=str):
+            yield chunk.astype({ROW_ID_COLUMN: "int64"})
+
+    def _classify_incremental_chunk(self, chunk, hashes, stale):
+        """
+        Classifies the rows of `chunk` that are new or changed for all categories, and the
+        unchanged ones only for the `stale` categories.
+
+        Returns:
+            tuple: (changed, restaled): the rows classified for all categories and the rows
+            classified for the stale categories only; either is None if no row needed it.
+        """
+        chunk = chunk.assign(**{CONTENT_HASH_COLUMN: content_hashes(chunk['Post Text'])})
+        if hashes is None:
+            changed = pd.Series(True, index=chunk.index)
+        else:
+            stored = hashes.reindex(chunk[ROW_ID_COLUMN]).to_numpy()
+            changed = pd.Series(stored != chunk[CONTENT_HASH_COLUMN].to_numpy(), index=chunk.index)
+
+        unchanged = chunk[~changed]
+        return (
+            self._classify_chunk(chunk[changed]) if changed.any() else None,
+            self._classify_chunk(unchanged, stale) if stale and not unchanged.empty else None,
+        )
+
+    def _upsert(self, previous_columns, updates, stale_updates):
+        """
+        Rewrites the output with `updates` replacing stored rows of the same row id, in
+        place, and new rows appended at the end. `stale_updates` replace only their own
+        columns of stored rows, so the labels of the other categories are kept.
+
+        Returns:
+            pd.DataFrame: The updated rows as written.
+        """
+        columns = [ROW_ID_COLUMN, 'Post Text', 'date', CONTENT_HASH_COLUMN]
+        columns += [column for column in previous_columns if column not in columns]
+        columns += [agent.category_name for agent in self.agents if agent.category_name not in columns]
+        updates = updates.reindex(columns=columns).set_index(ROW_ID_COLUMN)
+        stale_updates = stale_updates.set_index(ROW_ID_COLUMN)
+
+        tmp_path = os.path.join(os.path.dirname(self.output_csv_path) or ".", "tmp-" + os.path.basename(self.output_csv_path))
+        writer = ChunkWriter(tmp_path)
+        written = []
+        try:
+            if os.path.exists(self.output_csv_path):
+                for chunk in self._iter_stored():
+                    chunk = chunk.reindex(columns=columns).set_index(ROW_ID_COLUMN)
+                    replaced = chunk.index.intersection(updates.index)
+                    chunk.loc[replaced] = updates.loc[replaced]
+                    updates = updates.drop(replaced)
+                    restaled = chunk.index.intersection(stale_updates.index)
+                    chunk.loc[restaled, stale_updates.columns] = stale_updates.loc[restaled]
+                    written.append(chunk.loc[replaced.union(restaled)])
+                    writer.write(chunk.reset_index())
+            if not updates.empty:
+                writer.write(updates.reset_index())
+                written.append(updates)
+        finally:
+            writer.close()
+        os.replace(tmp_path, self.output_csv_path)
+        return pd.concat(written).reset_index()
+
+    def _requeue_failed(self):
+        """
+        Retries the (post, category) requests that failed during the run and fills the
+        recovered labels into the output (and the rollups).
+        """
+        def retry(entries):
+            results = [None] * len(entries)
+            by_category = {}
+            for k, entry in enumerate(entries):
+                by_category.setdefault(entry["category"], []).append(k)
+            for category, positions in by_category.items():
+                labels = self.classify_posts([entries[k]["post"] for k in positions], {category})
+                for k, label in zip(positions, labels):
+                    results[k] = label[category]
+            return results
+
+        recovered = self.dead_letters.requeue(retry)
+        if recovered:
+            updates = {}
+            for entry, label in recovered:
+                updates.setdefault(entry["row_id"], {})[entry["category"]] = label
+            rows = update_rows(self.output_csv_path, updates, self.chunksize)
+            if self.rollups is not None:
+                self.rollups.update(rows)
+        self.dead_letters.save()
+
+    def run_incremental(self):
+        """
+        Brings the output up to date with the input, classifying only what changed.
+
+        Returns:
+            dict: Counts of `rows_classified` and the `stale_categories` that were rerun.
+        """
+        versions = self._load_versions()
+        hashes, previous_columns = self._load_previous()
+        stale = [
+            agent.category_name for agent in self.agents
+            if hashes is not None
+            and (versions.get(agent.category_name) != agent.prompt_version or agent.category_name not in previous_columns)
+        ]
+        if stale:
+            logging.info(f"Prompt versions changed for {stale}; their labels are recomputed")
+
+        updates, stale_updates = [], []
+        for chunk in iter_chunks(self.input_csv_path, self.chunksize):
+            if 'Post Text' not in chunk.columns or 'date' not in chunk.columns:
+                raise ValueError("Input CSV must contain 'Post Text' and 'date' columns.")
+            changed, restaled = self._classify_incremental_chunk(chunk[[ROW_ID_COLUMN, 'Post Text', 'date']], hashes, stale)
+            if changed is not None:
+                updates.append(changed)
+            if restaled is not None:
+                stale_updates.append(restaled)
+
+        rows_classified = sum(len(update) for update in updates + stale_updates)
+        if rows_classified:
+            empty = pd.DataFrame(columns=[ROW_ID_COLUMN])
+            rows = self._upsert(
+                previous_columns,
+                pd.concat(updates, ignore_index=True) if updates else empty,
+                pd.concat(stale_updates, ignore_index=True) if stale_updates else empty,
             )
+            if self.rollups is not None:
+                self.rollups.update(rows)
+        self._save_versions({**versions, **{agent.category_name: agent.prompt_version for agent in self.agents}})
+        logging.info(f"Incremental run classified {rows_classified} rows")
+        return {"rows_classified": rows_classified, "stale_categories": stale}
 
-        combined_results.to_csv(self.output_csv_path, index=False)
-        print(f"Combined results saved to {self.output_csv_path}")
+    def run(self):
+        self.calls_saved = 0
+        self.dead_letters.entries = []
+        if self.incremental:
+            self.run_incremental()
+        else:
+            if self.rollups is not None:
+                self.rollups.reset()
+            writer = ChunkWriter(self.output_csv_path)
+            try:
+                for chunk in iter_chunks(self.input_csv_path, self.chunksize):
+                    if 'Post Text' not in chunk.columns or 'date' not in chunk.columns:
+                        raise ValueError("Input CSV must contain 'Post Text' and 'date' columns.")
+                    results = self._classify_chunk(chunk)
+                    writer.write(results)
+                    if self.rollups is not None:
+                        self.rollups.update(results)
+            finally:
+                writer.close()
+            self._save_versions({agent.category_name: agent.prompt_version for agent in self.agents})
+        self._requeue_failed()
+        if self.rollups is not None:
+            self.rollups.materialize(self.events)
 
+        if self.deduplicator is not None:
+            logging.info(f"Deduplication saved {self.calls_saved} model calls")
+        if self.metrics_path:
+            METRICS.export(self.metrics_path)
+        print(f"Combined results saved to {self.output_csv_path}")
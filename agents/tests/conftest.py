@@ -0,0 +1,38 @@
+import pytest
+from fake_ollama_server import FakeOllamaServer
+
+
+def echo_responder(request):
+    """
+    Answers with the last message, so tests can tell which request a response belongs to.
+    """
+    return request["messages"][-1]["content"]
+
+
+@pytest.fixture
+def fake_server():
+    with FakeOllamaServer(latency=0.01, concurrency=16) as server:
+        yield server
+
+
+def keyword_responder(request):
+    """
+    Labels a post "1" if it mentions Gaza, else "0".
+    """
+    return "1" if "gaza" in request["messages"][-1]["content"].lower() else "0"
+
+
+@pytest.fixture
+def labelling_server():
+    with FakeOllamaServer(latency=0.001, concurrency=16, responder=keyword_responder) as server:
+        yield server
+
+
+def write_posts(path, texts):
+    """
+    Writes `texts` as an input dataset with the 'Post Text' and 'date' columns.
+    """
+    import pandas as pd
+
+    pd.DataFrame({"Post Text": texts, "date": [f"2023-10-{i % 28 + 1:02d}" for i in range(len(texts))]}).to_csv(path, index=False)
+    return str(path)
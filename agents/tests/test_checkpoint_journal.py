@@ -0,0 +1,58 @@
+import pandas as pd
+from checkpoint_journal import CheckpointJournal
+from post_deduplicator import PostDeduplicator
+from topic_checker_agent import TopicCheckerAgent
+from tests.conftest import write_posts
+
+TEXTS = ["Neues aus Gaza", "Wetterbericht", "Gaza heute", "Fußball", "Gaza-Streifen", "Börse"]
+
+
+def chat_calls(server):
+    return server.stats.snapshot()["calls"].get("/api/chat", 0)
+
+
+def test_journal_replays_records_and_skips_a_torn_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with CheckpointJournal(path) as journal:
+        journal.record(0, "1")
+        journal.record(1, {"label": "0", "tier": "small"})
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"row_id": 2, "res')
+
+    with CheckpointJournal(path) as journal:
+        assert journal.completed == {0: "1", 1: {"label": "0", "tier": "small"}}
+        journal.record(2, "1")
+    assert CheckpointJournal(path).completed[2] == "1"
+
+
+def test_resume_only_sends_rows_missing_from_the_journal(tmp_path, labelling_server):
+    inpath = write_posts(tmp_path / "in.csv", TEXTS)
+    checkpoint = str(tmp_path / "journal.jsonl")
+    # An interrupted run that finished the first two rows
+    with CheckpointJournal(checkpoint) as journal:
+        journal.record(0, "1")
+        journal.record(1, "0")
+
+    agent = TopicCheckerAgent(model="fake-model", topic="Israel", host=labelling_server.url)
+    agent.process_dataset(inpath, str(tmp_path / "out.csv"), checkpoint_path=checkpoint, chunksize=4)
+    assert chat_calls(labelling_server) == len(TEXTS) - 2
+
+    agent.process_dataset(inpath, str(tmp_path / "again.csv"), checkpoint_path=checkpoint, chunksize=4)
+    assert chat_calls(labelling_server) == len(TEXTS) - 2
+    labels = pd.read_csv(tmp_path / "again.csv")["Classification"].astype(str).tolist()
+    assert labels == ["1", "0", "1", "0", "1", "0"]
+
+
+def test_resume_is_exact_whatever_the_deduplication(tmp_path, labelling_server):
+    texts = ["Neues aus Gaza", "Wetterbericht", "neues aus GAZA", "Wetterbericht", "Gaza heute", "Gaza heute"]
+    inpath = write_posts(tmp_path / "in.csv", texts)
+    checkpoint = str(tmp_path / "journal.jsonl")
+    agent = TopicCheckerAgent(model="fake-model", topic="Israel", host=labelling_server.url)
+    agent.process_dataset(inpath, str(tmp_path / "out.csv"), checkpoint_path=checkpoint, deduplicator=PostDeduplicator(threshold=1.0))
+    assert chat_calls(labelling_server) == 3
+    assert len(CheckpointJournal(checkpoint).completed) == len(texts)
+
+    agent.process_dataset(inpath, str(tmp_path / "again.csv"), checkpoint_path=checkpoint)
+    assert chat_calls(labelling_server) == 3
+    labels = pd.read_csv(tmp_path / "again.csv")["Classification"].astype(str).tolist()
+    assert labels == ["1", "0", "1", "0", "1", "1"]
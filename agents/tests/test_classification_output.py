@@ -0,0 +1,22 @@
+import subprocess
+import sys
+from agents import AGENTS_DIR
+from classification_output import parse_label, structured_output_schema, validate_label
+
+
+def test_importing_the_agents_loads_neither_pydantic_nor_ollama():
+    code = (
+        "import sys, agents\n"
+        "import topic_checker_agent, base_agent, category_registry, event_matching_index\n"
+        "print(sorted(m for m in ('pydantic', 'ollama') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=f"{AGENTS_DIR}/..")
+    assert result.stdout.strip() == "[]"
+
+
+def test_labels_are_parsed_and_validated():
+    assert parse_label('{"label": "1"}') == "1"
+    assert parse_label(" 'UNCERTAIN'. ") == "Uncertain"
+    assert parse_label("maybe") == "invalid"
+    assert validate_label("0") == "0"
+    assert structured_output_schema()["properties"]["label"]["enum"] == ["0", "1", "Uncertain"]
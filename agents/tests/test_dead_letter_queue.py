@@ -0,0 +1,74 @@
+import functools
+import json
+import os
+import pandas as pd
+import classification_pipeline
+from checkpoint_journal import CheckpointJournal
+from dead_letter_queue import DeadLetterQueue
+from fake_ollama_server import FakeOllamaServer
+from llm_client import CircuitBreaker, ResilientTransport, RetryPolicy
+from topic_checker_agent import TopicCheckerAgent
+from tests.conftest import keyword_responder, write_posts
+
+
+def test_requeue_retries_until_rows_succeed_and_saves_the_rest(tmp_path):
+    path = str(tmp_path / "failed.jsonl")
+    queue = DeadLetterQueue(path, rounds=2, round_delay=0.0)
+    queue.add_failed([0, 1, 2], ["a", "b", "c"], ["1", None, None])
+    attempts = {"b": 0, "c": 0}
+
+    def retry(entries):
+        for entry in entries:
+            attempts[entry["post"]] += 1
+        # "b" recovers in the second round, "c" never does
+        return ["0" if entry["post"] == "b" and attempts["b"] == 2 else None for entry in entries]
+
+    recovered = queue.requeue(retry)
+    assert [(entry["row_id"], label) for entry, label in recovered] == [(1, "0")]
+    queue.save()
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["row_id"] for line in f] == [2]
+
+    queue.entries = []
+    queue.save()
+    assert not os.path.exists(path)
+
+
+def run_agent(tmp_path, monkeypatch, fail_request):
+    monkeypatch.setattr(classification_pipeline, "DeadLetterQueue", functools.partial(DeadLetterQueue, round_delay=0.0))
+    texts = ["Gaza heute", "flaky Gaza", "Wetterbericht", "flaky Börse"]
+    outpath = tmp_path / "out.csv"
+    checkpoint = str(tmp_path / "journal.jsonl")
+    dead_letter_path = str(tmp_path / "failed.jsonl")
+    with FakeOllamaServer(latency=0.001, responder=keyword_responder, fail_request=fail_request) as server:
+        agent = TopicCheckerAgent(model="fake-model", topic="Israel", host=server.url)
+        agent.transport = ResilientTransport(server.url, 5.0, retry=RetryPolicy(max_attempts=1), breaker=CircuitBreaker(server.url, failure_threshold=100))
+        agent.process_dataset(write_posts(tmp_path / "in.csv", texts), str(outpath), checkpoint_path=checkpoint, dead_letter_path=dead_letter_path)
+    return pd.read_csv(outpath, dtype=str)["Classification"].tolist(), CheckpointJournal(checkpoint).completed, dead_letter_path
+
+
+def test_failed_rows_are_requeued_and_filled_in(tmp_path, monkeypatch):
+    seen = set()
+
+    def fail_first_attempt(request):
+        post = request["messages"][-1]["content"]
+        if "flaky" in post and post not in seen:
+            seen.add(post)
+            return True
+        return False
+
+    labels, journal, dead_letter_path = run_agent(tmp_path, monkeypatch, fail_first_attempt)
+    assert labels == ["1", "1", "0", "0"]
+    assert len(journal) == 4
+    assert not os.path.exists(dead_letter_path)
+
+
+def test_rows_that_keep_failing_stay_empty_and_are_listed(tmp_path, monkeypatch):
+    labels, journal, dead_letter_path = run_agent(
+        tmp_path, monkeypatch, lambda request: "flaky" in request["messages"][-1]["content"]
+    )
+    assert labels[0] == "1" and labels[2] == "0"
+    assert pd.isna(labels[1]) and pd.isna(labels[3])
+    assert sorted(journal) == [0, 2]
+    with open(dead_letter_path, encoding="utf-8") as f:
+        assert sorted(json.loads(line)["row_id"] for line in f) == [1, 3]
@@ -0,0 +1,27 @@
+import pandas as pd
+from event_store import EventStore
+
+
+def write_snapshot(path, uri, date, label):
+    pd.DataFrame({
+        "uri": [uri],
+        "eventDate": [date],
+        "title.eng": ["Title"],
+        "summary.eng": ["Summary"],
+        "concepts": [[{"label": {"eng": label}}]],
+        "totalArticleCount": [1],
+    }).to_parquet(path)
+
+
+def test_moved_event_keeps_the_source_concepts_of_its_old_partition(tmp_path):
+    write_snapshot(tmp_path / "1000_Hamas.parquet", "e1", "2023-10-31", "Gaza Strip")
+    write_snapshot(tmp_path / "2000_Israel.parquet", "e1", "2023-11-01", "Jerusalem")
+    store = EventStore(str(tmp_path / "store"))
+    store.ingest(str(tmp_path / "1000_Hamas.parquet"))
+    store.ingest(str(tmp_path / "2000_Israel.parquet"))
+
+    assert store.months == ["2023-11"]
+    events = store.query()
+    assert list(events["uri"]) == ["e1"]
+    assert list(events["source_concepts"][0]) == ["Hamas", "Israel"]
+    assert list(store.query(concepts=["Hamas"])["uri"]) == ["e1"]
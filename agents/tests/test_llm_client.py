@@ -0,0 +1,114 @@
+import asyncio
+import time
+import pytest
+from event_matching_index import OllamaEmbeddingEncoder
+from fake_ollama_server import FakeOllamaServer
+from llm_client import AsyncLLMClient, CircuitBreaker, CircuitOpenError, LLMCallError, ResilientTransport, RetryPolicy
+from tests.conftest import echo_responder
+
+
+def make_client(url, concurrency=4, timeout=5.0, max_attempts=1):
+    transport = ResilientTransport(url, timeout, retry=RetryPolicy(max_attempts=max_attempts, base_delay=0.01), breaker=CircuitBreaker(url))
+    return AsyncLLMClient("fake-model", host=url, concurrency=concurrency, timeout=timeout, transport=transport)
+
+
+def messages(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_chat_many_keeps_input_order():
+    # Jitter makes later requests finish before earlier ones
+    with FakeOllamaServer(latency=0.001, jitter=0.03, concurrency=16, responder=echo_responder) as server:
+        prompts = [f"post {i}" for i in range(40)]
+        results = make_client(server.url, concurrency=8).chat_many([messages(prompt) for prompt in prompts])
+    assert results == prompts
+
+
+def test_chat_many_respects_concurrency_cap(fake_server):
+    make_client(fake_server.url, concurrency=3).chat_many([messages(f"post {i}") for i in range(30)])
+    stats = fake_server.stats.snapshot()
+    assert stats["calls"]["/api/chat"] == 30
+    assert stats["peak_in_flight"] == 3
+
+
+def test_timeouts_surface_as_errors():
+    with FakeOllamaServer(latency=0.5, concurrency=4) as server:
+        results = make_client(server.url, timeout=0.05).chat_many([messages("slow post"), messages("another")])
+    assert all(isinstance(result, LLMCallError) for result in results)
+
+
+def test_concurrency_must_be_positive():
+    with pytest.raises(ValueError):
+        AsyncLLMClient("fake-model", concurrency=0)
+
+
+def test_transport_retries_transient_failures():
+    failures = []
+
+    def fail_twice(request):
+        failures.append(request)
+        return len(failures) <= 2
+
+    with FakeOllamaServer(latency=0.001, responder=echo_responder, fail_request=fail_twice) as server:
+        transport = ResilientTransport(server.url, 5.0, retry=RetryPolicy(max_attempts=3, base_delay=0.01), breaker=CircuitBreaker(server.url))
+        assert transport.chat("fake-model", messages("post")) == "post"
+        assert server.stats.snapshot()["calls"]["503"] == 2
+
+
+def test_transport_gives_up_after_the_last_attempt():
+    with FakeOllamaServer(latency=0.001, fail_request=lambda request: True) as server:
+        transport = ResilientTransport(server.url, 5.0, retry=RetryPolicy(max_attempts=2, base_delay=0.01), breaker=CircuitBreaker(server.url))
+        with pytest.raises(LLMCallError):
+            transport.chat("fake-model", messages("post"))
+        assert server.stats.snapshot()["calls"]["503"] == 2
+
+
+def test_embeddings_are_retried_like_chat_requests():
+    failures = []
+
+    def fail_once(request):
+        failures.append(request)
+        return len(failures) == 1
+
+    with FakeOllamaServer(latency=0.001, fail_request=fail_once) as server:
+        transport = ResilientTransport(server.url, 5.0, retry=RetryPolicy(max_attempts=2, base_delay=0.01), breaker=CircuitBreaker(server.url))
+        vectors = OllamaEmbeddingEncoder("fake-embedder", batch_size=2, transport=transport).encode(["a", "b", "c"])
+        assert vectors.shape == (3, 32)
+        assert server.stats.snapshot()["calls"]["503"] == 1
+        assert server.stats.snapshot()["calls"]["/api/embed"] == 2
+
+
+def test_programming_errors_propagate_instead_of_being_retried():
+    with FakeOllamaServer(latency=0.001) as server:
+        transport = ResilientTransport(server.url, 5.0, retry=RetryPolicy(max_attempts=3, base_delay=0.01), breaker=CircuitBreaker(server.url))
+        # An unknown argument is a bug in the caller, not a failed request
+        with pytest.raises(TypeError):
+            transport.chat("fake-model", messages("post"), unknown_option=True)
+        with pytest.raises(TypeError):
+            asyncio.run(transport.achat("fake-model", messages("post"), unknown_option=True))
+        assert transport.breaker.state == CircuitBreaker.CLOSED
+        assert server.stats.snapshot()["calls"].get("/api/chat", 0) == 0
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker("host", failure_threshold=2, reset_timeout=0.05, max_wait=60.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    breaker.acquire()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_fails_fast_once_the_outage_exceeds_max_wait():
+    breaker = CircuitBreaker("host", failure_threshold=1, reset_timeout=10.0, max_wait=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    started = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    assert time.monotonic() - started < 1.0
@@ -0,0 +1,14 @@
+from metrics import Metrics
+
+
+def test_prometheus_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.increment("llm_errors", host='C:\\ollama "gpu"\nnode')
+    with metrics.timer('stage "one"'):
+        pass
+
+    text = metrics.to_prometheus()
+    assert 'sosec_llm_errors_total{host="C:\\\\ollama \\"gpu\\"\\nnode"} 1' in text
+    assert 'sosec_stage_seconds_count{stage="stage \\"one\\""} 1' in text
+    # Every sample stays on one line
+    assert all(line.startswith(("#", "sosec_")) for line in text.splitlines())
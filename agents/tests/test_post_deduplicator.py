@@ -0,0 +1,28 @@
+import pandas as pd
+from post_deduplicator import PostDeduplicator
+from topic_checker_agent import TopicCheckerAgent
+from tests.conftest import write_posts
+
+POST = "Die Regierung hat heute neue Maßnahmen gegen die steigenden Energiepreise in Deutschland angekündigt. "
+
+
+def test_cluster_merges_exact_and_near_duplicates():
+    texts = [POST, "other post about something else entirely", POST.upper() + "  ", POST + "Teilen!"]
+    assert PostDeduplicator(threshold=0.8).cluster(texts) == [0, 1, 0, 0]
+
+
+def test_exact_threshold_keeps_near_duplicates_apart():
+    texts = [POST, POST.replace("heute", "gestern"), " " + POST.lower()]
+    deduplicator = PostDeduplicator(threshold=1.0)
+    assert deduplicator.cluster(texts) == [0, 1, 0]
+    assert deduplicator.stats["calls_saved"] == 1
+
+
+def test_process_dataset_classifies_each_cluster_once(tmp_path, labelling_server):
+    texts = ["Neues aus Gaza", "Wetterbericht", "neues aus  GAZA", "Wetterbericht", "Gaza heute"]
+    agent = TopicCheckerAgent(model="fake-model", topic="Israel", host=labelling_server.url)
+    outpath = tmp_path / "out.csv"
+    agent.process_dataset(write_posts(tmp_path / "in.csv", texts), str(outpath), deduplicator=PostDeduplicator(threshold=1.0))
+
+    assert labelling_server.stats.snapshot()["calls"]["/api/chat"] == 3
+    assert pd.read_csv(outpath)["Classification"].astype(str).tolist() == ["1", "0", "1", "0", "1"]
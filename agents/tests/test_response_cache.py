@@ -0,0 +1,32 @@
+import sqlite3
+from response_cache import ResponseCache
+
+
+def last_access(path, key):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT last_access FROM responses WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_hits_are_written_on_close_not_per_lookup(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    cache.put("a", "1")
+    stored = last_access(path, "a")
+
+    assert cache.get("a") == "1"
+    assert last_access(path, "a") == stored
+    cache.close()
+    assert last_access(path, "a") > stored
+
+
+def test_eviction_sees_pending_hits(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.stats()["entries"] == 2
+    cache.close()
@@ -0,0 +1,68 @@
+import json
+import pandas as pd
+from category_registry import REGISTRY
+from dataset_io import ROW_ID_COLUMN
+from sosec_orchestrator_agent import SOSECOrchestratorAgent
+from work_scheduler import WorkScheduler
+from tests.conftest import write_posts
+
+CATEGORIES = ["General Concerns", "Trust in Institutions"]
+
+
+def test_labels_stay_on_their_rows_with_duplicate_texts(tmp_path, labelling_server):
+    texts = ["Gaza heute", "Wetterbericht", "Gaza heute", "Wetterbericht", "Gaza heute", "Börse", "Gaza"]
+    agents = REGISTRY.create_agents("fake-model", CATEGORIES, host=labelling_server.url)
+    outpath = tmp_path / "out.csv"
+    orchestrator = SOSECOrchestratorAgent(
+        agents, write_posts(tmp_path / "in.csv", texts), str(outpath),
+        scheduler=WorkScheduler(hosts=[labelling_server.url]), chunksize=3,
+    )
+    orchestrator.run()
+
+    output = pd.read_csv(outpath)
+    assert output[ROW_ID_COLUMN].tolist() == list(range(len(texts)))
+    assert output["Post Text"].tolist() == texts
+    expected = ["1" if "Gaza" in text else "0" for text in texts]
+    for category in CATEGORIES:
+        assert output[category].astype(str).tolist() == expected
+
+
+def test_incremental_run_reclassifies_only_changed_rows_and_stale_categories(tmp_path, labelling_server):
+    texts = ["Gaza heute", "Wetterbericht", "Börse", "Gaza"]
+    agents = REGISTRY.create_agents("fake-model", CATEGORIES, host=labelling_server.url)
+    outpath = tmp_path / "out.csv"
+    orchestrator = SOSECOrchestratorAgent(
+        agents, write_posts(tmp_path / "in.csv", texts), str(outpath),
+        scheduler=WorkScheduler(hosts=[labelling_server.url]), chunksize=3, incremental=True,
+    )
+    assert orchestrator.run_incremental()["rows_classified"] == 4
+    assert orchestrator.run_incremental()["rows_classified"] == 0
+
+    texts[1] = "Gaza morgen"
+    write_posts(tmp_path / "in.csv", texts)
+    versions_path = tmp_path / "out.versions.json"
+    versions = json.loads(versions_path.read_text())
+    versions[CATEGORIES[0]] = "outdated"
+    versions_path.write_text(json.dumps(versions))
+    labelling_server.stats.calls.clear()
+    assert orchestrator.run_incremental() == {"rows_classified": 4, "stale_categories": [CATEGORIES[0]]}
+    # The changed row for both categories, the three others for the stale one only
+    assert labelling_server.stats.snapshot()["calls"]["/api/chat"] == 5
+
+    output = pd.read_csv(outpath)
+    assert output["Post Text"].tolist() == texts
+    for category in CATEGORIES:
+        assert output[category].astype(str).tolist() == ["1", "1", "0", "1"]
+
+
+def test_combine_agent_outputs_joins_on_row_id():
+    data = pd.DataFrame({ROW_ID_COLUMN: [0, 1, 2], "Post Text": ["same", "same", "other"], "date": ["2023-10-07"] * 3})
+    # Agent outputs in a different row order, as written by separate runs
+    agent_results = {
+        "A": pd.DataFrame({ROW_ID_COLUMN: [2, 0, 1], "Post Text": ["other", "same", "same"], "A": ["x", "y", "z"]}),
+        "B": pd.DataFrame({ROW_ID_COLUMN: [1, 2], "Post Text": ["same", "other"], "B": ["1", "0"]}),
+    }
+    combined = SOSECOrchestratorAgent.combine_agent_outputs(data, agent_results)
+    assert len(combined) == 3
+    assert combined["A"].tolist() == ["y", "z", "x"]
+    assert combined["B"].fillna("missing").tolist() == ["missing", "1", "0"]
@@ -0,0 +1,30 @@
+import pandas as pd
+from category_registry import REGISTRY
+from timeseries_rollups import TimeSeriesRollups
+
+
+def test_only_the_given_categories_are_aggregated(tmp_path):
+    path = tmp_path / "results.csv"
+    pd.DataFrame({
+        "Post Text": ["a", "b", "c"],
+        "LLM Response": ["1", "0", "Uncertain"],
+        "Parsed Code": ["7", "3", "3"],
+        "date": ["2023-10-07", "2023-10-07", "2023-10-08"],
+        "About Israel": ["1", "0", "1"],
+    }).to_csv(path, index=False)
+
+    rollups = TimeSeriesRollups(str(tmp_path / "rollups"), categories=["About Israel"])
+    assert rollups.update_from_file(str(path)) == 3
+    assert set(rollups.counts["category"]) == {"About Israel"}
+    positives = rollups.counts[rollups.counts["label"] == "1"]
+    assert positives["posts"].sum() == 2
+
+
+def test_categories_default_to_the_saved_ones_then_the_registry(tmp_path):
+    assert TimeSeriesRollups(str(tmp_path / "fresh")).categories == REGISTRY.names()
+
+    root = str(tmp_path / "saved")
+    rollups = TimeSeriesRollups(root, categories=["About Israel"])
+    rollups.update(pd.DataFrame({"row_id": [0], "date": ["2023-10-07"], "About Israel": ["1"], "Parsed Code": ["7"]}))
+    rollups.save()
+    assert TimeSeriesRollups(root).categories == ["About Israel"]
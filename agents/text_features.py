@@ -0,0 +1,295 @@
+import re
+import zlib
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+(?:[-'][^\W\d_]+)*")
+
+GERMAN_STOPWORDS = frozenset("""
+aber alle allem allen aller alles als also am an ander andere anderem anderen anderer anderes auch auf aus bei bin bis
+bist da damit dann das dass dein deine dem den denn der des dich die dies diese diesem diesen dieser dieses dir doch dort
+du durch ein eine einem einen einer eines er es etwas euch euer eure für gegen gewesen hab habe haben hat hatte hatten
+hier hin hinter ich ihm ihn ihnen ihr ihre im in indem ins ist jede jedem jeden jeder jedes jetzt kann kein keine
+können könnte machen man manche mein meine mich mir mit muss musste nach nicht nichts noch nun nur ob oder ohne sehr
+sein seine sich sie sind so solche soll sollte sondern sonst über um und uns unser unter viel vom von vor war waren
+warum was weil welche wenn werde werden wie wieder will wir wird wo wollen würde zu zum zur zwar zwischen
+the and of to in is for on that this with are was be it as at by from or an
+""".split())
+
+
+def tokenize(text, stopwords=GERMAN_STOPWORDS, min_length=2):
+    """
+    Splits a post into lower-cased word tokens, keeping umlauts and hyphenated compounds.
+
+    Args:
+        text (str): The text to tokenize.
+        stopwords (set, optional): Tokens to drop. Defaults to a German/English stopword list.
+        min_length (int, optional): Minimum token length.
+
+    Returns:
+        list: The tokens in order of appearance.
+    """
+    tokens = TOKEN_PATTERN.findall(str(text).casefold())
+    return [t for t in tokens if len(t) >= min_length and t not in stopwords]
+
+
+def ngrams(tokens, ngram_range=(1, 1)):
+    """
+    Returns all n-grams of `tokens` for n in `ngram_range` (inclusive), joined by spaces.
+    """
+    low, high = ngram_range
+    grams = []
+    for n in range(low, high + 1):
+        grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return grams
+
+
+class CSRMatrix:
+    """
+    A minimal compressed-sparse-row matrix backed by NumPy arrays.
+
+    Only the operations needed by the linear models and similarity searches in this
+    package are provided: products with dense vectors/matrices and row slicing.
+    """
+
+    # Upper bound on the expanded products plus dense result cells of one `iter_dot_t` block
+    DOT_BLOCK_SIZE = 2 ** 18
+
+    def __init__(self, data, indices, indptr, n_cols):
+        self.data = np.asarray(data, dtype=np.float64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.n_cols = n_cols
+
+    @property
+    def n_rows(self):
+        return len(self.indptr) - 1
+
+    @property
+    def shape(self):
+        return (self.n_rows, self.n_cols)
+
+    def row_ids(self):
+        """
+        Returns:
+            np.ndarray: The row index of every stored value.
+        """
+        return np.repeat(np.arange(self.n_rows), np.diff(self.indptr))
+
+    def dot(self, w):
+        """
+        Computes X @ w for a dense vector (n_cols,) or matrix (n_cols, k).
+        """
+        w = np.asarray(w)
+        row_ids = self.row_ids()
+        if w.ndim == 1:
+            return np.bincount(row_ids, weights=self.data * w[self.indices], minlength=self.n_rows)
+        return np.column_stack([
+            np.bincount(row_ids, weights=self.data * w[self.indices, k], minlength=self.n_rows)
+            for k in range(w.shape[1])
+        ])
+
+    def t_dot(self, v):
+        """
+        Computes X.T @ v for a dense vector (n_rows,).
+        """
+        weights = self.data * np.asarray(v)[self.row_ids()]
+        return np.bincount(self.indices, weights=weights, minlength=self.n_cols)
+
+    def dot_t(self, other, max_block_size=None):
+        """
+        Computes X @ other.T as a dense (n_rows, other.n_rows) array, block by block (see
+        `iter_dot_t`). Prefer `iter_dot_t` when only a reduction of every row is needed.
+        """
+        result = np.zeros((self.n_rows, other.n_rows))
+        for start, block in self.iter_dot_t(other, max_block_size):
+            result[start:start + len(block)] = block
+        return result
+
+    def iter_dot_t(self, other, max_block_size=None):
+        """
+        Computes X @ other.T in blocks of consecutive rows of X.
+
+        `other` is turned into an inverted index (column -> rows), and every stored value of
+        X is expanded against the matching postings, so each block is formed with a few
+        array operations instead of a loop over row pairs. Rows are grouped so that a block
+        stays within `max_block_size` expanded products plus dense result cells; a single
+        row that exceeds it forms a block of its own.
+
+        Args:
+            other (CSRMatrix): The right-hand matrix, with the same number of columns.
+            max_block_size (int, optional): Defaults to `DOT_BLOCK_SIZE`.
+
+        Yields:
+            tuple: (first row, dense block of shape (rows, other.n_rows)).
+        """
+        max_block_size = max_block_size or self.DOT_BLOCK_SIZE
+        order = np.argsort(other.indices, kind="stable")
+        posting_columns = other.indices[order]
+        posting_rows = other.row_ids()[order]
+        posting_values = other.data[order]
+
+        starts = np.searchsorted(posting_columns, self.indices, side="left")
+        lengths = np.searchsorted(posting_columns, self.indices, side="right") - starts
+        cumulative_products = np.concatenate([[0], np.cumsum(lengths)])
+        row_cost = np.diff(cumulative_products[self.indptr]) + other.n_rows
+        cumulative_cost = np.concatenate([[0], np.cumsum(row_cost)])
+
+        start = 0
+        while start < self.n_rows:
+            end = int(np.searchsorted(cumulative_cost, cumulative_cost[start] + max_block_size, side="right")) - 1
+            end = min(max(end, start + 1), self.n_rows)
+            block = np.zeros((end - start, other.n_rows))
+            low, high = self.indptr[start], self.indptr[end]
+            block_lengths = lengths[low:high]
+            total = int(cumulative_products[high] - cumulative_products[low])
+            if total:
+                offsets = np.cumsum(block_lengths) - block_lengths
+                positions = np.arange(total) - np.repeat(offsets, block_lengths) + np.repeat(starts[low:high], block_lengths)
+                rows = np.repeat(np.repeat(np.arange(end - start), np.diff(self.indptr[start:end + 1])), block_lengths)
+                values = np.repeat(self.data[low:high], block_lengths) * posting_values[positions]
+                block = np.bincount(rows * other.n_rows + posting_rows[positions], weights=values, minlength=block.size).reshape(block.shape)
+            yield start, block
+            start = end
+
+    def with_column(self, values):
+        """
+        Returns a new CSRMatrix with `values` (one per row) appended as an extra last column.
+        Zeros are not stored.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        nonzero = values != 0
+        indptr = np.concatenate([[0], np.cumsum(np.diff(self.indptr) + nonzero)])
+        data = np.empty(indptr[-1])
+        indices = np.empty(indptr[-1], dtype=np.int64)
+        # Stored values move back by the number of extra values in the rows before theirs
+        shift = np.concatenate([[0], np.cumsum(nonzero)[:-1]]) if self.n_rows else np.zeros(0, dtype=np.int64)
+        positions = np.arange(len(self.data)) + np.repeat(shift, np.diff(self.indptr))
+        data[positions] = self.data
+        indices[positions] = self.indices
+        extra = indptr[1:][nonzero] - 1
+        data[extra] = values[nonzero]
+        indices[extra] = self.n_cols
+        return CSRMatrix(data, indices, indptr, self.n_cols + 1)
+
+    def take(self, rows):
+        """
+        Returns a new CSRMatrix containing only the given rows, in the given order.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)]) if len(rows) else np.array([], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        return CSRMatrix(self.data[positions], self.indices[positions], indptr, self.n_cols)
+
+
+class HashingTfidfVectorizer:
+    """
+    Turns texts into L2-normalized TF-IDF vectors using the hashing trick.
+
+    Token n-grams are hashed with CRC32 into `n_features` buckets, so no vocabulary has
+    to be stored and the mapping is stable across processes and runs.
+
+    Attributes:
+        n_features (int): Number of hash buckets.
+        ngram_range (tuple): Smallest and largest n-gram size.
+        sublinear_tf (bool): Use 1 + log(tf) instead of raw counts.
+        idf (np.ndarray): Inverse document frequencies, set by `fit`.
+    """
+
+    def __init__(self, n_features=2 ** 20, ngram_range=(1, 2), sublinear_tf=True, stopwords=GERMAN_STOPWORDS):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.sublinear_tf = sublinear_tf
+        self.stopwords = stopwords
+        self.idf = None
+
+    def _hash(self, term):
+        return zlib.crc32(term.encode("utf-8")) % self.n_features
+
+    def _counts(self, texts):
+        data, indices, indptr = [], [], [0]
+        for text in texts:
+            counts = {}
+            for gram in ngrams(tokenize(text, self.stopwords), self.ngram_range):
+                bucket = self._hash(gram)
+                counts[bucket] = counts.get(bucket, 0) + 1
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        return CSRMatrix(data, indices, indptr, self.n_features)
+
+    def fit(self, texts):
+        counts = self._counts(texts)
+        document_frequency = np.bincount(counts.indices, minlength=self.n_features)
+        self.idf = np.log((1 + counts.n_rows) / (1 + document_frequency)) + 1.0
+        return self
+
+    def transform(self, texts):
+        """
+        Returns:
+            CSRMatrix: One L2-normalized TF-IDF row per text.
+        """
+        X = self._counts(texts)
+        if self.sublinear_tf:
+            X.data = 1.0 + np.log(X.data)
+        if self.idf is not None:
+            X.data = X.data * self.idf[X.indices]
+        norms = np.sqrt(np.bincount(X.row_ids(), weights=X.data ** 2, minlength=X.n_rows))
+        norms[norms == 0] = 1.0
+        X.data = X.data / norms[X.row_ids()]
+        return X
+
+    def fit_transform(self, texts):
+        return self.fit(texts).transform(texts)
+
+
+class SparseLogisticRegression:
+    """
+    Binary L2-regularized logistic regression trained by full-batch gradient descent
+    on a CSRMatrix.
+
+    Attributes:
+        l2 (float): Strength of the L2 penalty.
+        learning_rate (float): Gradient step size.
+        epochs (int): Number of full passes over the data.
+        class_weight (str): If "balanced", both classes contribute equally to the loss.
+        coef_ (np.ndarray): Learned weights, set by `fit`.
+        intercept_ (float): Learned bias, set by `fit`.
+    """
+
+    def __init__(self, l2=1e-4, learning_rate=10.0, epochs=300, class_weight=None):
+        self.l2 = l2
+        self.learning_rate = learning_rate
+        self.epochs = epochs
+        self.class_weight = class_weight
+        self.coef_ = None
+        self.intercept_ = 0.0
+
+    def fit(self, X, y, sample_weight=None):
+        y = np.asarray(y, dtype=np.float64)
+        weights = np.ones_like(y) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        if self.class_weight == "balanced" and 0 < y.mean() < 1:
+            weights = weights * np.where(y == 1, 0.5 / y.mean(), 0.5 / (1 - y.mean()))
+        weights = weights / weights.sum()
+        self.coef_ = np.zeros(X.n_cols)
+        self.intercept_ = 0.0
+        for _ in range(self.epochs):
+            residual = (self.predict_proba(X) - y) * weights
+            self.coef_ -= self.learning_rate * (X.t_dot(residual) + self.l2 * self.coef_)
+            self.intercept_ -= self.learning_rate * residual.sum()
+        return self
+
+    @staticmethod
+    def _sigmoid(z):
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -35, 35)))
+
+    def decision_function(self, X):
+        return X.dot(self.coef_) + self.intercept_
+
+    def predict_proba(self, X):
+        """
+        Returns:
+            np.ndarray: The probability of the positive class for each row.
+        """
+        return self._sigmoid(self.decision_function(X))
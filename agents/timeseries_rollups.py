@@ -0,0 +1,293 @@
+import os
+import json
+import logging
+import time
+import numpy as np
+import pandas as pd
+from dataset_io import ROW_ID_COLUMN, _require_pyarrow, iter_chunks
+
+# Label codes in the ledger; anything else is counted as "invalid", an empty cell as "missing"
+LABELS = ("0", "1", "Uncertain", "invalid", "missing")
+INVALID_CODE = LABELS.index("invalid")
+MISSING_CODE = LABELS.index("missing")
+
+LEDGER_NAME = "ledger.parquet"
+COUNTS_NAME = "counts.parquet"
+MANIFEST_NAME = "manifest.json"
+
+
+def label_codes(values):
+    """
+    Encodes a column of labels as small integers (positions in `LABELS`).
+    """
+    values = pd.Series(values)
+    text = values.astype(str).str.strip().replace({"1.0": "1", "0.0": "0"})
+    codes = pd.Categorical(text, categories=LABELS[:MISSING_CODE]).codes.astype(np.int8)
+    codes[codes < 0] = INVALID_CODE
+    codes[values.isna().to_numpy()] = MISSING_CODE
+    return codes
+
+
+class TimeSeriesRollups:
+    """
+    Cached daily aggregates of classified posts, kept up to date incrementally.
+
+    The rollups never need the raw posts. Two small tables are stored under `root`:
+        ledger.parquet  one row per post: row id, day and a label code per category
+        counts.parquet  posts per (day, category, label)
+
+    `update` upserts classified rows by row id: the ledger entries they replace are
+    subtracted from the counts and the new ones added, so relabelled posts (e.g. after a
+    prompt change in an incremental orchestrator run) are accounted for correctly. All
+    views (`daily`, `weekly`, `event_windows`) are derived from the counts table, which
+    has at most one row per day, category and label, and `materialize` writes them as
+    parquet files for the visualizer.
+
+    Attributes:
+        root (str): Directory of the rollups.
+        categories (list): The label columns aggregated. If None, the categories saved with
+            the rollups, else the enabled categories of the CategoryRegistry. They are never
+            guessed from the columns, which may hold raw responses or parsed codes.
+        positive_label (str): The label counted as a post belonging to a category.
+        timezone (str): Timezone in which post timestamps are bucketed into days.
+        rolling_days (int): Window of the rolling columns in `daily`.
+    """
+
+    def __init__(self, root, categories=None, positive_label="1", timezone="UTC", rolling_days=7):
+        self.root = root
+        self.positive_label = positive_label
+        self.timezone = timezone
+        self.rolling_days = rolling_days
+        os.makedirs(root, exist_ok=True)
+        manifest = self._load_manifest()
+        if categories is None:
+            categories = manifest.get("categories")
+        if categories is None:
+            from category_registry import REGISTRY
+            categories = REGISTRY.names()
+        self.categories = list(categories)
+        if not self.categories:
+            raise ValueError("No categories to aggregate.")
+        self.ledger = self._read(LEDGER_NAME)
+        self.counts = self._read(COUNTS_NAME)
+        if self.counts is None:
+            self.counts = pd.DataFrame({
+                "day": pd.Series(dtype="datetime64[ns]"), "category": pd.Series(dtype=object),
+                "label": pd.Series(dtype=object), "posts": pd.Series(dtype="int64"),
+            })
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _load_manifest(self):
+        if not os.path.exists(self._path(MANIFEST_NAME)):
+            return {}
+        with open(self._path(MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _read(self, name):
+        return pd.read_parquet(self._path(name)) if os.path.exists(self._path(name)) else None
+
+    def _write(self, frame, name):
+        pa = _require_pyarrow()
+        path = self._path(name)
+        pa.parquet.write_table(pa.Table.from_pandas(frame, preserve_index=False), path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _days(self, dates):
+        timestamps = pd.to_datetime(pd.Series(dates), utc=True, errors="coerce", format="mixed")
+        return timestamps.dt.tz_convert(self.timezone).dt.tz_localize(None).dt.normalize()
+
+    def _ledger_rows(self, results):
+        rows = pd.DataFrame({ROW_ID_COLUMN: results[ROW_ID_COLUMN].to_numpy(), "day": self._days(results["date"]).to_numpy()})
+        for category in self.categories:
+            rows[category] = label_codes(results[category]) if category in results else MISSING_CODE
+        rows = rows.dropna(subset=["day"])
+        return rows.drop_duplicates(ROW_ID_COLUMN, keep="last")
+
+    def _contributions(self, rows):
+        melted = rows.melt(id_vars="day", value_vars=self.categories, var_name="category", value_name="code")
+        contributions = melted.groupby(["day", "category", "code"]).size().rename("posts").reset_index()
+        contributions["label"] = np.asarray(LABELS, dtype=object)[contributions["code"].to_numpy()]
+        return contributions.drop(columns="code").set_index(["day", "category", "label"])["posts"]
+
+    def update(self, results):
+        """
+        Upserts classified rows into the rollups.
+
+        Args:
+            results (pd.DataFrame): Rows of the combined output with `row_id`, 'date' and the
+                category columns. Rows whose row id is already in the ledger replace it.
+
+        Returns:
+            int: Number of rows applied.
+        """
+        if results.empty:
+            return 0
+        new_rows = self._ledger_rows(results)
+        delta = self._contributions(new_rows)
+        if self.ledger is not None:
+            for category in self.categories:
+                if category not in self.ledger:
+                    self.ledger[category] = np.int8(MISSING_CODE)
+            replaced = self.ledger[ROW_ID_COLUMN].isin(new_rows[ROW_ID_COLUMN])
+            if replaced.any():
+                delta = delta.sub(self._contributions(self.ledger[replaced]), fill_value=0)
+            self.ledger = pd.concat([self.ledger[~replaced], new_rows], ignore_index=True)
+        else:
+            self.ledger = new_rows.reset_index(drop=True)
+
+        counts = self.counts.set_index(["day", "category", "label"])["posts"].add(delta, fill_value=0)
+        self.counts = counts[counts != 0].astype("int64").rename("posts").reset_index()
+        return len(new_rows)
+
+    def update_from_file(self, path, chunksize=100000):
+        """
+        Upserts a combined output file chunk by chunk, e.g. to build the rollups for
+        results produced before they existed. Post texts are dropped as each chunk is read.
+        """
+        applied = 0
+        for chunk in iter_chunks(path, chunksize, dtype=str):
+            applied += self.update(chunk.drop(columns=["Post Text"], errors="ignore").astype({ROW_ID_COLUMN: "int64"}))
+        return applied
+
+    def reset(self):
+        """
+        Drops all aggregated rows, e.g. before a full rerun of the orchestrator.
+        """
+        self.ledger = None
+        self.counts = self.counts.iloc[:0]
+
+    def save(self):
+        if self.ledger is not None:
+            self._write(self.ledger, LEDGER_NAME)
+        elif os.path.exists(self._path(LEDGER_NAME)):
+            os.remove(self._path(LEDGER_NAME))
+        self._write(self.counts, COUNTS_NAME)
+        manifest = {"categories": self.categories, "rows": 0 if self.ledger is None else len(self.ledger), "updated_at": time.time()}
+        with open(self._path(MANIFEST_NAME) + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(self._path(MANIFEST_NAME) + ".tmp", self._path(MANIFEST_NAME))
+
+    def label_counts(self):
+        """
+        Returns:
+            pd.DataFrame: Posts per day (rows) and (category, label) (columns), with days
+            without posts filled in as zero.
+        """
+        if self.counts.empty:
+            return pd.DataFrame()
+        table = self.counts.pivot_table(index="day", columns=["category", "label"], values="posts", aggfunc="sum", fill_value=0)
+        return table.asfreq("D", fill_value=0)
+
+    def daily(self):
+        """
+        Daily posts, positives and shares per category, plus rolling sums over
+        `rolling_days` and the rolling share (rolling positives / rolling posts).
+
+        Returns:
+            pd.DataFrame: Indexed by day, with columns 'posts', 'posts rolling' and per
+            category '<category>', '<category> share', '<category> rolling' and
+            '<category> rolling share'.
+        """
+        table = self.label_counts()
+        if table.empty:
+            return table
+        daily = pd.DataFrame(index=table.index)
+        # Every post has exactly one label (or "missing") per category
+        daily["posts"] = table[self.categories[0]].sum(axis=1)
+        daily["posts rolling"] = daily["posts"].rolling(self.rolling_days, min_periods=1).sum()
+        for category in self.categories:
+            labels = table[category] if category in table.columns.get_level_values(0) else pd.DataFrame(index=table.index)
+            positives = labels[self.positive_label] if self.positive_label in labels else pd.Series(0, index=table.index)
+            daily[category] = positives
+            daily[f"{category} share"] = (positives / daily["posts"]).where(daily["posts"] > 0)
+            daily[f"{category} rolling"] = positives.rolling(self.rolling_days, min_periods=1).sum()
+            daily[f"{category} rolling share"] = (daily[f"{category} rolling"] / daily["posts rolling"]).where(daily["posts rolling"] > 0)
+        return daily
+
+    def weekly(self, anchor="W-MON"):
+        """
+        Weekly posts, positives and shares per category.
+
+        Args:
+            anchor (str, optional): Pandas weekly frequency; "W-MON" labels weeks ending on Monday.
+
+        Returns:
+            pd.DataFrame: Indexed by week, with 'posts' and per category '<category>' and '<category> share'.
+        """
+        daily = self.daily()
+        if daily.empty:
+            return daily
+        weekly = daily[["posts"] + self.categories].resample(anchor).sum()
+        for category in self.categories:
+            weekly[f"{category} share"] = (weekly[category] / weekly["posts"]).where(weekly["posts"] > 0)
+        return weekly
+
+    def event_windows(self, events, before=3, after=3, date_col="eventDate"):
+        """
+        Aligns the daily series on events: for every event and every day offset from
+        `-before` to `after`, the posts and category positives on that day.
+
+        Args:
+            events (pd.DataFrame): Events with a date column, e.g. from `EventStore.query` or
+                `load_events`. Other columns (uri, title, ...) are carried along.
+            before (int, optional): Days before the event. Defaults to 3.
+            after (int, optional): Days after the event. Defaults to 3.
+            date_col (str, optional): Name of the event date column.
+
+        Returns:
+            pd.DataFrame: One row per (event, offset) with the event's columns, 'offset',
+            'day', 'posts' and per category '<category>' and '<category> share'.
+        """
+        daily = self.daily()
+        offsets = np.arange(-before, after + 1)
+        event_days = pd.to_datetime(events[date_col]).dt.normalize().to_numpy()
+        days = (event_days[:, None] + offsets[None, :].astype("timedelta64[D]")).ravel()
+        windows = events.loc[events.index.repeat(len(offsets))].reset_index(drop=True)
+        windows["offset"] = np.tile(offsets, len(events))
+        windows["day"] = days
+        values = daily.reindex(pd.DatetimeIndex(days))[["posts"] + self.categories] if not daily.empty else None
+        windows["posts"] = 0 if values is None else values["posts"].fillna(0).to_numpy()
+        for category in self.categories:
+            windows[category] = 0 if values is None else values[category].fillna(0).to_numpy()
+            windows[f"{category} share"] = (windows[category] / windows["posts"]).where(windows["posts"] > 0)
+        return windows
+
+    def event_overlay(self, events, date_col="eventDate", weight_col="totalArticleCount"):
+        """
+        Adds per-day event counts and article totals to `daily`, for plotting posts and
+        events on one time axis.
+        """
+        daily = self.daily()
+        events = events.assign(day=pd.to_datetime(events[date_col]).dt.normalize())
+        daily["events"] = events.groupby("day").size().reindex(daily.index, fill_value=0)
+        if weight_col in events:
+            articles = pd.to_numeric(events[weight_col], errors="coerce").groupby(events["day"]).sum()
+            daily["event articles"] = articles.reindex(daily.index, fill_value=0)
+        return daily
+
+    def materialize(self, events=None, before=3, after=3):
+        """
+        Saves the rollups and writes the derived views: `daily.parquet`, `weekly.parquet`
+        and, if `events` are given, `event_windows.parquet` (the daily view then also
+        carries the event overlay columns).
+        """
+        self.save()
+        daily = self.daily() if events is None else self.event_overlay(events)
+        if daily.empty:
+            return
+        self._write(daily.rename_axis("day").reset_index(), "daily.parquet")
+        self._write(self.weekly().rename_axis("week").reset_index(), "weekly.parquet")
+        if events is not None:
+            columns = [column for column in events.columns if column not in ("concepts", "source_concepts", "summary")]
+            self._write(self.event_windows(events[columns], before, after), "event_windows.parquet")
+        logging.info(f"Rollups materialized in '{self.root}' ({len(daily)} days)")
+
+    def load(self, view):
+        """
+        Reads a materialized view ('daily', 'weekly' or 'event_windows').
+        """
+        frame = pd.read_parquet(self._path(f"{view}.parquet"))
+        index = {"daily": "day", "weekly": "week"}.get(view)
+        return frame.set_index(index) if index else frame
@@ -1,39 +1,14 @@
-import os
+import logging
 import re
-import pandas as pd
-import ollama
-from pydantic import BaseModel, field_validator
+from llm_client import AsyncLLMClient, LLMCallError, shared_transport
+from metrics import METRICS
+from classification_pipeline import ClassificationPipelineMixin
+from classification_output import STRUCTURED_NUM_PREDICT, parse_label, structured_output_schema, validate_label
+from batch_prompting import (
+    BATCH_INSTRUCTIONS, batch_num_predict, batch_output_schema, estimate_tokens, format_batch, parse_batch_labels, plan_batches,
+)
 
-class ClassificationOutput(BaseModel):
-    """
-    A Pydantic model for validating classification outputs.
-
-    Attributes:
-        label (str): The classification label, which should be "0", "1", or "Uncertain".
-    """
-
-    label: str
-
-    @field_validator("label", mode="before")
-    @classmethod
-    def validate_label(cls, v):
-        """
-        Ensures that the label is one of the expected values.
-
-        Args:
-            v (str): The label output from the model.
-
-        Returns:
-            str: The validated label. If invalid, returns "invalid" and logs a warning.
-        """
-        valid_labels = {"0", "1", "Uncertain"}
-        if v not in valid_labels:
-            print(f"⚠️ Warning: Unexpected model output '{v}'. Marking as 'invalid' for manual review.")
-            return "invalid"
-        return v
-
-
-class TopicCheckerAgent:
+class TopicCheckerAgent(ClassificationPipelineMixin):
     """
     An agent that classifies social media posts based on a given topic.
 
@@ -41,9 +16,21 @@ class TopicCheckerAgent:
         model (str): The LLM model to use for classification.
         keywords (list): A list of keywords strongly associated with the topic.
         topic (str): The topic the agent is checking for in the posts.
+        host (str): The Ollama host URL.
+        timeout (float): Per-attempt timeout in seconds.
+        transport (ResilientTransport): Retries, timeouts and circuit breaking for the host.
+        cache (ResponseCache): Optional persistent cache of model responses.
+        keep_alive (str): How long Ollama keeps the model loaded between requests.
+        options (dict): Ollama model options, e.g. a fixed `num_ctx`.
+        system_message (str): The precomputed static prompt prefix.
+        structured_output (bool): Whether decoding is constrained to the label JSON schema.
+        max_retries (int): Retries for invalid labels in structured-output mode.
+        output_column (str): The label column written by `process_dataset`.
     """
 
-    def __init__(self, model="llama3.2:latest", keywords=None, topic="a given topic"):
+    output_column = "Classification"
+
+    def __init__(self, model="llama3.2:latest", keywords=None, topic="a given topic", host=None, timeout=None, cache=None, keep_alive="30m", options=None, structured_output=False, max_retries=1):
         """
         Initializes the classification agent.
 
@@ -51,12 +38,78 @@ class TopicCheckerAgent:
             model (str, optional): The LLM model to use. Defaults to "llama3.2:latest".
             keywords (list, optional): A list of keywords indicating topic relevance.
             topic (str, optional): The topic to classify posts about.
+            host (str, optional): The Ollama host URL. Defaults to the `OLLAMA_HOST` environment setting.
+            timeout (float, optional): Per-attempt timeout in seconds. Defaults to `DEFAULT_TIMEOUT`.
+            cache (ResponseCache, optional): Cache consulted before every model call.
+            keep_alive (str, optional): How long Ollama keeps the model loaded. Defaults to "30m".
+            options (dict, optional): Ollama model options. Keep `num_ctx` constant across
+                requests so the server can reuse the prompt KV cache.
+            structured_output (bool, optional): If True, the model is constrained to answer
+                with `{"label": ...}` via Ollama's `format=` and a minimal `num_predict`.
+            max_retries (int, optional): Retries for invalid labels in structured-output mode.
         """
         if keywords is None:
             keywords = []
         self.model = model
         self.keywords = keywords
         self.topic = topic
+        self.host = host
+        self.timeout = timeout
+        self.cache = cache
+        self.keep_alive = keep_alive
+        self.options = options
+        self.structured_output = structured_output
+        self.max_retries = max_retries
+        self.transport = shared_transport(host, timeout)
+        self.system_message = self._build_system_message()
+        self.batch_system_message = f"{self.system_message}\n\n{BATCH_INSTRUCTIONS}"
+
+    @property
+    def metrics_category(self):
+        return self.topic
+
+    def _build_system_message(self):
+        """
+        Builds the static prompt prefix (role, instructions and keywords) once, so every
+        request starts with byte-identical text and only the post varies at the end.
+        """
+        return (
+            f"You are a highly accurate text classifier specializing in detecting references to {self.topic} "
+            "in German-language social media posts, particularly on Telegram. "
+            "Base your classification strictly on the content of the post, avoiding assumptions beyond what is explicitly stated.\n\n"
+            "Classify each Telegram post strictly based on its content:\n\n"
+            f"Label it with '1' if the post references {self.topic} or any of its more specific aspects.\n"
+            "Label it with '0' if it is about a different topic.\n"
+            "If the classification is unclear, respond ONLY with 'Uncertain'.\n\n"
+            f"Consider the following keywords as strong indicators that the post is about {self.topic}:\n"
+            f"{', '.join(self.keywords)}\n\n"
+            "However, do not rely solely on keywords—evaluate the full context of the message."
+        )
+
+    def chat_kwargs(self, num_predict=STRUCTURED_NUM_PREDICT):
+        """
+        Args:
+            num_predict (int, optional): Generation budget in structured-output mode.
+
+        Returns:
+            dict: The extra arguments passed with every chat request.
+        """
+        if not self.structured_output:
+            return {"options": self.options, "keep_alive": self.keep_alive}
+        options = {"temperature": 0, **(self.options or {}), "num_predict": num_predict}
+        return {
+            "options": options,
+            "format": structured_output_schema(),
+            "keep_alive": self.keep_alive,
+        }
+
+    def batch_chat_kwargs(self, batch_size):
+        """
+        Returns:
+            dict: The chat arguments for a batch request of up to `batch_size` posts.
+        """
+        options = {**(self.options or {}), "num_predict": batch_num_predict(batch_size), "temperature": 0}
+        return {"options": options, "format": batch_output_schema(), "keep_alive": self.keep_alive}
 
     def construct_message(self, user_message):
         """
@@ -68,93 +121,191 @@ class TopicCheckerAgent:
         Returns:
             list: A list of dictionaries representing the structured message for the LLM.
         """
+        with METRICS.timer("construct_messages"):
+            return [
+                {"role": "system", "content": self.system_message},
+                {"role": "user", "content": f"Post:\n{user_message}"},
+            ]
+
+    def construct_batch_message(self, user_messages):
+        """
+        Constructs a prompt asking the LLM to classify several posts at once.
+        """
         return [
-            {"role": "system", "content": (
-                f"You are a highly accurate text classifier specializing in detecting references to {self.topic} "
-                "in German-language social media posts, particularly on Telegram. "
-                "Base your classification strictly on the content of the post, avoiding assumptions beyond what is explicitly stated."
-            )},
-            {"role": "user", "content": (
-                "Classify the following Telegram post strictly based on its content:\n\n"
-                f"Label it with '1' if the post references {self.topic} or any of its more specific aspects.\n"
-                "Label it with '0' if it is about a different topic.\n"
-                "If the classification is unclear, respond ONLY with 'Uncertain'.\n\n"
-                f"Consider the following keywords as strong indicators that the post is about {self.topic}:\n"
-                f"{', '.join(self.keywords)}\n\n"
-                "However, do not rely solely on keywords—evaluate the full context of the message.\n\n"
-                f"Post:\n{user_message}"
-            )}
+            {"role": "system", "content": self.batch_system_message},
+            {"role": "user", "content": format_batch(user_messages)},
         ]
 
-    def classify(self, user_message):
+    def _chat(self, messages, chat_kwargs):
+        """
+        Raises:
+            LLMCallError: If the model could not be reached, even after retries.
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.model, messages, chat_kwargs.get("options"), chat_kwargs.get("format"))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                METRICS.increment("cache_hits")
+                return cached
+        content = self.transport.chat(self.model, messages, **chat_kwargs)
+        if self.cache is not None:
+            self.cache.put(cache_key, content, self.model)
+        return content
+
+    def classify(self, user_message, chat_kwargs=None):
         """
         Sends the post to the LLM for classification.
 
         Args:
             user_message (str): The social media post to classify.
+            chat_kwargs (dict, optional): Overrides the arguments from `chat_kwargs()`.
 
         Returns:
             str: The raw response from the LLM.
+
+        Raises:
+            LLMCallError: If the model could not be reached, even after retries.
         """
-        messages = self.construct_message(user_message)
-        response = ollama.chat(model=self.model, messages=messages)
-        return response["message"]["content"]
+        return self._chat(self.construct_message(user_message), chat_kwargs or self.chat_kwargs())
 
-    def parse_output(self, response):
+    def classify_many(self, user_messages, concurrency=1):
         """
-        Parses the model's output to extract a valid classification label.
+        Sends several posts to the LLM, keeping up to `concurrency` requests in flight.
 
         Args:
-            response (str): The LLM's response.
+            user_messages (list): The social media posts to classify.
+            concurrency (int, optional): Maximum number of parallel LLM requests. Defaults to 1.
 
         Returns:
-            str: The classification label ("0", "1", "Uncertain") or "invalid" if unrecognized.
+            list: The raw responses from the LLM, in the same order as `user_messages`. A
+            request that failed for good yields its `LLMCallError` instead.
         """
-        response = response.strip()
-        if re.search(r"uncertain", response, flags=re.IGNORECASE):
-            return "Uncertain"
-        match = re.search(r"\b[01]\b", response)
-        return match.group() if match else "invalid"
+        if concurrency <= 1:
+            responses = []
+            for message in user_messages:
+                try:
+                    responses.append(self.classify(message))
+                except LLMCallError as e:
+                    responses.append(e)
+            return responses
+
+        client = AsyncLLMClient(self.model, host=self.host, concurrency=concurrency, timeout=self.timeout, cache=self.cache, transport=self.transport)
+        return client.chat_many([self.construct_message(message) for message in user_messages], **self.chat_kwargs())
 
-    def process_dataset(self, inpath, outpath, checkpoint_path=None):
+    def validate_response(self, user_message, response):
         """
-        Processes a dataset of posts, classifying each one and saving the results.
+        Turns a raw response into a validated label, retrying invalid ones.
 
         Args:
-            inpath (str): Path to the input CSV file containing the posts.
-            outpath (str): Path to save the output CSV file with classifications.
-            checkpoint_path (str, optional): Path to a checkpoint CSV file to resume interrupted processing.
+            user_message (str): The classified post.
+            response (str or Exception): The raw response, or the error of a failed call.
 
         Returns:
-            None: Saves the classified dataset to a CSV file.
+            str: The label, or None if the model could not be reached.
         """
-        parsed_labels = []
-        processed_texts = []
+        if isinstance(response, BaseException):
+            return None
+        try:
+            with METRICS.timer("validate"):
+                raw_label = self.parse_output(response)
+                validated_label = validate_label(raw_label)  # Ensures valid output
+            return self.retry_invalid_label(user_message, validated_label)
+        except LLMCallError:
+            return None
 
-        if checkpoint_path and os.path.exists(checkpoint_path):
-            data = pd.read_csv(checkpoint_path)
-            raw_messages = data["Post Text"].tolist()
-        else:
-            data_origin = pd.read_csv(inpath)
-            raw_messages = data_origin["Post Text"].tolist()
+    def classify_posts(self, user_messages, concurrency=1):
+        """
+        Classifies several posts and validates the answers.
+
+        Args:
+            user_messages (list): The social media posts to classify.
+            concurrency (int, optional): Maximum number of parallel LLM requests. Defaults to 1.
+
+        Returns:
+            list: The validated labels, in the same order as `user_messages`. Posts for
+            which the model could not be reached get None.
+        """
+        responses = self.classify_many(user_messages, concurrency)
+        return [self.validate_response(user_message, response) for user_message, response in zip(user_messages, responses)]
+
+    def classify_batched(self, user_messages, max_batch_size=16, concurrency=1):
+        """
+        Classifies posts by packing several of them into each request.
+
+        Batch sizes adapt to the post lengths so that each request fits the model's context
+        window (`num_ctx` in `options`, 2048 by default). A batch whose answer does not
+        validate falls back to single-post calls; the posts of a batch whose request failed
+        get None.
+
+        Args:
+            user_messages (list): The social media posts to classify.
+            max_batch_size (int, optional): Upper bound on posts per request. Defaults to 16.
+            concurrency (int, optional): Maximum number of parallel batch requests. Defaults to 1.
 
-        for n, post in enumerate(raw_messages):
-            print(f"Processing post: {post}")
-            response = self.classify(post)
-            raw_label = self.parse_output(response)
-            validated_label = ClassificationOutput(label=raw_label).label  # Ensures valid output
+        Returns:
+            list: The validated labels, in the same order as `user_messages`.
+        """
+        if not user_messages:
+            return []
+        context_window = (self.options or {}).get("num_ctx", 2048)
+        batches = plan_batches(user_messages, context_window - estimate_tokens(self.batch_system_message), max_batch_size)
+        messages = [self.construct_batch_message([user_messages[i] for i in batch]) for batch in batches]
+        chat_kwargs = self.batch_chat_kwargs(max(len(batch) for batch in batches))
 
-            print(f"Model response: {response} → Recognized as {validated_label}")
+        if concurrency > 1:
+            client = AsyncLLMClient(self.model, host=self.host, concurrency=concurrency, timeout=self.timeout, cache=self.cache, transport=self.transport)
+            responses = client.chat_many(messages, **chat_kwargs)
+        else:
+            responses = []
+            for batch_messages in messages:
+                try:
+                    responses.append(self._chat(batch_messages, chat_kwargs))
+                except LLMCallError as e:
+                    responses.append(e)
 
-            parsed_labels.append(validated_label)
-            processed_texts.append(post)
+        labels = [None] * len(user_messages)
+        for batch, response in zip(batches, responses):
+            if isinstance(response, BaseException):
+                # The host is failing; single-post calls would only fail as well
+                continue
+            batch_labels = parse_batch_labels(response, len(batch))
+            if batch_labels is None:
+                logging.warning(f"Batch of {len(batch)} posts did not validate; falling back to single-post calls")
+                batch_labels = self.classify_posts([user_messages[i] for i in batch])
+            for i, label in zip(batch, batch_labels):
+                labels[i] = label
+        return labels
 
-            if (n + 1) % 10 == 0 and checkpoint_path:
-                checkpoint_df = pd.DataFrame({"Post Text": processed_texts, "Label": parsed_labels})
-                checkpoint_df.to_csv(checkpoint_path, mode="a", index=False, header=not os.path.exists(checkpoint_path))
+    # The name the shared classification pipeline uses for batched classification
+    classify_posts_batched = classify_batched
 
-        data_origin["Classification"] = parsed_labels
-        data_origin.to_csv(outpath, index=False)
-        print("Data saved successfully")
+    def parse_output(self, response):
+        """
+        Parses the model's output to extract a valid classification label.
 
+        Args:
+            response (str): The LLM's response.
 
+        Returns:
+            str: The classification label ("0", "1", "Uncertain") or "invalid" if unrecognized.
+        """
+        response = response.strip()
+        if response.startswith("{"):
+            return parse_label(response)
+        if re.search(r"uncertain", response, flags=re.IGNORECASE):
+            return "Uncertain"
+        match = re.search(r"\b[01]\b", response)
+        return match.group() if match else "invalid"
+
+    def retry_invalid_label(self, user_message, label):
+        """
+        In structured-output mode, re-asks up to `max_retries` times for an invalid label,
+        doubling the generation budget each time. Other labels are returned unchanged.
+        """
+        attempt = 0
+        while label == "invalid" and self.structured_output and attempt < self.max_retries:
+            attempt += 1
+            response = self.classify(user_message, self.chat_kwargs(num_predict=STRUCTURED_NUM_PREDICT * 2 ** attempt))
+            label = validate_label(self.parse_output(response))
+        return label
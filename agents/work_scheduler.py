@@ -0,0 +1,145 @@
+import asyncio
+from collections import deque
+from typing import NamedTuple
+from llm_client import LLMCallError, run_async, shared_transport
+from metrics import METRICS
+
+
+class WorkItem(NamedTuple):
+    """
+    One chat request for the scheduler.
+
+    Attributes:
+        key: Any hashable identifying the item in the results, e.g. (row_id, category).
+        category (str): The category the request belongs to; used for fair dispatch.
+        model (str): The model to run.
+        messages (list): The chat messages.
+        options (dict): Extra keyword arguments for `AsyncClient.chat`, e.g. `options`/`format`.
+    """
+    key: object
+    category: str
+    model: str
+    messages: list
+    options: dict = None
+
+
+class WorkScheduler:
+    """
+    A central scheduler that dispatches (post, category) requests to one or more Ollama hosts.
+
+    Work items are kept in one queue per category and released in smooth weighted
+    round-robin order, so no category starves the others. Released items go through a
+    bounded queue (backpressure) to a fixed set of workers per host; each host is
+    served by its shared `ResilientTransport` (a pooled `ollama.AsyncClient` with timeouts,
+    retries and a circuit breaker), and a host never has more than `per_host_concurrency`
+    requests in flight. Faster hosts simply pull more work, so adding a host adds capacity
+    without any re-partitioning, and while one host's circuit is open its workers pause
+    and the remaining hosts take over the queue.
+
+    Attributes:
+        hosts (list): Ollama host URLs. `[None]` uses the `OLLAMA_HOST` default.
+        per_host_concurrency (int or dict): Maximum requests in flight per host, either
+            one value for all hosts or a mapping of host to limit.
+        category_weights (dict): Relative dispatch weight per category (default 1).
+        max_pending (int): Maximum number of released items waiting for a worker.
+        timeout (float): Per-attempt timeout in seconds. None uses `DEFAULT_TIMEOUT`.
+        cache (ResponseCache): Optional cache consulted before an item is queued.
+    """
+
+    def __init__(self, hosts=None, per_host_concurrency=4, category_weights=None, max_pending=64, timeout=None, cache=None):
+        self.hosts = list(hosts) if hosts else [None]
+        self.per_host_concurrency = per_host_concurrency
+        self.category_weights = category_weights or {}
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.cache = cache
+        self.dispatched = {}
+
+    def _host_limit(self, host):
+        if isinstance(self.per_host_concurrency, dict):
+            return self.per_host_concurrency.get(host, 1)
+        return self.per_host_concurrency
+
+    def _cache_key(self, item):
+        chat_kwargs = item.options or {}
+        return self.cache.make_key(item.model, item.messages, chat_kwargs.get("options"), chat_kwargs.get("format"))
+
+    def _weighted_order(self, items):
+        """
+        Yields items category by category in smooth weighted round-robin order.
+        """
+        queues = {}
+        for item in items:
+            queues.setdefault(item.category, deque()).append(item)
+        current = {category: 0.0 for category in queues}
+        while queues:
+            total = 0.0
+            for category in queues:
+                weight = self.category_weights.get(category, 1.0)
+                current[category] += weight
+                total += weight
+            chosen = max(queues, key=lambda category: current[category])
+            current[chosen] -= total
+            yield queues[chosen].popleft()
+            if not queues[chosen]:
+                del queues[chosen]
+                del current[chosen]
+
+    async def _worker(self, host, transport, queue, results):
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            chat_kwargs = item.options or {}
+            try:
+                content = await transport.achat(item.model, item.messages, **chat_kwargs)
+                results[item.key] = content
+                if self.cache is not None:
+                    self.cache.put(self._cache_key(item), content, item.model)
+            except LLMCallError as e:
+                results[item.key] = e
+            finally:
+                self.dispatched[host] = self.dispatched.get(host, 0) + 1
+                queue.task_done()
+
+    async def arun(self, items):
+        """
+        Runs all work items and waits for completion.
+
+        Args:
+            items (iterable): WorkItem instances.
+
+        Returns:
+            dict: Mapping of item key to response content, or to the `LLMCallError` if the
+            request failed for good.
+        """
+        results = {}
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        workers = []
+        for host in self.hosts:
+            transport = shared_transport(host, self.timeout)
+            workers.extend(
+                asyncio.create_task(self._worker(host, transport, queue, results)) for _ in range(self._host_limit(host))
+            )
+
+        for item in self._weighted_order(items):
+            if self.cache is not None:
+                cached = self.cache.get(self._cache_key(item))
+                if cached is not None:
+                    METRICS.increment("cache_hits")
+                    results[item.key] = cached
+                    continue
+            await queue.put(item)
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        return results
+
+    def run(self, items):
+        """
+        Synchronous wrapper around `arun`, on the shared client loop so that connections
+        are reused between runs.
+        """
+        return run_async(self.arun(items))